@@ -13,6 +13,16 @@ interface QuestionData {
   answer: string;
 }
 
+// Per-browser id so the backend can keep each student's quiz state apart
+const getSessionId = (): string => {
+  let sessionId = localStorage.getItem("quizSessionId");
+  if (!sessionId) {
+    sessionId = crypto.randomUUID();
+    localStorage.setItem("quizSessionId", sessionId);
+  }
+  return sessionId;
+};
+
 const navItems = [
   { name: "Home", path: "/" },
   { name: "Chatbot", path: "/chatbot" },
@@ -31,7 +41,9 @@ export default function OhmsLawQuiz() {
 
   const fetchQuestion = async () => {
     try {
-      const response = await fetch("http://127.0.0.1:5000/generate-question");
+      const response = await fetch("http://127.0.0.1:5000/generate-question", {
+        headers: { "X-Session-Id": getSessionId() },
+      });
       const data: QuestionData[] = await response.json();
 
       if (Array.isArray(data) && data.length === 2 && data[0].question && data[1].question) {
@@ -64,6 +76,7 @@ export default function OhmsLawQuiz() {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          "X-Session-Id": getSessionId(),
         },
         body: JSON.stringify({ selected_answers: selectedAnswers }),
       });
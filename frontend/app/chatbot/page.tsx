@@ -18,6 +18,16 @@ const navItems = [
     { name: "Quizzes", path: "/Quizzes" },
 ];
 
+// Per-browser id so the backend can keep each student's conversation apart
+const getSessionId = (): string => {
+    let sessionId = localStorage.getItem("chatSessionId");
+    if (!sessionId) {
+        sessionId = crypto.randomUUID();
+        localStorage.setItem("chatSessionId", sessionId);
+    }
+    return sessionId;
+};
+
 const formatText = (text: string) => {
     let formatted = text
         .replace(/\*\*(.*?)\*\*/g, "<strong>$1</strong>") // Bold
@@ -43,7 +53,7 @@ const ChatBot = () => {
         try {
             const response = await fetch("http://127.0.0.1:5000/chat", {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
+                headers: { "Content-Type": "application/json", "X-Session-Id": getSessionId() },
                 body: JSON.stringify({ message: input }),
             });
 
@@ -86,7 +96,7 @@ const ChatBot = () => {
         try {
             const response = await fetch("http://127.0.0.1:5000/chat", {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
+                headers: { "Content-Type": "application/json", "X-Session-Id": getSessionId() },
                 body: JSON.stringify({ message: text }),
             });
 
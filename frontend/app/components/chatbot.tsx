@@ -19,6 +19,16 @@ const navItems = [
     { name: "Quizzes", path: "/Quizzes" },
 ];
 
+// Per-browser id so the backend can keep each student's conversation apart
+const getSessionId = (): string => {
+    let sessionId = localStorage.getItem("chatSessionId");
+    if (!sessionId) {
+        sessionId = crypto.randomUUID();
+        localStorage.setItem("chatSessionId", sessionId);
+    }
+    return sessionId;
+};
+
 const formatText = (text: string) => {
     let formatted = text
         .replace(/\*\*(.*?)\*\*/g, "<strong>$1</strong>") // Bold
@@ -41,26 +51,53 @@ const ChatBot = () => {
         const userMessage: Message = { text: input, sender: "user" };
         setMessages((prev) => [...prev, userMessage]);
 
+        // Placeholder bot message that the streamed chunks are appended to
+        setMessages((prev) => [...prev, { text: "", sender: "bot" }]);
+        const updateBotMessage = (update: (text: string) => string) =>
+            setMessages((prev) => {
+                const last = prev[prev.length - 1];
+                return [...prev.slice(0, -1), { ...last, text: update(last.text) }];
+            });
+
         try {
-            const response = await fetch("http://127.0.0.1:5000/chat", {
+            const response = await fetch("http://127.0.0.1:5000/chat/stream", {
                 method: "POST",
-                headers: { "Content-Type": "application/json" },
+                headers: { "Content-Type": "application/json", "X-Session-Id": getSessionId() },
                 body: JSON.stringify({ message: input }),
             });
 
-            const responseData = await response.json();
-
-            const botMessage: Message = {
-                text: responseData.response || responseData.error || "Sorry, I didn't understand that.",
-                sender: "bot",
-            };
-            setMessages((prev) => [...prev, botMessage]);
+            if (!response.ok || !response.body) {
+                const responseData = await response.json();
+                updateBotMessage(() => responseData.error || "Sorry, I didn't understand that.");
+                return;
+            }
+
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                // Server-sent events are separated by a blank line
+                const events = buffer.split("\n\n");
+                buffer = events.pop() || "";
+                for (const event of events) {
+                    const dataLine = event.split("\n").find((line) => line.startsWith("data: "));
+                    if (!dataLine) continue;
+                    const payload = JSON.parse(dataLine.slice(6));
+                    if (payload.text) updateBotMessage((text) => text + payload.text);
+                    if (payload.error) updateBotMessage(() => payload.error);
+                }
+            }
         } catch (error) {
             console.error("Error fetching from Flask:", error);
-            setMessages((prev) => [...prev, { text: "Error fetching response. Try again.", sender: "bot" }]);
+            updateBotMessage(() => "Error fetching response. Try again.");
+        } finally {
+            setInput("");
         }
-
-        setInput("");
     };
 
     return (
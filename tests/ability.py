@@ -0,0 +1,249 @@
+"""Per-student, per-topic ability estimates and a calibrated MCQ item bank.
+
+An online (Elo-style) version of the 3-parameter IRT model with unit
+discrimination and a fixed 1-in-4 guessing floor:
+
+    P(correct) = c + (1 - c) * sigmoid(theta - b)
+
+theta is a student's ability on a topic and b an item's difficulty. After each
+answer both move by a step proportional to the surprise (x - P), with steps that
+shrink as the student or item accumulates answers. Everything lives in NumPy
+arrays indexed by student/topic/item rows, so a whole class's answers are
+applied with one vectorized update.
+
+A process only keeps the MAX_STUDENTS students it saw most recently; the rest
+are forgotten and restored from their session on their next request.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+GUESS = 0.25  # four options
+# Starting difficulty of a newly generated question, by the level it was generated for
+LEVEL_DIFFICULTY = {"Basic": -1.0, "Intermediate": 0.0, "Advanced": 1.0}
+LEVELS = ("Basic", "Intermediate", "Advanced")
+# Ability cut points between Basic | Intermediate | Advanced
+LEVEL_CUTS = np.array([-0.5, 0.5])
+
+# Items further than this from the student's ability are not served; a fresh question is generated instead
+MAX_DIFFICULTY_GAP = 1.5
+
+# Update step sizes: K / (1 + answers / K_DECAY), never below K_FLOOR
+K_STUDENT = 0.6
+K_ITEM = 0.3
+K_DECAY = 10.0
+K_FLOOR = 0.05
+
+# Students held in memory per process before the least recently seen one's row is reused
+MAX_STUDENTS = int(os.getenv("ABILITY_MAX_STUDENTS", 10000))
+
+
+def probability(theta, difficulty):
+    return GUESS + (1 - GUESS) / (1 + np.exp(difficulty - theta))
+
+
+def information(theta, difficulty):
+    """Fisher information of an item at ability theta (3PL with a = 1)."""
+    p = probability(theta, difficulty)
+    return ((p - GUESS) / (1 - GUESS)) ** 2 * (1 - p) / p
+
+
+def level_index(theta):
+    """0/1/2 (Basic/Intermediate/Advanced) for an ability or an array of them."""
+    return np.searchsorted(LEVEL_CUTS, theta, side="right")
+
+
+def _step(k, answered):
+    return np.maximum(k / (1 + answered / K_DECAY), K_FLOOR)
+
+
+def _grow(array, rows):
+    """array with at least `rows` rows, doubling so appends stay amortized O(1)."""
+    if rows <= array.shape[0]:
+        return array
+    grown = np.zeros((max(rows, array.shape[0] * 2),) + array.shape[1:], dtype=array.dtype)
+    grown[:array.shape[0]] = array
+    return grown
+
+
+class ItemBank:
+    """Questions with their calibrated difficulty, topic and answer count, one array row per item.
+
+    Items are addressed by item id: the row number unless the caller supplies its
+    own ids (e.g. the question bank's primary keys).
+    """
+
+    def __init__(self, capacity=1024):
+        self.topics = {}  # topic -> column, shared with AbilityModel
+        self.questions = []  # row -> question dict
+        self.rows = {}  # item id -> row
+        self.item_ids = np.zeros(capacity, dtype=np.int64)
+        self.difficulty = np.zeros(capacity)
+        self.answered = np.zeros(capacity, dtype=np.int64)
+        self.topic = np.zeros(capacity, dtype=np.int32)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __contains__(self, item_id):
+        return item_id in self.rows
+
+    def topic_column(self, topic):
+        with self._lock:
+            return self.topics.setdefault(topic, len(self.topics))
+
+    def add(self, question, topic, difficulty=0.0, answered=0, item_id=None):
+        """Add a question (an id already present is left as it is); returns its item id."""
+        column = self.topic_column(topic)
+        with self._lock:
+            row = len(self.questions)
+            item_id = row if item_id is None else item_id
+            if item_id in self.rows:
+                return item_id
+            for name in ("item_ids", "difficulty", "answered", "topic"):
+                setattr(self, name, _grow(getattr(self, name), row + 1))
+            self.item_ids[row] = item_id
+            self.difficulty[row] = difficulty
+            self.answered[row] = answered
+            self.topic[row] = column
+            self.questions.append(question)
+            self.rows[item_id] = row
+            return item_id
+
+    def get(self, item_id):
+        return self.questions[self.rows[item_id]]
+
+    def row_of(self, item_ids):
+        return np.array([self.rows[item_id] for item_id in item_ids], dtype=np.int64)
+
+    def topic_of(self, item_id):
+        column = self.topic[self.rows[item_id]]
+        return next(topic for topic, c in self.topics.items() if c == column)
+
+    def difficulties(self, item_ids):
+        return self.difficulty[self.row_of(item_ids)]
+
+    def sync(self, item_id, difficulty, answered):
+        """Overwrite an item's calibration with a newer value, e.g. written by another process."""
+        with self._lock:
+            row = self.rows[item_id]
+            self.difficulty[row] = difficulty
+            self.answered[row] = answered
+
+    def calibrate(self, rows, residuals):
+        """Move item difficulties against the students' surprise (x - P), one vectorized step."""
+        with self._lock:
+            steps = _step(K_ITEM, self.answered[rows]) * residuals
+            np.add.at(self.difficulty, rows, -steps)
+            np.add.at(self.answered, rows, 1)
+
+
+class AbilityModel:
+    """theta[student row, topic column] with an answer count per cell, backed by an ItemBank."""
+
+    def __init__(self, bank=None, capacity=1024, topic_capacity=8, max_students=MAX_STUDENTS):
+        self.bank = bank if bank is not None else ItemBank()
+        self.students = OrderedDict()  # student id -> row, least recently seen first
+        self.max_students = max_students
+        self.evicted = 0
+        self.theta = np.zeros((min(capacity, max_students), topic_capacity))
+        self.answered = np.zeros((min(capacity, max_students), topic_capacity), dtype=np.int64)
+        self._next_row = 0
+        self._lock = threading.Lock()
+
+    def _rows(self, student_ids):
+        with self._lock:
+            rows = []
+            for student in student_ids:
+                row = self.students.get(student)
+                if row is None:
+                    row = self.students[student] = self._new_row()
+                else:
+                    self.students.move_to_end(student)
+                rows.append(row)
+            self._fit(self._next_row, len(self.bank.topics))
+        return np.array(rows, dtype=np.int64)
+
+    def _new_row(self):
+        if len(self.students) < self.max_students:
+            self._next_row += 1
+            return self._next_row - 1
+        # Full: hand over the least recently seen student's row; their session still has their abilities
+        _, row = self.students.popitem(last=False)
+        self.theta[row] = 0.0
+        self.answered[row] = 0
+        self.evicted += 1
+        return row
+
+    def _fit(self, rows, columns):
+        have_rows, have_columns = self.theta.shape
+        if rows > have_rows or columns > have_columns:
+            shape = (have_rows if rows <= have_rows else max(rows, min(have_rows * 2, self.max_students)),
+                     have_columns if columns <= have_columns else max(columns, have_columns * 2))
+            for name in ("theta", "answered"):
+                old = getattr(self, name)
+                new = np.zeros(shape, dtype=old.dtype)
+                new[:old.shape[0], :old.shape[1]] = old
+                setattr(self, name, new)
+
+    def ability(self, student, topic):
+        """(theta, answers counted) for one student on one topic; (0.0, 0) if never seen."""
+        row = self.students.get(student)
+        column = self.bank.topics.get(topic)
+        if row is None or column is None or column >= self.theta.shape[1]:
+            return 0.0, 0
+        return float(self.theta[row, column]), int(self.answered[row, column])
+
+    def level(self, student, topic):
+        return LEVELS[level_index(self.ability(student, topic)[0])]
+
+    def update(self, students, topics, items, correct):
+        """Apply a batch of answers (parallel sequences) in one vectorized step; returns the new thetas.
+
+        A student may appear several times in one batch: every answer is scored
+        against the ability before the batch, and the steps are summed.
+        """
+        columns = np.array([self.bank.topic_column(topic) for topic in topics], dtype=np.int64)
+        rows = self._rows(students)
+        items = self.bank.row_of(items)
+        correct = np.asarray(correct, dtype=float)
+
+        with self._lock:
+            theta = self.theta[rows, columns]
+            residuals = correct - probability(theta, self.bank.difficulty[items])
+            np.add.at(self.theta, (rows, columns), _step(K_STUDENT, self.answered[rows, columns]) * residuals)
+            np.add.at(self.answered, (rows, columns), 1)
+            updated = self.theta[rows, columns]
+        self.bank.calibrate(items, residuals)
+        return updated
+
+    def snapshot(self, student):
+        """{topic: [theta, answered]} for storing alongside the student's session."""
+        row = self.students.get(student)
+        if row is None:
+            return {}
+        return {
+            topic: [float(self.theta[row, column]), int(self.answered[row, column])]
+            for topic, column in self.bank.topics.items()
+            if column < self.theta.shape[1] and self.answered[row, column]
+        }
+
+    def restore(self, student, snapshot):
+        """Replace a student's abilities with a snapshot, e.g. one saved by another worker.
+
+        The stored snapshot is the source of truth: whatever this process remembers
+        about the student may be older, so it is overwritten, not merged.
+        """
+        if snapshot is None:
+            return
+        columns = {topic: self.bank.topic_column(topic) for topic in snapshot}
+        row = self._rows([student])[0]
+        with self._lock:
+            self.theta[row] = 0.0
+            self.answered[row] = 0
+            for topic, (theta, answered) in snapshot.items():
+                self.theta[row, columns[topic]] = theta
+                self.answered[row, columns[topic]] = answered
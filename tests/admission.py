@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+# Priority classes, most urgent first
+INTERACTIVE = 0  # chat, simplify: a student is waiting on the answer
+STANDARD = 1  # live question generation, answer explanations
+BACKGROUND = 2  # /compare grading, question-pool prefetch
+PRIORITY_NAMES = {INTERACTIVE: "interactive", STANDARD: "standard", BACKGROUND: "background"}
+
+# Requests per minute allowed by our Gemini quota; 0 disables client-side limiting
+RPM = float(os.getenv("GEMINI_RPM", 2000))
+BURST = float(os.getenv("GEMINI_BURST", 20))
+# Longest a call may queue for a token before it is shed, per priority class (seconds)
+QUEUE_DEADLINES = {
+    INTERACTIVE: float(os.getenv("ADMISSION_INTERACTIVE_WAIT", 5)),
+    STANDARD: float(os.getenv("ADMISSION_STANDARD_WAIT", 15)),
+    BACKGROUND: float(os.getenv("ADMISSION_BACKGROUND_WAIT", 60)),
+}
+
+
+class Overloaded(Exception):
+    """The call could not be admitted before its deadline; retry_after is a hint in seconds."""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class _Waiter:
+    __slots__ = ("priority", "notify", "granted", "cancelled")
+
+    def __init__(self, priority, notify):
+        self.priority = priority
+        self.notify = notify
+        self.granted = False
+        self.cancelled = False
+
+
+class AdmissionController:
+    """Token bucket in front of the upstream API that hands out tokens by priority.
+
+    Calls queue in (priority, arrival) order and a dispatcher thread grants tokens
+    as the bucket refills. A call is shed straight away when its estimated wait is
+    longer than its deadline, or later if higher-priority traffic pushes it past
+    the deadline. pause() empties the bucket for a Retry-After period, so every
+    caller backs off together instead of each one retrying into more 429s.
+    """
+
+    def __init__(self, rpm=RPM, burst=BURST, deadlines=None):
+        self.rpm = rpm
+        self.rate = rpm / 60.0
+        self.capacity = max(1.0, burst)
+        self.deadlines = {**QUEUE_DEADLINES, **(deadlines or {})}
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._queue = []  # heap of (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._dispatcher = None
+        self.admitted = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.shed = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.pauses = 0
+
+    def acquire(self, priority=STANDARD):
+        """Block until the call may go upstream; raises Overloaded if it can't within its deadline."""
+        event = threading.Event()
+        waiter = self._enqueue(priority, event.set)
+        if waiter is not None and not event.wait(self.deadlines[priority]):
+            self._abandon(waiter)
+
+    async def acquire_async(self, priority=STANDARD):
+        """Event-loop version of acquire()."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(priority, notify)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(granted, self.deadlines[priority])
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+        except asyncio.CancelledError:
+            with self._cond:
+                waiter.cancelled = True
+            raise
+
+    def pause(self, seconds):
+        """Stop granting tokens for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._cond:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = 0.0
+            self.updated = now
+            self.pauses += 1
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "rpm": self.rpm,
+                "tokens": round(self.tokens, 2),
+                "paused_for_s": round(max(0.0, self.paused_until - now), 2),
+                "queued": {
+                    name: sum(1 for p, _, w in self._queue if p == priority and not w.cancelled)
+                    for priority, name in PRIORITY_NAMES.items()
+                },
+                "admitted": {PRIORITY_NAMES[p]: n for p, n in self.admitted.items()},
+                "shed": {PRIORITY_NAMES[p]: n for p, n in self.shed.items()},
+                "pauses": self.pauses,
+            }
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _estimated_wait(self, priority, now):
+        ahead = sum(1 for p, _, w in self._queue if p <= priority and not w.cancelled)
+        wait = max(0.0, self.paused_until - now)
+        if self.rate > 0:
+            wait += max(0.0, ahead + 1 - self.tokens) / self.rate
+        return wait
+
+    def _enqueue(self, priority, notify):
+        """Admit immediately (returns None), queue (returns the waiter) or raise Overloaded."""
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if now >= self.paused_until and not self._queue and (self.rate <= 0 or self.tokens >= 1):
+                if self.rate > 0:
+                    self.tokens -= 1
+                self.admitted[priority] += 1
+                return None
+
+            wait = self._estimated_wait(priority, now)
+            if wait > self.deadlines[priority]:
+                self.shed[priority] += 1
+                raise Overloaded("Upstream quota exhausted, try again shortly.", wait)
+
+            waiter = _Waiter(priority, notify)
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self._dispatcher.start()
+            self._cond.notify()
+            return waiter
+
+    def _abandon(self, waiter):
+        """Called when a waiter's deadline passes; a token granted in the meantime still counts."""
+        with self._cond:
+            if waiter.granted:
+                return
+            waiter.cancelled = True
+            self.shed[waiter.priority] += 1
+            retry_after = self._estimated_wait(waiter.priority, time.monotonic())
+        raise Overloaded("Upstream quota exhausted, try again shortly.", retry_after)
+
+    def _dispatch(self):
+        with self._cond:
+            while True:
+                while self._queue and self._queue[0][2].cancelled:
+                    heapq.heappop(self._queue)
+                if not self._queue:
+                    self._cond.wait()
+                    continue
+
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    self._cond.wait(self.paused_until - now)
+                    continue
+                if self.rate > 0 and self.tokens < 1:
+                    self._cond.wait((1 - self.tokens) / self.rate)
+                    continue
+
+                _, _, waiter = heapq.heappop(self._queue)
+                if self.rate > 0:
+                    self.tokens -= 1
+                waiter.granted = True
+                self.admitted[waiter.priority] += 1
+                waiter.notify()
+
+
+# Shared by the threaded and asyncio clients so both count against the same quota
+admission = AdmissionController()
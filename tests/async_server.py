@@ -0,0 +1,386 @@
+"""asyncio serving mode for the Gemini-proxy routes of server.py.
+
+Same request/response contracts as the Flask views, but every upstream call is a
+non-blocking aiohttp request, so one process can hold hundreds of LLM calls in
+flight instead of one per worker thread.
+
+    python async_server.py
+    gunicorn async_server:create_app --worker-class aiohttp.GunicornWebWorker
+"""
+import asyncio
+import os
+import time
+
+import aiohttp
+from aiohttp import web
+
+import gemini_async
+import server
+from admission import BACKGROUND, INTERACTIVE, Overloaded, admission
+import metrics
+from fanout import REQUEST_DEADLINE
+from mcq import QUESTION_SCHEMA, ROUND_RETRY_BUDGET, batch_prompt, parse_batch
+from text_cache import cache_key
+
+UPSTREAM_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError)
+
+routes = web.RouteTableDef()
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Allow requests from the frontend, like flask_cors does for server.py."""
+    if request.method == "OPTIONS":
+        response = web.Response()
+    else:
+        response = await handler(request)
+    response.headers["Access-Control-Allow-Origin"] = request.headers.get("Origin", "*")
+    response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = request.headers.get(
+        "Access-Control-Request-Headers", "Content-Type, X-Session-Id"
+    )
+    return response
+
+
+@web.middleware
+async def overload_middleware(request, handler):
+    """Answer shed requests with a fast 503, like the Flask errorhandler in server.py."""
+    try:
+        return await handler(request)
+    except Overloaded as e:
+        return web.json_response({"error": str(e)}, status=503, headers={"Retry-After": str(e.retry_after)})
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Per-route request counts, latency and in-flight gauge, as recorded by server.py."""
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else "unmatched"
+    started = time.perf_counter()
+    metrics.HTTP_IN_FLIGHT.inc(route)
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec(route)
+        metrics.HTTP_REQUESTS.inc(route, request.method, str(status))
+        metrics.HTTP_LATENCY.observe(time.perf_counter() - started, route)
+
+
+def get_session_id(request):
+    return request.headers.get("X-Session-Id") or request.query.get("session_id") or request.remote
+
+
+async def read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+@routes.post("/compare")
+async def compare(request):
+    data = await read_json(request)
+    experiment_id = data.get("experiment_id") or request.query.get("experiment_id") or server.DEFAULT_EXPERIMENT
+    # The first lookup parses the blueprint PDFs, so keep it off the event loop
+    registry = await asyncio.to_thread(server.blueprint_registry.ensure_loaded)
+    experiment = registry.get(experiment_id)
+    if experiment is None:
+        return web.json_response({"error": f"Unknown experiment: {experiment_id}"}, status=404)
+
+    local = server.score_locally(data, experiment)
+    verdict = None
+    if server.API_KEY and server.needs_procedure_judgement(local):
+        try:
+            verdict = server.parse_procedure_verdict(await gemini_async.generate_text(
+                server.procedure_prompt(data, experiment), generation_config=server.PROCEDURE_VERDICT_CONFIG,
+                priority=BACKGROUND, call_site="compare",
+            ))
+        except (*UPSTREAM_ERRORS, Overloaded) as e:
+            print(f"Procedure judgement failed, scoring it locally: {e}")
+    return web.json_response(server.compare_response(server.finish_score(local, verdict)))
+
+
+@routes.post("/chat")
+async def chat(request):
+    data = await read_json(request)
+    user_message = data.get("message", "")
+
+    if not user_message:
+        return web.json_response({"error": "Message is empty!"}, status=400)
+    if not server.API_KEY:
+        return web.json_response({"error": "Missing Gemini API Key. Check .env file."})
+
+    session_id = request.headers.get("X-Session-Id") or request.query.get("session_id")
+    history = await asyncio.to_thread(server.chat_memory.context, session_id) if session_id else ""
+    cached = None if history else server.chat_cache.get(user_message)
+    if cached is not None:
+        if session_id:
+            await asyncio.to_thread(server.chat_memory.record, session_id, user_message, cached)
+        return web.json_response({"response": cached})
+
+    # Building the prompt loads (or on first use builds) the lab-manual index and scores it
+    prompt = await asyncio.to_thread(server.chat_prompt, user_message, history)
+    try:
+        bot_response = await gemini_async.generate_text(prompt, priority=INTERACTIVE, call_site="chat")
+    except UPSTREAM_ERRORS as e:
+        return web.json_response({"error": f"API Error: {e}"})
+
+    if not bot_response:
+        return web.json_response({"error": "Empty response from Gemini AI."})
+
+    if not history:
+        server.chat_cache.set(user_message, bot_response)
+    if session_id:
+        await asyncio.to_thread(server.chat_memory.record, session_id, user_message, bot_response)
+    return web.json_response({"response": bot_response})
+
+
+async def sse_response(request):
+    response = web.StreamResponse(headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.content_type = "text/event-stream"
+    await response.prepare(request)
+    return response
+
+
+@routes.post("/chat/stream")
+async def chat_stream(request):
+    """Async version of the Flask /chat/stream: the chatbot response as server-sent events."""
+    data = await read_json(request)
+    user_message = data.get("message", "")
+
+    if not user_message:
+        return web.json_response({"error": "Message is empty!"}, status=400)
+    if not server.API_KEY:
+        return web.json_response({"error": "Missing Gemini API Key. Check .env file."}, status=500)
+
+    session_id = request.headers.get("X-Session-Id") or request.query.get("session_id")
+    history = await asyncio.to_thread(server.chat_memory.context, session_id) if session_id else ""
+    cached = None if history else server.chat_cache.get(user_message)
+    if cached is not None:
+        if session_id:
+            await asyncio.to_thread(server.chat_memory.record, session_id, user_message, cached)
+        response = await sse_response(request)
+        await response.write(server.sse_event({"text": cached}).encode("utf-8"))
+        await response.write(server.sse_event({}, event="done").encode("utf-8"))
+        await response.write_eof()
+        return response
+
+    prompt = await asyncio.to_thread(server.chat_prompt, user_message, history)
+    chunks = gemini_async.stream_text(prompt, priority=INTERACTIVE, call_site="chat")
+    parts = []
+    # Wait for the first chunk before the response starts, so a shed request still gets a plain 503
+    try:
+        parts.append(await chunks.__anext__())
+    except StopAsyncIteration:
+        pass
+    except UPSTREAM_ERRORS as e:
+        return web.json_response({"error": f"API Error: {e}"}, status=502)
+
+    # A client that goes away makes a write fail (or cancels us); either way the upstream stream is closed
+    try:
+        response = await sse_response(request)
+        if parts:
+            await response.write(server.sse_event({"text": parts[0]}).encode("utf-8"))
+            try:
+                async for text in chunks:
+                    parts.append(text)
+                    await response.write(server.sse_event({"text": text}).encode("utf-8"))
+            except UPSTREAM_ERRORS as e:
+                await response.write(server.sse_event({"error": f"API Error: {e}"}, event="error").encode("utf-8"))
+                await response.write_eof()
+                return response
+    finally:
+        await chunks.aclose()
+
+    if parts:
+        reply = "".join(parts)
+        if not history:
+            server.chat_cache.set(user_message, reply)
+        if session_id:
+            await asyncio.to_thread(server.chat_memory.record, session_id, user_message, reply)
+        await response.write(server.sse_event({}, event="done").encode("utf-8"))
+    else:
+        await response.write(server.sse_event({"error": "Empty response from Gemini AI."}, event="error").encode("utf-8"))
+    await response.write_eof()
+    return response
+
+
+@routes.post("/simplify-text")
+async def simplify_text(request):
+    text_to_simplify = (await read_json(request)).get("text")
+    if not text_to_simplify:
+        return web.json_response({"error": "No text provided for simplification."}, status=400)
+
+    # The cache has a SQLite tier, so keep it off the event loop
+    key = cache_key(text_to_simplify, server.SIMPLIFY_PROMPT_VERSION)
+    cached = await asyncio.to_thread(server.simplify_cache.get, key)
+    if cached is not None:
+        return web.json_response({"simplified_text": cached})
+
+    try:
+        simplified_text = server.clean_simplified_text(
+            await gemini_async.generate_text(server.simplify_prompt(text_to_simplify), priority=INTERACTIVE,
+                                       call_site="simplify")
+        )
+    except UPSTREAM_ERRORS as e:
+        return web.json_response({"error": f"API Request Error: {e}"}, status=500)
+
+    if simplified_text:
+        await asyncio.to_thread(server.simplify_cache.set, key, simplified_text)
+        return web.json_response({"simplified_text": simplified_text})
+    return web.json_response({"error": "Simplified text not found in API response."}, status=500)
+
+
+async def generate_questions(num_questions, level, topic):
+    """Async version of mcq.generate_questions_batch."""
+    if not server.API_KEY:
+        return {"error": "API Key is missing. Check .env.local file."}
+
+    questions = []
+    generation_config = {"responseMimeType": "application/json", "responseSchema": QUESTION_SCHEMA}
+    try:
+        for _ in range(1 + ROUND_RETRY_BUDGET):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            text = await gemini_async.generate_text(batch_prompt(missing, level, topic),
+                                                    generation_config=generation_config, call_site="question")
+            questions.extend(parse_batch(text)[:missing])
+    except UPSTREAM_ERRORS as e:
+        return {"error": f"API Error: {e}"}
+
+    if len(questions) < num_questions:
+        return {"error": "Invalid AI response format."}
+    return questions
+
+
+async def fetch_questions(count, level):
+    """Fresh questions from the pool, or generated on the event loop when it runs short."""
+    questions = server.question_pool.take(server.DEFAULT_TOPIC, level, count)
+    if questions is None:
+        questions = await generate_questions(count, level, server.DEFAULT_TOPIC)
+    return questions
+
+
+async def next_round(session_id, level):
+    """Async version of server.next_round.
+
+    The bank's SQLite work runs in worker threads, but generation is awaited here
+    on the loop, so no thread is held while the upstream call is in flight.
+    """
+    questions = await asyncio.to_thread(server.select_questions, session_id)
+    from_bank = questions is not None
+    if not from_bank:
+        questions = []
+        for _ in range(1 + ROUND_RETRY_BUDGET):
+            missing = server.QUESTIONS_PER_ROUND - len(questions)
+            if missing <= 0:
+                break
+            fresh = await fetch_questions(missing, level)
+            if "error" in fresh:
+                if not questions:
+                    return fresh
+                break
+            await asyncio.to_thread(server.add_fresh, session_id, questions, fresh, level)
+        if not questions:
+            return {"error": "Invalid AI response format."}
+    await asyncio.to_thread(server.serve_round, session_id, questions, from_bank)
+    return questions
+
+
+@routes.get("/generate-question")
+async def get_question(request):
+    session_id = get_session_id(request)
+    current_level, _ = await asyncio.to_thread(server.load_quiz_state, session_id)
+
+    questions = await next_round(session_id, server.difficulty_levels[current_level])
+    if "error" in questions:
+        return web.json_response(questions)
+
+    await asyncio.to_thread(server.save_quiz_state, session_id, questions)
+    return web.json_response(questions)
+
+
+async def generate_explanation(question, correct_answer, question_data):
+    item_id = question_data.get("item_id")
+    if item_id is not None:
+        stored = await asyncio.to_thread(server.question_bank.explanation, item_id)
+        if stored:
+            return stored
+    if not server.API_KEY:
+        return "Explanation not available due to missing API key."
+    try:
+        explanation = await gemini_async.generate_text(server.explanation_prompt(question, correct_answer, question_data),
+                                                       call_site="explanation")
+    except UPSTREAM_ERRORS as e:
+        return f"API Request Error: {e}"
+    except Overloaded:
+        return "Explanation not available right now. Please try again shortly."
+    if explanation and item_id is not None:
+        await asyncio.to_thread(server.question_bank.set_explanation, item_id, explanation)
+    return explanation if explanation else "No explanation provided by AI."
+
+
+@routes.post("/check-answer")
+async def check_answer(request):
+    session_id = get_session_id(request)
+    _, question_data = await asyncio.to_thread(server.load_quiz_state, session_id)
+    selected_answers = (await read_json(request)).get("selected_answers")
+
+    if not question_data:
+        return web.json_response({"error": "No questions generated yet!"}, status=400)
+
+    if not isinstance(selected_answers, list) or len(selected_answers) != len(question_data):
+        return web.json_response({"error": "Incorrect number of answers provided."}, status=400)
+
+    current_level, message, correct_answers, is_correct = await asyncio.to_thread(
+        server.grade_round, session_id, question_data, selected_answers)
+    await asyncio.to_thread(server.save_quiz_state, session_id, [])
+
+    try:
+        explanations = await asyncio.wait_for(asyncio.gather(*(
+            generate_explanation(q["question"], q[correct_answers[i]], q) for i, q in enumerate(question_data)
+        )), timeout=REQUEST_DEADLINE)
+    except asyncio.TimeoutError:
+        explanations = ["Explanation timed out. Please try again."] * len(question_data)
+
+    return web.json_response(
+        server.round_response(message, current_level, question_data, correct_answers, is_correct, explanations)
+    )
+
+
+@routes.get("/metrics")
+async def metrics_endpoint(request):
+    return web.Response(body=metrics.render().encode("utf-8"), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+
+@routes.get("/chat-cache")
+async def chat_cache_stats(request):
+    return web.json_response({**server.chat_cache.stats(), "memory": server.chat_memory.stats()})
+
+
+@routes.get("/upstream-stats")
+async def upstream_stats(request):
+    return web.json_response({"admission": admission.stats(), "coalescing": gemini_async.coalescer.stats()})
+
+
+async def _close_upstream(app):
+    await gemini_async.close_session()
+
+
+def create_app():
+    metrics.start_flusher()
+    app = web.Application(middlewares=[metrics_middleware, cors_middleware, overload_middleware])
+    app.add_routes(routes)
+    app.on_cleanup.append(_close_upstream)
+    return app
+
+
+if __name__ == "__main__":
+    web.run_app(create_app(), port=int(os.getenv("PORT", 5000)))
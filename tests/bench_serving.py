@@ -0,0 +1,162 @@
+"""Compare threaded Flask serving (server.py) with the asyncio mode (async_server.py).
+
+Both servers run in-process against fake_gemini.py with a fixed upstream latency,
+then the same concurrent load is sent to each:
+
+    python bench_serving.py --latency 1.0 --requests 400 --concurrency 200 --threads 16
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import fake_gemini
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def start_threaded_server(app, port, threads):
+    """Serve the Flask app with a fixed thread pool, the way a gthread gunicorn worker would."""
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    httpd = PooledWSGIServer("127.0.0.1", port, app, handler=QuietHandler)
+    httpd.request_queue_size = 1024
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def start_async_server():
+    """Run async_server on its own event loop thread; returns the bound port."""
+    from aiohttp import web
+    import async_server
+
+    ready = threading.Event()
+    bound = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        runner = web.AppRunner(async_server.create_app())
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", 0, backlog=1024).start())
+        bound["port"] = runner.addresses[0][1]
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return bound["port"]
+
+
+async def drive(base_url, route, total, concurrency):
+    """Send `total` requests to a route with at most `concurrency` in flight."""
+    import aiohttp
+
+    latencies, errors = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async def one(session):
+        nonlocal errors
+        if route == "/chat":
+            # Unique messages so the similarity cache can't answer them
+            body = {"message": f"Explain {uuid.uuid4().hex} in terms of Ohm's law"}
+        else:
+            body = {"aim": "a", "apparatus": "b", "procedure": "c", "observations": "d", "conclusion": "e"}
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                async with session.post(base_url + route, json=body) as response:
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+            except aiohttp.ClientError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=600)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(one(session) for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake upstream latency in seconds")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16, help="worker threads for the Flask server")
+    parser.add_argument("--routes", default="/chat,/compare")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    upstream = fake_gemini.start(latency=args.latency)
+    # Must be set before gemini_client is imported by the servers
+    os.environ["GEMINI_API_BASE"] = f"http://127.0.0.1:{upstream.server_port}"
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("GEMINI_POOL_SIZE", str(args.threads))
+    # Measure the serving modes, not the client-side quota limiter
+    os.environ.setdefault("GEMINI_RPM", "0")
+
+    import server
+
+    threaded = start_threaded_server(server.create_app(preload=True), 0, args.threads)
+    async_port = start_async_server()
+
+    results = {"upstream_latency_s": args.latency, "flask_threads": args.threads, "modes": {}}
+    for mode, port in (("threaded", threaded.server_port), ("asyncio", async_port)):
+        for route in args.routes.split(","):
+            result = asyncio.run(drive(f"http://127.0.0.1:{port}", route, args.requests, args.concurrency))
+            results["modes"].setdefault(mode, {})[route] = result
+            print(f"{mode:9} {route:10} {result['throughput_rps']:8.1f} req/s  "
+                  f"p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  errors {result['errors']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
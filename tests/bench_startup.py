@@ -0,0 +1,158 @@
+"""Measure how long server.py takes to start and answer its first requests.
+
+Every run is a fresh interpreter talking to fake_gemini.py:
+
+    python bench_startup.py --runs 5                 # resources load on the first requests
+    python bench_startup.py --runs 5 --preload       # preloaded parent, first requests in a forked worker
+    python bench_startup.py --runs 5 --cold-cache    # each run starts from an empty CACHE_DIR
+
+Reports the import and create_app() times, the first response of each route and
+the serving process's memory. With --preload that process is forked from the
+parent, as under gunicorn's preload_app, and its memory is split into what is
+still shared with the parent and what it had to copy.
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import fake_gemini
+
+FIRST_REQUESTS = (
+    ("GET", "/experiments", None),
+    ("POST", "/chat", {"message": "Which indicator is used in the titration and why?"}),
+    ("POST", "/simplify-text", {"text": "Rinse the burette with distilled water and then with the acid."}),
+    ("GET", "/generate-question", None),
+)
+
+
+def memory():
+    """kB of memory of this process from /proc/self/smaps_rollup: rss, pss, shared and private."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0])
+    except OSError:
+        import resource
+
+        return {"rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "shared_kb": fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0),
+        "private_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def first_requests(app):
+    client = app.test_client()
+    timings = {}
+    for method, path, body in FIRST_REQUESTS:
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body, headers={"X-Session-Id": "bench-startup"})
+        response.get_data()
+        timings[path] = round((time.perf_counter() - started) * 1000, 1)
+        if response.status_code != 200:
+            timings[path + " status"] = response.status_code
+    return {"first_ms": timings}
+
+
+def run_child(preload):
+    """One measured start, in this (fresh) interpreter; prints the result as JSON."""
+    started = time.perf_counter()
+    import server
+
+    imported = time.perf_counter()
+    app = server.create_app(preload=preload)
+    created = time.perf_counter()
+    result = {"import_ms": round((imported - started) * 1000, 1), "create_app_ms": round((created - imported) * 1000, 1)}
+
+    if not preload:
+        result.update(first_requests(app), **memory())
+        print(json.dumps(result))
+        return
+
+    # Serve from a forked worker, as gunicorn does with preload_app (and gc.freeze() in when_ready)
+    gc.freeze()
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        worker = dict(first_requests(app), **memory())
+        with os.fdopen(write_fd, "w") as f:
+            json.dump(worker, f)
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        result.update(json.load(f))
+    os.waitpid(pid, 0)
+    print(json.dumps(result))
+
+
+def summarize(runs):
+    """Median of every number across runs, keeping the nesting of first_ms."""
+    summary = {}
+    for key, value in runs[0].items():
+        if isinstance(value, dict):
+            summary[key] = summarize([run[key] for run in runs if key in run])
+        elif isinstance(value, (int, float)):
+            summary[key] = round(statistics.median(run[key] for run in runs if key in run), 1)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--preload", action="store_true", help="preload in the parent, serve from a forked child")
+    parser.add_argument("--cold-cache", action="store_true", help="give every run an empty CACHE_DIR")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake upstream latency in seconds")
+    parser.add_argument("--output", help="write the runs and their medians as JSON to this file")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.preload)
+        return
+
+    upstream = fake_gemini.start(latency=args.latency)
+    env = dict(os.environ, GEMINI_API_BASE=f"http://127.0.0.1:{upstream.server_port}", GEMINI_RPM="0")
+    env.setdefault("GEMINI_API_KEY", "benchmark")
+    command = [sys.executable, os.path.abspath(__file__), "--child"] + (["--preload"] if args.preload else [])
+
+    runs = []
+    with tempfile.TemporaryDirectory() as shared_cache:
+        # With a shared cache, an untimed first run fills it the way an earlier deploy would have
+        for i in range(args.runs + (0 if args.cold_cache else 1)):
+            with tempfile.TemporaryDirectory() as own_cache:
+                env["CACHE_DIR"] = own_cache if args.cold_cache else shared_cache
+                output = subprocess.run(command, env=env, capture_output=True, text=True, check=True).stdout
+            if args.cold_cache or i:
+                runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    summary = summarize(runs)
+    mode = "preloaded, forked worker" if args.preload else "lazy"
+    print(f"{mode}, {'empty' if args.cold_cache else 'warm'} cache, median of {len(runs)} runs")
+    print(f"  import server      {summary['import_ms']:8.1f} ms")
+    print(f"  create_app()       {summary['create_app_ms']:8.1f} ms")
+    for path, ms in summary["first_ms"].items():
+        print(f"  first {path:<18} {ms:6.1f} ms")
+    for name in ("rss_kb", "pss_kb", "shared_kb", "private_kb"):
+        if name in summary:
+            print(f"  {name[:-3]:<18} {summary[name] / 1024:8.1f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"preload": args.preload, "cold_cache": args.cold_cache, "runs": runs, "median": summary},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import re
+import threading
+
+from grading import parse_blueprint
+from text_cache import CACHE_DIR
+
+# Every *.pdf in this folder is registered as an experiment (id = file name, slugified). Only lab
+# manuals go here; student samples such as sample1.pdf stay outside it so they are never graded against
+BLUEPRINT_DIR = os.getenv("BLUEPRINT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lab_manuals"))
+BLUEPRINT_CACHE_DIR = os.path.join(CACHE_DIR, "blueprints")
+# Bump when the extraction below changes so stale cached parses are ignored
+EXTRACTOR_VERSION = 1
+
+SECTION_HEADERS = ("Aim", "Apparatus and Chemicals Required", "Apparatus", "Chemicals", "Procedure",
+                   "Observations", "Result", "Balanced Chemical Equation")
+_INLINE_HEADER = re.compile(r"\s*\b(" + "|".join(SECTION_HEADERS) + r")\s*:\s*")
+_BULLET = re.compile(r"^(?:[•▪◦\-*]|o)(?:\s+|$)")
+_NUMBERED = re.compile(r"^(\d+)\s*[.)]\s*")
+
+
+def slugify(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")
+
+
+def _logical_lines(raw_text):
+    """Re-join the bullet markers and wrapped lines that PDF text extraction splits apart."""
+    lines = []
+    pending_marker = None
+    for line in raw_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line in ("•", "o", "▪", "◦", "-"):
+            pending_marker = line
+            continue
+        if pending_marker:
+            line = f"{pending_marker} {line}"
+            pending_marker = None
+
+        # "Result: ... Balanced Chemical Equation: ..." on one line -> one line per header
+        pieces = [p for p in _INLINE_HEADER.split(line) if p and p.strip()]
+        units = []
+        i = 0
+        while i < len(pieces):
+            if pieces[i] in SECTION_HEADERS:
+                units.append(f"{pieces[i]}:")
+                if i + 1 < len(pieces) and pieces[i + 1] not in SECTION_HEADERS:
+                    units.append(pieces[i + 1].strip())
+                    i += 1
+            else:
+                units.append(pieces[i].strip())
+            i += 1
+
+        for unit in units:
+            # "• Burette • Pipette" -> two items
+            for item in re.split(r"\s+(?=•)", unit):
+                starts_new = (item.endswith(":") and item[:-1] in SECTION_HEADERS) or _BULLET.match(item) or _NUMBERED.match(item)
+                if starts_new or not lines or lines[-1].endswith(":") and lines[-1][:-1] in SECTION_HEADERS:
+                    lines.append(item)
+                elif lines[-1].endswith("-"):
+                    lines[-1] += item  # word hyphenated across a line break
+                else:
+                    lines[-1] += " " + item
+    return lines
+
+
+def pdf_text_to_blueprint(raw_text):
+    """Rewrite one experiment's extracted PDF text into the blueprint layout parse_blueprint expects."""
+    sections, current = {}, None
+    for line in _logical_lines(raw_text):
+        if line.endswith(":") and line[:-1] in SECTION_HEADERS:
+            current = line[:-1]
+            sections.setdefault(current, [])
+        elif current:
+            sections[current].append(line)
+
+    def items(name):
+        return [_BULLET.sub("", line).strip() for line in sections.get(name, [])]
+
+    # Manuals group steps as "1. Phase title:" followed by "o" bullets; the bullets are the steps
+    procedure_lines = sections.get("Procedure", [])
+    if any(_BULLET.match(line) for line in procedure_lines):
+        steps = [_BULLET.sub("", line).strip() for line in procedure_lines if _BULLET.match(line)]
+    else:
+        steps = [_NUMBERED.sub("", line).strip() for line in procedure_lines]
+
+    apparatus = items("Apparatus")
+    if not apparatus:
+        apparatus = items("Apparatus and Chemicals Required")
+
+    parts = [
+        "Aim:\n" + " ".join(items("Aim")),
+        "Apparatus:\n" + "\n".join(f"• {item}" for item in apparatus),
+        "Chemicals:\n" + "\n".join(f"• {item}" for item in items("Chemicals")),
+        "Procedure:\n" + "\n".join(f"{i}. {step}" for i, step in enumerate(steps, 1)),
+        "Result:\n" + " ".join(items("Result")),
+        "Balanced Chemical Equation:\n" + " ".join(items("Balanced Chemical Equation")),
+    ]
+    return "\n\n".join(parts) + "\n"
+
+
+def extract_experiments(path):
+    """Pull every experiment (one per 'Aim:' section) out of a lab-manual PDF."""
+    import fitz  # PyMuPDF, imported here since it is slow to load and only needed on a cache miss
+
+    with fitz.open(path) as document:
+        text = "\n".join(page.get_text() for page in document)
+
+    chunks = [chunk for chunk in re.split(r"(?m)^\s*(?=Aim\s*:)", text) if re.match(r"\s*Aim\s*:", chunk)]
+    stem = slugify(os.path.splitext(os.path.basename(path))[0])
+    experiments = []
+    for i, chunk in enumerate(chunks):
+        blueprint_text = pdf_text_to_blueprint(chunk)
+        aim = parse_blueprint(blueprint_text)["aim"]
+        experiments.append({
+            "id": stem if i == 0 else f"{stem}-{i + 1}",
+            "title": aim[:120],
+            "source": os.path.basename(path),
+            "text": blueprint_text,
+        })
+    return experiments
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class BlueprintRegistry:
+    """Experiment id -> parsed blueprint, built once from PDFs with the parses cached on disk."""
+
+    def __init__(self, pdf_dir=BLUEPRINT_DIR, cache_dir=BLUEPRINT_CACHE_DIR):
+        self.pdf_dir = pdf_dir
+        self.cache_dir = cache_dir
+        self.experiments = {}
+        self.loaded = False
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def register(self, experiment_id, text, title=None, source="built-in"):
+        blueprint = parse_blueprint(text)
+        blueprint.update({"id": experiment_id, "title": title or blueprint["aim"][:120], "source": source})
+        with self._lock:
+            self.experiments[experiment_id] = blueprint
+        return blueprint
+
+    def get(self, experiment_id):
+        return self.experiments.get(experiment_id)
+
+    def list(self):
+        return [
+            {"id": b["id"], "title": b["title"], "source": b["source"], "steps": len(b["procedure"])}
+            for b in self.experiments.values()
+        ]
+
+    def ensure_loaded(self):
+        """load() on first use, so processes that never grade don't parse the PDFs."""
+        if not self.loaded:
+            with self._load_lock:
+                if not self.loaded:
+                    self.load()
+                    self.loaded = True
+        return self
+
+    def load(self):
+        """Register every PDF in pdf_dir; unchanged files are read from the parse cache."""
+        if not os.path.isdir(self.pdf_dir):
+            return self
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, "index.json")
+        index = self._read_json(index_path) or {}
+
+        for name in sorted(os.listdir(self.pdf_dir)):
+            if not name.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(self.pdf_dir, name)
+            stat = os.stat(path)
+
+            # Same mtime and size as last time: trust the recorded hash instead of re-reading the file
+            known = index.get(name)
+            if known and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+                sha256 = known["sha256"]
+            else:
+                sha256 = _file_sha256(path)
+                index[name] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": sha256}
+
+            cache_path = os.path.join(self.cache_dir, f"{sha256}.v{EXTRACTOR_VERSION}.json")
+            experiments = self._read_json(cache_path)
+            if experiments is None:
+                try:
+                    experiments = extract_experiments(path)
+                except (RuntimeError, ValueError) as e:
+                    print(f"Could not read blueprint PDF {name}: {e}")
+                    continue
+                self._write_json(cache_path, experiments)
+
+            for experiment in experiments:
+                self.register(experiment["id"], experiment["text"], experiment["title"], experiment["source"])
+
+        self._write_json(index_path, index)
+        return self
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        # Write then rename so a concurrent reader never sees half a file
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
@@ -0,0 +1,207 @@
+"""Grade a whole class's /compare submissions from a JSONL or CSV file.
+
+    python bulk_grading.py submissions.csv --output results.jsonl --concurrency 8
+
+Each row holds the /compare form fields (aim, apparatus, procedure, observations,
+conclusion), optionally experiment_id, and an id column (submission_id, id or
+student_id). Results are appended to the output file as each submission finishes,
+so running the same command again after an interruption skips the rows that are
+already graded.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from text_cache import CACHE_DIR
+
+BULK_CONCURRENCY = int(os.getenv("BULK_GRADING_CONCURRENCY", 8))
+# Checkpoint files for jobs started through POST /compare/bulk
+BULK_DIR = os.path.join(CACHE_DIR, "bulk")
+ID_FIELDS = ("submission_id", "id", "student_id")
+
+
+def detect_format(filename, content_type=""):
+    if (filename or "").lower().endswith(".csv") or "csv" in (content_type or ""):
+        return "csv"
+    return "jsonl"
+
+
+def read_submissions(text, fmt="jsonl"):
+    """Parse submissions into dicts, each with an "id"; unreadable JSONL lines come back with an "error"."""
+    rows = []
+    if fmt == "csv":
+        for index, row in enumerate(csv.DictReader(io.StringIO(text)), 1):
+            rows.append(_with_id({key.strip(): (value or "").strip() for key, value in row.items() if key}, index))
+        return rows
+
+    for index, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            rows.append({"id": f"line-{index}", "error": "Not a JSON object."})
+            continue
+        rows.append(_with_id(row, index))
+    return rows
+
+
+def _with_id(row, index):
+    for field in ID_FIELDS:
+        if row.get(field) not in (None, ""):
+            return dict(row, id=str(row[field]))
+    return dict(row, id=f"row-{index}")
+
+
+def load_checkpoint(path):
+    """Results already written to `path`, dropping a half-written last line left by a crash."""
+    if not os.path.exists(path):
+        return []
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+    results = []
+    for line in data[:end].decode("utf-8").splitlines():
+        try:
+            results.append(json.loads(line))
+        except ValueError:
+            continue
+    return results
+
+
+class Progress:
+    """Throughput and ETA for a grading run."""
+
+    def __init__(self, total, skipped=0):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def update(self, result):
+        self.done += 1
+        if "error" in result:
+            self.failed += 1
+
+    def snapshot(self):
+        elapsed = time.monotonic() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.skipped - self.done
+        return {
+            "total": self.total,
+            "skipped": self.skipped,
+            "graded": self.done,
+            "failed": self.failed,
+            "elapsed_s": round(elapsed, 1),
+            "per_second": round(rate, 2),
+            "eta_s": round(remaining / rate, 1) if rate else None,
+        }
+
+    def line(self):
+        s = self.snapshot()
+        eta = f"{s['eta_s']:.0f}s" if s["eta_s"] is not None else "?"
+        return (f"{s['skipped'] + s['graded']}/{s['total']} graded ({s['failed']} failed), "
+                f"{s['per_second']:.1f}/s, ETA {eta}")
+
+
+def grade_stream(rows, grade, concurrency=BULK_CONCURRENCY):
+    """Grade rows with at most `concurrency` in flight, yielding results as they finish.
+
+    Only a small window of rows is submitted ahead, so a large file doesn't queue
+    every submission at once.
+    """
+    rows = iter(rows)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = set()
+    try:
+        while True:
+            while len(pending) < concurrency * 2:
+                row = next(rows, None)
+                if row is None:
+                    break
+                pending.add(executor.submit(_grade_one, grade, row))
+            if not pending:
+                return
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+    finally:
+        # If the consumer stops early (client gone, Ctrl-C), don't start the queued rows
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _grade_one(grade, row):
+    if "error" in row:
+        return {"id": row["id"], "error": row["error"]}
+    try:
+        return dict(grade(row), id=row["id"])
+    except Exception as e:
+        return {"id": row["id"], "error": f"Grading failed: {e}"}
+
+
+class BulkRun:
+    """One resumable grading run: iterating it grades the rows missing from the checkpoint file.
+
+    Each result is appended to output_path before it is yielded, so whatever the
+    consumer has seen is already safe on disk.
+    """
+
+    def __init__(self, rows, output_path, grade, concurrency=BULK_CONCURRENCY):
+        self.output_path = output_path
+        self.grade = grade
+        self.concurrency = concurrency
+        ids = {row["id"] for row in rows}
+        # Failed rows are graded again on resume; a later line for the same id supersedes earlier ones
+        latest = {result.get("id"): result for result in load_checkpoint(output_path)}
+        self.previous = [result for id_, result in latest.items() if id_ in ids and "error" not in result]
+        done_ids = {result["id"] for result in self.previous}
+        self.todo = [row for row in rows if row["id"] not in done_ids]
+        self.progress = Progress(len(rows), skipped=len(rows) - len(self.todo))
+
+    def __iter__(self):
+        with open(self.output_path, "a", encoding="utf-8") as out:
+            for result in grade_stream(self.todo, self.grade, self.concurrency):
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+                self.progress.update(result)
+                yield result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL or CSV file of submissions")
+    parser.add_argument("--output", help="results JSONL, also the resume checkpoint (default: <input>.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="input format (default: from the file extension)")
+    args = parser.parse_args()
+
+    with open(args.input, encoding="utf-8-sig") as f:
+        rows = read_submissions(f.read(), args.format or detect_format(args.input))
+    output = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+
+    import server
+
+    job = BulkRun(rows, output, server.grade_submission, args.concurrency)
+    if job.progress.skipped:
+        print(f"Resuming: {job.progress.skipped} of {len(rows)} already graded in {output}", file=sys.stderr)
+    last_report = time.monotonic()
+    for _ in job:
+        if time.monotonic() - last_report >= 1:
+            last_report = time.monotonic()
+            print(job.progress.line(), file=sys.stderr)
+    print(job.progress.line(), file=sys.stderr)
+    print(json.dumps(job.progress.snapshot()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import itertools
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from similarity import LSHIndex, MinHasher, jaccard, normalize
+
+# Minimum Jaccard similarity of two messages' content words to reuse a stored answer;
+# tuned on the labelled paraphrase / non-paraphrase pairs in test_chat_cache.py
+SIMILARITY_THRESHOLD = float(os.getenv("CHAT_CACHE_THRESHOLD", 0.8))
+MAX_ENTRIES = int(os.getenv("CHAT_CACHE_SIZE", 2000))
+TTL = float(os.getenv("CHAT_CACHE_TTL", 24 * 3600))
+
+# Words that don't change what a question asks
+STOPWORDS = frozenset("""
+a an the is are was were be been being am do does did i me my we our you your it its this that these those
+there here of in on at to for from by with about into as and or so if then can could would should will shall
+may might must please tell give some any one which
+""".split())
+# Contractions as they look once normalize() has dropped the apostrophe
+CONTRACTIONS = {
+    "whats": "what is", "hows": "how is", "whys": "why is", "wheres": "where is", "whos": "who is",
+    "isnt": "is not", "arent": "are not", "wasnt": "was not", "werent": "were not", "dont": "do not",
+    "doesnt": "does not", "didnt": "did not", "cant": "can not", "cannot": "can not", "wont": "will not",
+    "shouldnt": "should not", "wouldnt": "would not", "couldnt": "could not",
+}
+# Negation, contrast and direction words: two questions differing in one of these ask different things
+# however alike the rest is ("what is ohms law" / "what is not ohms law"), so they must match exactly
+GUARD_WORDS = frozenset("""
+not no never without except unlike versus vs difference different between instead but only
+increase decrease more less higher lower maximum minimum before after
+""".split())
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _stem(word):
+    # Fold plain plurals so "resistors" and "resistor" (or "ohms" and "ohm") count as one word
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+def message_features(message):
+    """(content words, numbers, guard words) of a chat message, as compared by the cache."""
+    words = []
+    for word in normalize(message).split():
+        words.extend(CONTRACTIONS.get(word, word).split())
+    content = frozenset(_stem(word) for word in words if word not in STOPWORDS and not word.isdigit())
+    return content, tuple(sorted(_NUMBER.findall(message))), content & GUARD_WORDS
+
+
+class SimilarityCache:
+    """Answers near-duplicate chat messages from previously stored responses."""
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, max_entries=MAX_ENTRIES, ttl=TTL, num_perm=64, bands=16):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hasher = MinHasher(num_perm)
+        self.index = LSHIndex(num_perm, bands)
+        self.entries = OrderedDict()  # id -> (normalized, features, signature, response, expires_at)
+        self.exact = {}  # normalized message -> id
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def get(self, message):
+        """Return a stored response for a similar enough message, or None.
+
+        A near-duplicate must contain the same numbers and the same negation/contrast
+        words, and share at least `threshold` (Jaccard) of its content words.
+        """
+        key = normalize(message)
+        words, numbers, guards = message_features(message)
+        signature = self.hasher.signature(words)
+        now = time.time()
+
+        with self._lock:
+            entry_id = self.exact.get(key)
+            if entry_id is None:
+                best, best_score = None, self.threshold
+                for candidate in self.index.query(signature):
+                    other_words, other_numbers, other_guards = self.entries[candidate][1]
+                    if other_numbers != numbers or other_guards != guards:
+                        continue
+                    score = jaccard(words, other_words)
+                    if score >= best_score:
+                        best, best_score = candidate, score
+                entry_id = best
+                near = True
+            else:
+                near = False
+
+            if entry_id is not None:
+                entry = self.entries[entry_id]
+                if entry[4] > now:
+                    self.entries.move_to_end(entry_id)
+                    self.hits += 1
+                    self.near_hits += near
+                    return entry[3]
+                self._drop(entry_id)
+
+            self.misses += 1
+            return None
+
+    def set(self, message, response):
+        key = normalize(message)
+        features = message_features(message)
+        signature = self.hasher.signature(features[0])
+
+        with self._lock:
+            if key in self.exact:
+                self._drop(self.exact[key])
+            entry_id = next(self._ids)
+            self.entries[entry_id] = (key, features, signature, response, time.time() + self.ttl)
+            self.exact[key] = entry_id
+            self.index.add(entry_id, signature)
+            while len(self.entries) > self.max_entries:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "near_duplicate_hits": self.near_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+    def _drop(self, entry_id):
+        key, _, signature, _, _ = self.entries.pop(entry_id)
+        self.index.remove(entry_id, signature)
+        if self.exact.get(key) == entry_id:
+            del self.exact[key]
@@ -0,0 +1,172 @@
+"""Per-session chat history with a bounded prompt footprint.
+
+Each session keeps its most recent turns verbatim in a ring buffer. When they
+add up to more than CHAT_MEMORY_TOKENS, the oldest ones leave the buffer at once
+and wait in a pending list to be folded into a rolling summary on a background
+thread, so the request that triggered it doesn't wait. Pending turns are not
+sent as context: the context sent with each message is at most the summary plus
+about CHAT_MEMORY_TOKENS of recent turns, however long the conversation runs and
+whether or not summarizing succeeds. A failed fold leaves its turns pending for
+the next one; only turns beyond CHAT_MEMORY_TURNS pending are lost.
+
+State lives in the session store, so every worker process sees the same history.
+"""
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from retrieval import estimate_tokens
+
+# Recent turns kept verbatim, and the hard cap on how many are stored (and pending) per session
+CHAT_MEMORY_TOKENS = int(os.getenv("CHAT_MEMORY_TOKENS", 800))
+CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", 16))
+# A fold that hasn't finished after this long (worker died, upstream hung) may be retried
+FOLD_TIMEOUT = 120
+# Each turn is cut to this many characters per side before it is stored
+MAX_TURN_CHARS = 2000
+
+_summarizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+
+
+def summary_prompt(summary, turns):
+    conversation = "\n".join(f"Student: {turn['user']}\nTutor: {turn['assistant']}" for turn in turns)
+    earlier = f"Summary so far:\n{summary}\n\n" if summary else ""
+    return f"""
+You keep notes on a tutoring conversation between a student and a physics/chemistry lab tutor.
+{earlier}New exchanges:
+{conversation}
+
+Write an updated summary in at most 120 words: the topics and experiments discussed,
+what the student has understood or struggled with, and any open questions. Plain text only.
+"""
+
+
+class ChatMemory:
+    """Ring buffer of recent turns plus a rolling summary, per session id.
+
+    summarize(summary, turns) returns the new summary text and is only ever
+    called on the background summarizer thread.
+    """
+
+    def __init__(self, store, summarize, token_budget=CHAT_MEMORY_TOKENS, max_turns=CHAT_MEMORY_TURNS,
+                 prefix="chat:"):
+        self.store = store
+        self.summarize = summarize
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.prefix = prefix
+        self.folds = 0
+        self.fold_failures = 0
+        self.dropped = 0
+        # Striped locks serialize updates to one session without a lock per session
+        self._locks = [threading.Lock() for _ in range(64)]
+
+    def _lock(self, session_id):
+        return self._locks[zlib.crc32(session_id.encode("utf-8")) % len(self._locks)]
+
+    def _load(self, session_id):
+        state = self.store.get(self.prefix + session_id) or {}
+        return {
+            "summary": state.get("summary", ""),
+            "turns": deque(state.get("turns", []), maxlen=self.max_turns),
+            "pending": state.get("pending", []),  # left the buffer, not summarized yet
+            "seq": state.get("seq", 0),
+            "folding": state.get("folding"),  # [last seq being folded, started at]
+        }
+
+    def _save(self, session_id, state):
+        self.store.set(self.prefix + session_id, dict(state, turns=list(state["turns"])))
+
+    def context(self, session_id):
+        """The summary and recent turns as prompt text ("" for a new session)."""
+        state = self._load(session_id)
+        parts = []
+        if state["summary"]:
+            parts.append(f"Summary of the earlier conversation:\n{state['summary']}")
+        if state["turns"]:
+            parts.append("Recent messages:\n" + "\n".join(
+                f"Student: {turn['user']}\nTutor: {turn['assistant']}" for turn in state["turns"]
+            ))
+        return "\n\n".join(parts)
+
+    def record(self, session_id, user_message, reply):
+        """Append a turn, moving the oldest turns out of the buffer and into a fold if it is over budget."""
+        with self._lock(session_id):
+            state = self._load(session_id)
+            if len(state["turns"]) == self.max_turns:
+                state["pending"].append(state["turns"].popleft())
+            state["seq"] += 1
+            state["turns"].append({
+                "seq": state["seq"],
+                "user": user_message[:MAX_TURN_CHARS],
+                "assistant": reply[:MAX_TURN_CHARS],
+            })
+            self._evict(state)
+            fold = self._plan_fold(state)
+            if fold:
+                state["folding"] = [fold[-1]["seq"], time.time()]
+            self._save(session_id, state)
+
+        if fold:
+            _summarizer.submit(self._fold, session_id, state["summary"], fold)
+
+    def _evict(self, state):
+        """Move the oldest turns to pending until the rest fit the budget, capping what is pending."""
+        turns = state["turns"]
+        tokens = [estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"]) for turn in turns]
+        total = sum(tokens)
+        # Always keep the latest turn verbatim
+        for cost in tokens[:-1]:
+            if total <= self.token_budget:
+                break
+            state["pending"].append(turns.popleft())
+            total -= cost
+        overflow = len(state["pending"]) - self.max_turns
+        if overflow > 0:
+            # Summaries have been failing or lagging for a while; the oldest turns are lost unsummarized
+            del state["pending"][:overflow]
+            self.dropped += overflow
+
+    def _plan_fold(self, state):
+        """Pending turns to fold; empty if there are none or a fold is already running."""
+        folding = state["folding"]
+        if folding and folding[1] > time.time() - FOLD_TIMEOUT:
+            return []
+        return list(state["pending"])
+
+    def _fold(self, session_id, summary, turns):
+        try:
+            new_summary = (self.summarize(summary, turns) or "").strip()
+        except Exception as e:
+            print(f"Chat summary failed for a session, will retry on a later turn: {e}")
+            new_summary = ""
+        last_seq = turns[-1]["seq"]
+
+        with self._lock(session_id):
+            state = self._load(session_id)
+            if state["folding"] and state["folding"][0] == last_seq:
+                state["folding"] = None
+            if new_summary:
+                state["summary"] = new_summary
+                state["pending"] = [turn for turn in state["pending"] if turn["seq"] > last_seq]
+            self._save(session_id, state)
+
+        if new_summary:
+            self.folds += 1
+        else:
+            self.fold_failures += 1
+
+    def clear(self, session_id):
+        self.store.delete(self.prefix + session_id)
+
+    def stats(self):
+        return {
+            "token_budget": self.token_budget,
+            "max_turns": self.max_turns,
+            "folds": self.folds,
+            "fold_failures": self.fold_failures,
+            "dropped_turns": self.dropped,
+        }
@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+# How long a duplicate caller waits for the in-flight call before giving up (seconds)
+COALESCE_MAX_WAIT = float(os.getenv("GEMINI_COALESCE_MAX_WAIT", 90))
+
+
+def request_key(method, payload):
+    """Stable hash of an upstream request, so identical prompts share one call."""
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{method}\n{body}".encode("utf-8")).hexdigest()
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Counters:
+    def __init__(self):
+        self.calls = 0
+        self.collapsed = 0
+        self.timeouts = 0
+
+    def stats(self, in_flight):
+        total = self.calls + self.collapsed
+        return {
+            "in_flight": in_flight,
+            "upstream_calls": self.calls,
+            "collapsed": self.collapsed,
+            "wait_timeouts": self.timeouts,
+            "collapse_rate": round(self.collapsed / total, 4) if total else 0.0,
+        }
+
+
+class SingleFlight(_Counters):
+    """Collapse concurrent identical calls: the first caller runs fn, duplicates wait for its result.
+
+    The result (or exception) is shared by every waiter, so callers must treat it
+    as read-only. Nothing is cached once the call finishes. A duplicate that waits
+    longer than max_wait raises timeout_error, so callers can handle it like any
+    other upstream timeout.
+    """
+
+    def __init__(self, max_wait=COALESCE_MAX_WAIT, timeout_error=TimeoutError):
+        super().__init__()
+        self.max_wait = max_wait
+        self.timeout_error = timeout_error
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.collapsed += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+            return call.result
+
+        if not call.done.wait(self.max_wait):
+            with self._lock:
+                self.timeouts += 1
+            raise self.timeout_error(f"Identical upstream request still running after {self.max_wait}s")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return super().stats(len(self._calls))
+
+
+class AsyncSingleFlight(_Counters):
+    """Event-loop version of SingleFlight; waiters share one task per key."""
+
+    def __init__(self, max_wait=COALESCE_MAX_WAIT):
+        super().__init__()
+        self.max_wait = max_wait
+        self._tasks = {}
+
+    async def do(self, key, coro_fn):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+            self.calls += 1
+            # The first caller is never cut short; it sees the call through like an uncoalesced one
+            return await asyncio.shield(task)
+
+        self.collapsed += 1
+        try:
+            # shield: a waiter timing out or being cancelled must not cancel the shared call
+            return await asyncio.wait_for(asyncio.shield(task), self.max_wait)
+        except asyncio.TimeoutError:
+            if task.done():
+                raise
+            self.timeouts += 1
+            raise asyncio.TimeoutError(f"Identical upstream request still running after {self.max_wait}s")
+
+    def stats(self):
+        return super().stats(len(self._tasks))
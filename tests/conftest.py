@@ -0,0 +1,79 @@
+"""pytest fixtures: everything runs offline against fake_gemini.py.
+
+The stand-in is started and the environment set here, before any test imports
+server.py or gemini_client.py, since they read it at import time. Caches, the
+question bank and sessions go to a throwaway CACHE_DIR.
+
+    python -m pytest -q
+"""
+import os
+import tempfile
+import uuid
+
+import pytest
+
+import fake_gemini
+
+upstream = fake_gemini.start(stream_chunk_delay=0)
+os.environ.update(
+    GEMINI_API_BASE=f"http://127.0.0.1:{upstream.server_port}",
+    GEMINI_API_KEY="test-key",
+    GEMINI_RPM="0",  # no client-side quota, so tests never queue or get shed
+    CACHE_DIR=tempfile.mkdtemp(prefix="olabs-tests-"),
+    SESSION_STORE="memory",
+)
+os.environ.pop("METRICS_DIR", None)
+
+
+@pytest.fixture
+def client():
+    import server
+
+    return server.create_app().test_client()
+
+
+@pytest.fixture
+def session_id():
+    return uuid.uuid4().hex
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    """Make retries immediate; returns the list of (attempt, status) of every backoff taken."""
+    import gemini_client
+
+    taken = []
+
+    def backoff_delay(attempt, response=None):
+        taken.append((attempt, response.status_code if response is not None else None))
+        return 0.0
+
+    monkeypatch.setattr(gemini_client, "backoff_delay", backoff_delay)
+    return taken
+
+
+@pytest.fixture
+def failing_upstream(monkeypatch):
+    """Start a second stand-in that answers every call with one of `statuses` and point the client at it.
+
+    Set `.RequestHandlerClass.error_rate = 0` on the returned server to let it recover.
+    """
+    import gemini_client
+
+    servers = []
+
+    def start(*statuses):
+        httpd = fake_gemini.start(error_rate=1.0, error_statuses=statuses, stream_chunk_delay=0)
+        servers.append(httpd)
+        monkeypatch.setattr(gemini_client, "API_BASE", f"http://127.0.0.1:{httpd.server_port}")
+        return httpd
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def unique(text):
+    """Text that no earlier test has sent, so coalescing and the response caches can't answer it."""
+    return f"{text} ({uuid.uuid4().hex[:8]})"
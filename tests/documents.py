@@ -0,0 +1,131 @@
+"""Page-by-page simplification of whole lab-manual PDFs.
+
+PyMuPDF extraction is CPU-bound, so pages are read in a process pool instead of
+on the request thread. Extraction and the upstream simplify calls are pipelined:
+while page N is with Gemini, the next pages are already being extracted. At most
+PIPELINE_DEPTH pages are in flight at once and results are yielded in page
+order, so memory stays flat however long the document is.
+"""
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+EXTRACT_WORKERS = int(os.getenv("DOCUMENT_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+# Pages extracted or waiting on Gemini at the same time, per document
+PIPELINE_DEPTH = int(os.getenv("DOCUMENT_PIPELINE_DEPTH", 3))
+SIMPLIFY_WORKERS = int(os.getenv("DOCUMENT_SIMPLIFY_WORKERS", 16))
+# Pages with less text than this (covers, figure-only pages) are skipped rather than sent upstream
+MIN_PAGE_CHARS = 40
+
+_extract_pool = None
+_extract_lock = threading.Lock()
+_simplify_pool = ThreadPoolExecutor(max_workers=SIMPLIFY_WORKERS, thread_name_prefix="document")
+
+
+def page_count(path):
+    import fitz  # PyMuPDF; imported in the extraction workers, not by every process that imports this module
+
+    with fitz.open(path) as document:
+        return document.page_count
+
+
+def extract_page(path, number):
+    """Text of one page; runs in a worker process, so only the page's text crosses back."""
+    import fitz
+
+    with fitz.open(path) as document:
+        return document.load_page(number).get_text().strip()
+
+
+def _extractor():
+    # Created on first use, so importing this module doesn't start processes
+    global _extract_pool
+    with _extract_lock:
+        if _extract_pool is None:
+            # Not fork: this runs inside a threaded server, and a forked child could inherit
+            # a lock held by another thread (admission, pools, summarizer) and deadlock
+            _extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS,
+                                                mp_context=multiprocessing.get_context("forkserver"))
+        return _extract_pool
+
+
+def _simplify_one(simplify, number, extracted):
+    try:
+        text = extracted.result()
+    except Exception as e:
+        return {"page": number + 1, "error": f"Could not read page: {e}"}
+    if len(text) < MIN_PAGE_CHARS:
+        return {"page": number + 1, "skipped": "No text on this page."}
+    try:
+        return {"page": number + 1, "simplified_text": simplify(text)}
+    except Exception as e:
+        return {"page": number + 1, "error": f"Simplification failed: {e}"}
+
+
+def count_pages(path):
+    """Page count, read in the extraction pool; raises RuntimeError for files PyMuPDF can't open."""
+    return _extractor().submit(page_count, path).result()
+
+
+def simplify_pages(path, simplify, total=None, depth=PIPELINE_DEPTH):
+    """Yield one result dict per page, in order: {"page", "simplified_text" | "skipped" | "error"}.
+
+    simplify(text) is called on a thread per page and should raise on failure.
+    """
+    extractor = _extractor()
+    if total is None:
+        total = count_pages(path)
+    pending = {}  # page -> future of its result
+    next_page = 0
+
+    try:
+        for number in range(total):
+            # Keep the window full: each page is handed upstream as soon as its own text is ready,
+            # so later pages extract while earlier ones are with Gemini
+            while next_page < total and next_page - number < depth:
+                extracted = extractor.submit(extract_page, path, next_page)
+                pending[next_page] = _simplify_pool.submit(_simplify_one, simplify, next_page, extracted)
+                next_page += 1
+            yield pending.pop(number).result()
+    finally:
+        # Client went away: drop the pages that haven't started
+        for future in pending.values():
+            future.cancel()
+
+
+class DocumentRun:
+    """One /simplify-document stream, with counts for the closing summary line."""
+
+    def __init__(self, path, simplify, depth=PIPELINE_DEPTH):
+        self.path = path
+        self.simplify = simplify
+        self.depth = depth
+        self.total = count_pages(path)
+        self.pages = 0
+        self.simplified = 0
+        self.skipped = 0
+        self.failed = 0
+        self.started = time.monotonic()
+
+    def __iter__(self):
+        for result in simplify_pages(self.path, self.simplify, self.total, self.depth):
+            self.pages += 1
+            if "error" in result:
+                self.failed += 1
+            elif "skipped" in result:
+                self.skipped += 1
+            else:
+                self.simplified += 1
+            yield result
+
+    def summary(self):
+        return {
+            "total": self.total,
+            "pages": self.pages,
+            "simplified": self.simplified,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "elapsed_s": round(time.monotonic() - self.started, 2),
+        }
@@ -0,0 +1,262 @@
+"""Local stand-in for the Gemini generateContent/streamGenerateContent API, for offline runs and benchmarks.
+
+    python fake_gemini.py --port 8001 --latency 0.5
+    python fake_gemini.py --latency 0.8 --distribution lognormal --spread 0.5 --error-rate 0.02
+    python fake_gemini.py --responses recorded.jsonl
+    GEMINI_API_BASE=http://127.0.0.1:8001 python server.py
+
+Recorded responses are JSONL lines of {"prompt": ..., "response": <generateContent body>}
+(matched on the exact prompt) or {"match": <regex>, "text": ...} (first match wins).
+Run with --record-to FILE --upstream https://generativelanguage.googleapis.com to
+proxy real calls and save them in that format.
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_TEXT = (
+    "**Simplified Text:** Connect the resistor in series with the ammeter.\n\n"
+    "**Purpose:** This lets the ammeter measure the current through the resistor."
+)
+
+
+def sample_from_schema(schema, prompt, path="item", index=0):
+    """Build a response that satisfies a Gemini responseSchema, filling strings with distinct placeholders."""
+    kind = schema.get("type", "STRING").upper()
+    if kind == "ARRAY":
+        ids = re.findall(r"^\s*\[([^\]]+)\]", prompt, re.M)
+        count = re.search(r"exactly (\d+)", prompt)
+        count = len(ids) or (int(count.group(1)) if count else 1)
+        items = [sample_from_schema(schema.get("items", {}), prompt, path, i) for i in range(count)]
+        # Echo "[id] text" style ids back so batch prompts can be matched up
+        for item, item_id in zip(items, ids):
+            if isinstance(item, dict) and "id" in item:
+                item["id"] = item_id
+        return items
+    if kind == "OBJECT":
+        return {
+            name: sample_from_schema(prop, prompt, name, index)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if "enum" in schema:
+        return schema["enum"][index % len(schema["enum"])]
+    if kind in ("INTEGER", "NUMBER"):
+        return index
+    if kind == "BOOLEAN":
+        return True
+    return f"Sample {path} {index + 1}"
+
+
+class LatencyModel:
+    """Upstream latency in seconds: fixed, uniform (mean +/- spread), exponential or lognormal (sigma = spread)."""
+
+    DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+    def __init__(self, mean=0.0, distribution="fixed", spread=0.0):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.mean = mean
+        self.distribution = distribution
+        self.spread = spread
+
+    def sample(self):
+        if self.mean <= 0:
+            return 0.0
+        if self.distribution == "uniform":
+            return max(0.0, random.uniform(self.mean - self.spread, self.mean + self.spread))
+        if self.distribution == "exponential":
+            return random.expovariate(1 / self.mean)
+        if self.distribution == "lognormal":
+            # mu chosen so the distribution's mean is `mean`
+            return random.lognormvariate(math.log(self.mean) - self.spread ** 2 / 2, self.spread)
+        return self.mean
+
+
+def load_responses(path):
+    """Read recorded responses: ({prompt: body}, [(regex, text)])."""
+    exact, rules = {}, []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "prompt" in entry:
+                exact[entry["prompt"]] = entry["response"]
+            elif "match" in entry:
+                rules.append((re.compile(entry["match"], re.I), entry["text"]))
+    return exact, rules
+
+
+def response_body(text, prompt):
+    return {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}],
+        "usageMetadata": {
+            "promptTokenCount": len(prompt) // 4,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": (len(prompt) + len(text)) // 4,
+        },
+    }
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    latency = LatencyModel()
+    error_rate = 0.0
+    error_statuses = (503,)
+    stream_chunk_delay = 0.05
+    exact_responses = {}
+    response_rules = []
+    upstream = None  # base URL to proxy to when recording
+    record_to = None
+    calls = 0
+    errors = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) or b"{}"
+        payload = json.loads(raw)
+        with FakeGeminiHandler._lock:
+            FakeGeminiHandler.calls += 1
+
+        prompt = "".join(
+            part.get("text", "") for content in payload.get("contents", []) for part in content.get("parts", [])
+        )
+        streaming = ":streamGenerateContent" in self.path
+
+        if self.upstream:
+            self._proxy(raw, prompt)
+            return
+
+        time.sleep(self.latency.sample())
+        if self.error_rate and random.random() < self.error_rate:
+            with FakeGeminiHandler._lock:
+                FakeGeminiHandler.errors += 1
+            self._send_json(random.choice(self.error_statuses), {"error": {"message": "Injected failure"}},
+                            {"Retry-After": "1"})
+            return
+
+        body = self._answer(payload, prompt)
+        if streaming:
+            self._stream(body, prompt)
+        else:
+            self._send_json(200, body)
+
+    def _answer(self, payload, prompt):
+        if prompt in self.exact_responses:
+            return self.exact_responses[prompt]
+        for pattern, text in self.response_rules:
+            if pattern.search(prompt):
+                return response_body(text, prompt)
+        config = payload.get("generationConfig") or {}
+        if "responseSchema" in config:
+            return response_body(json.dumps(sample_from_schema(config["responseSchema"], prompt)), prompt)
+        return response_body(CANNED_TEXT, prompt)
+
+    def _stream(self, body, prompt):
+        """Send the answer a few words at a time as server-sent events, like alt=sse."""
+        parts = body.get("candidates", [{}])[0].get("content", {}).get("parts", [])
+        text = "".join(part.get("text", "") for part in parts)
+        words = re.findall(r"\S+\s*", text) or [""]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i in range(0, len(words), 4):
+            chunk = response_body("".join(words[i:i + 4]), prompt)
+            chunk["usageMetadata"]["candidatesTokenCount"] = len("".join(words[:i + 4])) // 4
+            self._write_chunk(f"data: {json.dumps(chunk)}\r\n\r\n".encode("utf-8"))
+            time.sleep(self.stream_chunk_delay)
+        self._write_chunk(b"")
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _proxy(self, raw, prompt):
+        """Forward to the real API and append the exchange to record_to."""
+        request = urllib.request.Request(self.upstream + self.path, data=raw,
+                                         headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                status, data = response.status, response.read()
+        except urllib.error.HTTPError as e:
+            status, data = e.code, e.read()
+        if status == 200 and ":streamGenerateContent" not in self.path:
+            with FakeGeminiHandler._lock, open(self.record_to, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"prompt": prompt, "response": json.loads(data)}) + "\n")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start(port=0, latency=0.0, distribution="fixed", spread=0.0, error_rate=0.0, error_statuses=(503,),
+          responses=None, stream_chunk_delay=0.05, upstream=None, record_to=None):
+    """Start the stand-in on a background thread; returns the server (see server.server_port)."""
+    exact, rules = load_responses(responses) if responses else ({}, [])
+    handler = type("ConfiguredFakeGeminiHandler", (FakeGeminiHandler,), {
+        "latency": LatencyModel(latency, distribution, spread),
+        "error_rate": error_rate,
+        "error_statuses": tuple(error_statuses),
+        "stream_chunk_delay": stream_chunk_delay,
+        "exact_responses": exact,
+        "response_rules": rules,
+        "upstream": upstream.rstrip("/") if upstream else None,
+        "record_to": record_to,
+    })
+    httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def add_arguments(parser):
+    """Fake-upstream options, shared with the benchmark scripts."""
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds to wait before answering")
+    parser.add_argument("--distribution", choices=LatencyModel.DISTRIBUTIONS, default="fixed")
+    parser.add_argument("--spread", type=float, default=0.0,
+                        help="uniform: +/- seconds around the mean; lognormal: sigma")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with an error")
+    parser.add_argument("--error-statuses", default="503", help="comma-separated statuses for injected errors")
+    parser.add_argument("--responses", help="JSONL file of recorded or canned responses")
+    parser.add_argument("--stream-chunk-delay", type=float, default=0.05, help="seconds between streamed chunks")
+
+
+def start_from_args(args, port=0, **kwargs):
+    return start(port, args.latency, args.distribution, args.spread, args.error_rate,
+                 [int(code) for code in args.error_statuses.split(",")], args.responses,
+                 args.stream_chunk_delay, **kwargs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    add_arguments(parser)
+    parser.add_argument("--upstream", help="proxy to this API base instead of answering (recording mode)")
+    parser.add_argument("--record-to", default="recorded.jsonl", help="where --upstream saves the exchanges")
+    args = parser.parse_args()
+    httpd = start_from_args(args, args.port, upstream=args.upstream, record_to=args.record_to)
+    print(f"Fake Gemini listening on http://127.0.0.1:{httpd.server_port}")
+    threading.Event().wait()
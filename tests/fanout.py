@@ -0,0 +1,54 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+# Shared, bounded pool so a burst of requests can't spawn unlimited upstream calls
+MAX_WORKERS = int(os.getenv("FANOUT_WORKERS", 16))
+# Wall-clock budget (seconds) for all calls belonging to one HTTP request
+REQUEST_DEADLINE = float(os.getenv("FANOUT_DEADLINE", 90))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="fanout")
+
+
+class FanOutError(Exception):
+    """Raised when one call returned a hard error; `result` holds that call's return value."""
+
+    def __init__(self, result):
+        super().__init__(result)
+        self.result = result
+
+
+class FanOutTimeout(Exception):
+    """Raised when the calls did not all finish before the deadline."""
+
+
+def fan_out(fn, arg_list, deadline=None, is_error=None):
+    """Call fn(*args) for every args tuple concurrently and return the results in input order.
+
+    If a call raises, or `is_error(result)` is true for its result, the calls that
+    have not started yet are cancelled and the error is raised to the caller.
+    """
+    futures = [_executor.submit(fn, *args) for args in arg_list]
+    positions = {future: i for i, future in enumerate(futures)}
+    results = [None] * len(futures)
+
+    try:
+        for future in as_completed(futures, timeout=REQUEST_DEADLINE if deadline is None else deadline):
+            result = future.result()
+            if is_error is not None and is_error(result):
+                raise FanOutError(result)
+            results[positions[future]] = result
+    except FutureTimeoutError:
+        _cancel(futures)
+        raise FanOutTimeout(f"{len(futures)} calls did not finish within the deadline")
+    except BaseException:
+        _cancel(futures)
+        raise
+
+    return results
+
+
+def _cancel(futures):
+    # Running calls can't be interrupted; this only drops the ones still queued
+    for future in futures:
+        future.cancel()
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import os
+import time
+
+import aiohttp
+
+from admission import STANDARD, admission
+from coalesce import AsyncSingleFlight, request_key
+from metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_LATENCY, UPSTREAM_REQUESTS, record_usage
+from gemini_client import API_KEY, TIMEOUT, MAX_RETRIES, RETRY_STATUSES, backoff_delay, extract_text, model_url
+
+# Upper bound on simultaneous upstream connections held by one process
+ASYNC_POOL_SIZE = int(os.getenv("GEMINI_ASYNC_POOL_SIZE", 512))
+
+coalescer = AsyncSingleFlight()
+
+_session = None
+
+
+class GeminiHTTPError(aiohttp.ClientError):
+    """Non-retryable (or out of retries) HTTP error from Gemini, with the response body."""
+
+    def __init__(self, status, text):
+        super().__init__(f"{status} {text[:200]}")
+        self.status = status
+        self.text = text
+
+
+def get_session():
+    """Return the keep-alive ClientSession for the running event loop."""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=ASYNC_POOL_SIZE, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=TIMEOUT[0], sock_read=TIMEOUT[1])
+        _session = aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         headers={"Content-Type": "application/json"})
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+async def post(payload, method="generateContent", retries=None, stream=False, params=None, priority=STANDARD,
+               call_site="other"):
+    """Async counterpart of gemini_client.post: same admission, retry, backoff and metrics.
+
+    Returns decoded JSON, or the open response when `stream` is set; the caller must release it.
+    """
+    started = time.perf_counter()
+    UPSTREAM_IN_FLIGHT.inc(call_site)
+    status = "error"
+    try:
+        result = await _post(payload, method, retries, stream, params, priority)
+        status = "200"
+        if not stream:
+            record_usage(call_site, result)
+        return result
+    except GeminiHTTPError as e:
+        status = str(e.status)
+        raise
+    except BaseException as e:
+        status = type(e).__name__
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(call_site)
+        UPSTREAM_REQUESTS.inc(call_site, status)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, call_site)
+
+
+async def _post(payload, method, retries, stream, params, priority):
+    session = get_session()
+    retries = MAX_RETRIES if retries is None else retries
+    query = {"key": API_KEY or ""}
+    if params:
+        query.update(params)
+
+    for attempt in range(retries + 1):
+        await admission.acquire_async(priority)
+        try:
+            response = await session.post(model_url(method), params=query, json=payload)
+            handed_over = False
+            try:
+                if response.status in RETRY_STATUSES and attempt < retries:
+                    delay = backoff_delay(attempt, response)
+                    if response.status == 429:
+                        admission.pause(delay)
+                        continue
+                else:
+                    if response.status >= 400:
+                        raise GeminiHTTPError(response.status, await response.text())
+                    if stream:
+                        handed_over = True
+                        return response
+                    return await response.json(content_type=None)
+            finally:
+                if not handed_over:
+                    response.release()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == retries:
+                raise
+            delay = backoff_delay(attempt)
+        await asyncio.sleep(delay)
+
+
+async def generate_content(prompt, generation_config=None, retries=None, coalesce=True, priority=STANDARD,
+                           call_site="other"):
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if generation_config:
+        payload["generationConfig"] = generation_config
+    def call():
+        return post(payload, retries=retries, priority=priority, call_site=call_site)
+
+    if not coalesce:
+        return await call()
+    return await coalescer.do(request_key("generateContent", payload), call)
+
+
+async def generate_text(prompt, default="", **kwargs):
+    return extract_text(await generate_content(prompt, **kwargs), default)
+
+
+async def stream_text(prompt, retries=None, priority=STANDARD, call_site="other"):
+    """Async counterpart of gemini_client.stream_text: an async generator of the text chunks.
+
+    The request is made on the first iteration, so admission and HTTP errors surface
+    there. Closing the generator releases the upstream connection.
+    """
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    response = await post(payload, method="streamGenerateContent", retries=retries, stream=True,
+                          params={"alt": "sse"}, priority=priority, call_site=call_site)
+    last_chunk = None
+    try:
+        async for line in response.content:
+            line = line.decode("utf-8", "replace").strip()
+            if not line.startswith("data:"):
+                continue
+            try:
+                chunk = json.loads(line[5:].strip())
+            except ValueError:
+                continue
+            last_chunk = chunk
+            text = extract_text(chunk)
+            if text:
+                yield text
+    finally:
+        response.release()
+        # Each chunk carries running totals, so only the last one is counted
+        record_usage(call_site, last_chunk)
@@ -0,0 +1,206 @@
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+from admission import STANDARD, admission
+from coalesce import SingleFlight, request_key
+from metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_LATENCY, UPSTREAM_REQUESTS, record_usage
+
+# Load environment variables
+load_dotenv()
+
+API_KEY = os.getenv("GEMINI_API_KEY")
+
+# Point GEMINI_API_BASE at a local stand-in (e.g. http://127.0.0.1:8001) to run offline
+API_BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com").rstrip("/")
+MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# (connect, read) timeouts in seconds for a single upstream attempt
+TIMEOUT = (float(os.getenv("GEMINI_CONNECT_TIMEOUT", 5)), float(os.getenv("GEMINI_READ_TIMEOUT", 60)))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 3))
+BACKOFF_BASE = 0.5  # seconds, doubled on every attempt
+BACKOFF_MAX = 8.0
+POOL_SIZE = int(os.getenv("GEMINI_POOL_SIZE", 32))
+
+# Rate limiting and transient server errors are worth another attempt
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Identical generateContent requests in flight at the same time share one upstream call
+coalescer = SingleFlight(timeout_error=requests.exceptions.Timeout)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide keep-alive session, creating it on first use."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Retries are handled in post() so we can honour Retry-After and add jitter
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers.update({"Content-Type": "application/json"})
+                _session = session
+    return _session
+
+
+def model_url(method="generateContent", model=None):
+    """Build the endpoint URL for a model method."""
+    return f"{API_BASE}/v1beta/models/{model or MODEL}:{method}"
+
+
+def backoff_delay(attempt, response=None):
+    """Seconds to wait before retry number `attempt` (0-based), with full jitter."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            try:
+                return min(float(retry_after), BACKOFF_MAX)
+            except ValueError:
+                pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def post(payload, method="generateContent", timeout=None, retries=None, stream=False, params=None,
+         priority=STANDARD, call_site="other"):
+    """POST a payload to a Gemini model method with bounded, jittered retries.
+
+    Every attempt first waits for admission at `priority`, which raises
+    admission.Overloaded if our quota can't fit it in time.
+    Returns the decoded JSON body, or the open response when `stream` is set.
+    Raises requests.exceptions.RequestException once the retries are used up.
+    Latency, outcome and token usage are recorded under `call_site`.
+    """
+    started = time.perf_counter()
+    UPSTREAM_IN_FLIGHT.inc(call_site)
+    status = "error"
+    try:
+        result = _post(payload, method, timeout, retries, stream, params, priority)
+        status = "200"
+        if not stream:
+            record_usage(call_site, result)
+        return result
+    except requests.exceptions.HTTPError as e:
+        status = str(e.response.status_code) if e.response is not None else "error"
+        raise
+    except Exception as e:
+        status = type(e).__name__
+        raise
+    finally:
+        UPSTREAM_IN_FLIGHT.dec(call_site)
+        UPSTREAM_REQUESTS.inc(call_site, status)
+        UPSTREAM_LATENCY.observe(time.perf_counter() - started, call_site)
+
+
+def _post(payload, method, timeout, retries, stream, params, priority):
+    session = get_session()
+    retries = MAX_RETRIES if retries is None else retries
+    query = {"key": API_KEY}
+    if params:
+        query.update(params)
+
+    for attempt in range(retries + 1):
+        admission.acquire(priority)
+        try:
+            response = session.post(
+                model_url(method), params=query, json=payload,
+                timeout=timeout or TIMEOUT, stream=stream,
+            )
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < retries:
+            delay = backoff_delay(attempt, response)
+            response.close()
+            if response.status_code == 429:
+                # Out of quota: hold back every caller, not just this one; the next acquire() waits it out
+                admission.pause(delay)
+            else:
+                time.sleep(delay)
+            continue
+
+        response.raise_for_status()
+        return response if stream else response.json()
+
+
+def generate_content(prompt, generation_config=None, timeout=None, retries=None, coalesce=True, priority=STANDARD,
+                     call_site="other"):
+    """Send a single text prompt to generateContent and return the decoded JSON body.
+
+    Concurrent calls with the same prompt and config are coalesced into one upstream
+    request and all receive the same body, which must not be modified.
+    """
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    if generation_config:
+        payload["generationConfig"] = generation_config
+
+    def call():
+        return post(payload, timeout=timeout, retries=retries, priority=priority, call_site=call_site)
+
+    if not coalesce:
+        return call()
+    return coalescer.do(request_key("generateContent", payload), call)
+
+
+def extract_text(ai_response, default=""):
+    """Pull the first candidate's text out of a generateContent response."""
+    try:
+        parts = ai_response["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return default
+    text = "".join(part.get("text", "") for part in parts if isinstance(part, dict))
+    return text or default
+
+
+def generate_text(prompt, default="", **kwargs):
+    """Convenience wrapper: send a prompt and return just the response text."""
+    return extract_text(generate_content(prompt, **kwargs), default)
+
+
+def stream_text(prompt, timeout=None, retries=None, priority=STANDARD, call_site="other"):
+    """Generator of the text chunks of a streamGenerateContent call (server-sent events).
+
+    The request is made on the first next(), so a caller can take the first chunk
+    before committing to a streamed response and still turn admission and HTTP
+    errors into a plain error. The connection is only opened inside the generator,
+    so closing it always closes the upstream response too, and a client that
+    disconnects mid-answer stops the transfer from Gemini as well.
+    """
+    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+    response = post(payload, method="streamGenerateContent", timeout=timeout, retries=retries,
+                    stream=True, params={"alt": "sse"}, priority=priority, call_site=call_site)
+    yield from _iter_stream_text(response, call_site)
+
+
+def _iter_stream_text(response, call_site):
+    last_chunk = None
+    try:
+        # chunk_size=None hands over each chunk as soon as it arrives instead of filling a buffer
+        for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            try:
+                chunk = json.loads(line[5:].strip())
+            except ValueError:
+                continue
+            last_chunk = chunk
+            text = extract_text(chunk)
+            if text:
+                yield text
+    finally:
+        response.close()
+        # Each chunk carries running totals, so only the last one is counted
+        record_usage(call_site, last_chunk)
@@ -0,0 +1,252 @@
+import json
+import re
+from difflib import SequenceMatcher
+
+from metrics import PARSE_FAILURES
+
+# Deduction rules from the /compare grading prompt
+MAX_SCORE = 10
+EQUATION_DEDUCTION = 3
+APPARATUS_DEDUCTION = 3
+APPARATUS_MISSING_LIMIT = 2  # deduct once this many required items are missing
+AIM_DEDUCTION = 2
+PROCEDURE_DEDUCTION = 2
+
+AIM_MATCH_THRESHOLD = 0.6  # share of aim keywords that must appear in the submission
+ITEM_MATCH_THRESHOLD = 0.5  # share of an apparatus item's keywords that must appear
+STEP_MATCH_THRESHOLD = 0.5  # share of a step's keywords for it to count as covered
+TOKEN_SIMILARITY = 0.8  # difflib ratio at which two words count as the same (typos, plurals)
+# Procedure coverage outside this band is decided locally without asking the LLM
+PROCEDURE_LOCAL_BAND = (0.2, 0.85)
+
+SECTION_NAMES = {
+    "aim": "aim",
+    "apparatus": "apparatus",
+    "chemicals": "chemicals",
+    "procedure": "procedure",
+    "result": "result",
+    "balanced chemical equation": "equation",
+    "chemical equation": "equation",
+    "equation": "equation",
+}
+
+STOPWORDS = {
+    "a", "an", "the", "of", "to", "and", "or", "in", "into", "it", "its", "with", "by", "for", "on",
+    "from", "at", "is", "are", "be", "as", "given", "then", "that", "this", "using", "use", "until",
+    "while", "known", "least", "optional",
+}
+
+_SECTION_HEADER = re.compile(r"^\s*([A-Za-z ]+):\s*(.*)$")
+_LIST_MARKER = re.compile(r"^\s*(?:[•\-*]|\d+[.)])\s*")
+_WORD = re.compile(r"[a-z0-9]+")
+_ARROW = re.compile(r"\s*(?:→|->|⟶|=+>|=)\s*")
+# A formula with its coefficient: "2HCl", "2 NaCl", "Ca(OH)2"; state symbols are dropped separately
+_FORMULA = re.compile(r"(?:\d+\s*)?[A-Za-z][A-Za-z0-9()]*")
+_STATE = re.compile(r"\((?:aq|s|l|g)\)$", re.I)
+_SUBSCRIPTS = str.maketrans("₀₁₂₃₄₅₆₇₈₉", "0123456789")
+
+
+def parse_blueprint(text):
+    """Split a blueprint into aim, apparatus, chemicals, procedure steps, result and equation."""
+    sections, current = {}, None
+    for line in text.splitlines():
+        header = _SECTION_HEADER.match(line)
+        if header and header.group(1).strip().lower() in SECTION_NAMES:
+            current = SECTION_NAMES[header.group(1).strip().lower()]
+            sections.setdefault(current, [])
+            if header.group(2).strip():
+                sections[current].append(header.group(2).strip())
+        elif current and line.strip():
+            sections[current].append(line.strip())
+
+    apparatus = [_LIST_MARKER.sub("", item) for item in sections.get("apparatus", [])]
+    procedure = []
+    for line in sections.get("procedure", []):
+        # Numbered lines start a step; anything else continues the previous one
+        if _LIST_MARKER.match(line) or not procedure:
+            procedure.append(_LIST_MARKER.sub("", line))
+        else:
+            procedure[-1] += " " + line
+
+    return {
+        "aim": " ".join(sections.get("aim", [])),
+        "apparatus": [item for item in apparatus if "optional" not in item.lower()],
+        "optional_apparatus": [item for item in apparatus if "optional" in item.lower()],
+        "chemicals": [_LIST_MARKER.sub("", item) for item in sections.get("chemicals", [])],
+        "procedure": procedure,
+        "result": " ".join(sections.get("result", [])),
+        "equation": " ".join(sections.get("equation", [])),
+        "text": text,
+    }
+
+
+def keywords(text):
+    """Content words, lower-cased, with parentheticals like '(10 mL)' dropped."""
+    text = re.sub(r"\([^)]*\)", " ", text.lower())
+    return [word for word in _WORD.findall(text) if word not in STOPWORDS]
+
+
+def _same_word(a, b):
+    if a == b:
+        return True
+    if a[0] != b[0] or abs(len(a) - len(b)) > 3:
+        return False
+    return SequenceMatcher(None, a, b).ratio() >= TOKEN_SIMILARITY
+
+
+def coverage(expected, submitted_words):
+    """Share of the expected keywords that have a fuzzy match among the submitted words."""
+    expected_words = set(keywords(expected))
+    if not expected_words:
+        return 1.0
+    found = sum(1 for word in expected_words if any(_same_word(word, other) for other in submitted_words))
+    return found / len(expected_words)
+
+
+def _formula(term, last):
+    """The formula token of one '+'-separated term, lower-cased, or None.
+
+    Prose can only be glued to the outside of the equation ("The equation is
+    Na2CO3", "CO2 is released."), so the first term keeps its last token and
+    every other term its first.
+    """
+    tokens = _FORMULA.findall(term)
+    if not tokens:
+        return None
+    token = tokens[-1] if last else tokens[0]
+    return _STATE.sub("", token.replace(" ", "")).lower()
+
+
+def normalize_equation(text):
+    """Canonical (reactants, products) for an equation string, ignoring spacing, term order and punctuation."""
+    sides = _ARROW.split(text.translate(_SUBSCRIPTS), maxsplit=1)
+    if len(sides) != 2:
+        return None
+    reactants = frozenset(filter(None, (_formula(term, last=i == 0) for i, term in enumerate(sides[0].split("+")))))
+    products = frozenset(filter(None, (_formula(term, last=False) for term in sides[1].split("+"))))
+    if not reactants or not products:
+        return None
+    return reactants, products
+
+
+def find_equations(text):
+    """Every line of the submission that looks like a chemical equation."""
+    equations = []
+    for line in text.splitlines():
+        if ("+" in line or "→" in line or "->" in line) and _ARROW.search(line):
+            normalized = normalize_equation(line.split(":", 1)[-1])
+            if normalized:
+                equations.append(normalized)
+    return equations
+
+
+def procedure_coverage(steps, submitted_procedure):
+    """Fraction of blueprint steps that are recognisably present in the submitted procedure."""
+    if not steps:
+        return 1.0
+    submitted_words = set(keywords(submitted_procedure))
+    covered = sum(1 for step in steps if coverage(step, submitted_words) >= STEP_MATCH_THRESHOLD)
+    return covered / len(steps)
+
+
+def score_locally(form_data, blueprint):
+    """Apply the mechanical deductions (aim, apparatus, equation) and measure procedure coverage."""
+    def field(name):
+        return str(form_data.get(name) or "")
+
+    submission = "\n".join(field(name) for name in ("aim", "apparatus", "procedure", "observations", "conclusion"))
+
+    aim_score = coverage(blueprint["aim"], set(keywords(field("aim"))))
+    apparatus_words = set(keywords(field("apparatus")))
+    missing = [item for item in blueprint["apparatus"] if coverage(item, apparatus_words) < ITEM_MATCH_THRESHOLD]
+    expected_equation = normalize_equation(blueprint["equation"])
+    equation_found = expected_equation is None or expected_equation in find_equations(submission)
+
+    return {
+        "aim": {
+            "match": round(aim_score, 2),
+            "deduction": 0 if aim_score >= AIM_MATCH_THRESHOLD else AIM_DEDUCTION,
+        },
+        "apparatus": {
+            "missing": missing,
+            "deduction": APPARATUS_DEDUCTION if len(missing) >= APPARATUS_MISSING_LIMIT else 0,
+        },
+        "equation": {
+            "found": equation_found,
+            "deduction": 0 if equation_found else EQUATION_DEDUCTION,
+        },
+        "procedure": {
+            "coverage": round(procedure_coverage(blueprint["procedure"], field("procedure")), 2),
+        },
+    }
+
+
+def needs_procedure_judgement(local):
+    """Whether the procedure is borderline enough to be worth an LLM call."""
+    low, high = PROCEDURE_LOCAL_BAND
+    return low < local["procedure"]["coverage"] < high
+
+
+PROCEDURE_VERDICT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"mostly_correct": {"type": "BOOLEAN"}, "comment": {"type": "STRING"}},
+    "required": ["mostly_correct", "comment"],
+}
+
+
+def procedure_prompt(form_data, blueprint):
+    """Short prompt asking only whether the submitted procedure is mostly correct."""
+    steps = "\n".join(f"{i}. {step}" for i, step in enumerate(blueprint["procedure"], 1))
+    return f"""
+You are grading a student's lab procedure. Decide whether the submitted steps are mostly correct
+compared with the reference steps (wording, order details and minor omissions are fine).
+
+Reference steps:
+{steps}
+
+Submitted procedure:
+{form_data.get("procedure") or ""}
+
+Answer with JSON: {{"mostly_correct": true/false, "comment": "<one sentence>"}}
+"""
+
+
+def parse_procedure_verdict(text):
+    """Return (mostly_correct, comment) from the LLM answer, or None if it can't be read."""
+    try:
+        verdict = json.loads(re.sub(r"^\s*```(?:json)?|```\s*$", "", text or ""))
+    except ValueError:
+        verdict = None
+    if not isinstance(verdict, dict) or not isinstance(verdict.get("mostly_correct"), bool):
+        PARSE_FAILURES.inc("procedure_verdict")
+        return None
+    return verdict["mostly_correct"], str(verdict.get("comment") or "").strip()
+
+
+def finish_score(local, verdict=None):
+    """Combine local deductions with the procedure verdict into the final breakdown."""
+    breakdown = {key: dict(value) for key, value in local.items()}
+    procedure = breakdown["procedure"]
+    if verdict is not None:
+        procedure["mostly_correct"], procedure["comment"] = verdict
+        procedure["judged_by"] = "llm"
+    else:
+        procedure["mostly_correct"] = procedure["coverage"] >= STEP_MATCH_THRESHOLD
+        procedure["judged_by"] = "local"
+    procedure["deduction"] = 0 if procedure["mostly_correct"] else PROCEDURE_DEDUCTION
+
+    total = max(0, MAX_SCORE - sum(part["deduction"] for part in breakdown.values()))
+    return {"points": total, "out_of": MAX_SCORE, "breakdown": breakdown}
+
+
+def format_score(result):
+    """Markdown summary in the same spirit as the old free-text LLM grading."""
+    b = result["breakdown"]
+    lines = [f"**{result['points']}/{result['out_of']}**", "", "**Breakdown of deductions:**"]
+    lines.append(f"- Aim: -{b['aim']['deduction']}" + ("" if not b["aim"]["deduction"] else " (aim does not match the blueprint)"))
+    missing = ", ".join(b["apparatus"]["missing"])
+    lines.append(f"- Apparatus: -{b['apparatus']['deduction']}" + (f" (missing: {missing})" if missing else ""))
+    lines.append(f"- Chemical Equation: -{b['equation']['deduction']}" + ("" if b["equation"]["found"] else " (balanced equation not found)"))
+    comment = b["procedure"].get("comment")
+    lines.append(f"- Procedure Accuracy: -{b['procedure']['deduction']}" + (f" ({comment})" if comment else ""))
+    return "\n".join(lines)
@@ -0,0 +1,60 @@
+"""gunicorn settings for server.py:
+
+    gunicorn -c gunicorn.conf.py
+
+The app is imported and its resources preloaded once in the master, then the
+workers are forked from it, so the blueprint registry, lab-manual index and item
+arrays are shared copy-on-write instead of being built per worker. Sessions and the
+question bank live in shared stores, so any worker can serve any request:
+SESSION_STORE defaults to a SQLite file under CACHE_DIR here (set redis:// to share
+sessions across hosts), and a process-local memory store is refused with more than
+one worker. Likewise METRICS_DIR defaults to a directory under CACHE_DIR, so
+/metrics on any worker reports the totals of all of them.
+
+Audio for the procedure steps is pre-warmed with `python tts_cache.py --prewarm`
+rather than from here, so the workers don't all synthesize the same clips.
+"""
+import gc
+import os
+
+from text_cache import CACHE_DIR
+
+# Read when the app is imported, so it must be in the environment before then
+os.environ.setdefault("SESSION_STORE", f"sqlite:///{os.path.join(CACHE_DIR, 'sessions.sqlite3')}")
+os.environ.setdefault("METRICS_DIR", os.path.join(CACHE_DIR, "metrics"))
+
+wsgi_app = "server:create_app(preload=True)"
+preload_app = True
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', 5000)}")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+# Requests mostly wait on Gemini, so each worker serves many of them on threads
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+# Streamed chat and document responses can run long
+timeout = 120
+graceful_timeout = 30
+
+
+def on_starting(server):
+    # server.cfg includes -w/--workers from the command line, which can override the value above
+    if server.cfg.workers > 1 and os.environ["SESSION_STORE"] in ("", "memory"):
+        raise RuntimeError(f"SESSION_STORE=memory keeps each worker's sessions to itself; run one worker "
+                           f"or use a sqlite:/// or redis:// store (workers={server.cfg.workers})")
+
+    import metrics
+
+    # Files left by the previous run's workers would otherwise be added to this run's totals
+    metrics.clear_directory()
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's reach, so its passes in the
+    # workers don't write to (and so un-share) the preloaded pages
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    import server as app_module
+
+    app_module.start_background_work()
@@ -0,0 +1,302 @@
+"""Load-test every route of server.py (or async_server.py) against fake_gemini.py.
+
+    python loadtest.py --duration 30 --concurrency 50 --latency 0.8 --distribution lognormal --spread 0.4
+    python loadtest.py --mode asyncio --output results/async.json --baseline results/threaded.json
+    python loadtest.py --url http://127.0.0.1:5000 --scenarios chat,compare   # an already running server
+
+Each virtual user loops over the weighted scenarios until the duration is up:
+chat, chat_stream, simplify, compare and quiz (GET /generate-question followed by
+POST /check-answer under one session id). The report has throughput, error counts
+and p50/p95/p99 latency per scenario and per route; --output saves it as JSON and
+--baseline prints the change against an earlier report.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+
+import fake_gemini
+from bench_serving import percentile, start_async_server, start_threaded_server
+
+COMPARE_BODY = {
+    "aim": "To determine the concentration of hydrochloric acid by titrating it against sodium carbonate.",
+    "apparatus": "Burette, pipette, conical flask, beaker, funnel, stand with clamp",
+    "procedure": "Rinse and fill the burette with HCl. Pipette 10 mL sodium carbonate into a conical flask. "
+                 "Add two drops of methyl orange. Titrate until the colour changes to orange-pink.",
+    "observations": "Burette readings were recorded for three concordant titres.",
+    "conclusion": "Na2CO3 + 2HCl → 2NaCl + H2O + CO2",
+}
+SIMPLIFY_STEPS = [
+    "Connect the resistor, ammeter and rheostat in series with the battery.",
+    "Connect the voltmeter in parallel across the resistor.",
+    "Adjust the rheostat and record the ammeter and voltmeter readings.",
+    "Plot a graph of potential difference against current.",
+]
+DEFAULT_WEIGHTS = "chat=3,chat_stream=2,simplify=3,compare=1,quiz=2"
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def add(self, name, seconds, status):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.statuses.setdefault(name, {}).setdefault(str(status), 0)
+        self.statuses[name][str(status)] += 1
+        if status != 200:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        report = {}
+        for name, values in sorted(self.latencies.items()):
+            report[name] = {
+                "requests": len(values),
+                "errors": self.errors.get(name, 0),
+                "statuses": self.statuses[name],
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p95_ms": round(percentile(values, 95) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "mean_ms": round(statistics.mean(values) * 1000, 1),
+            }
+        return report
+
+
+async def timed(recorder, session, method, base_url, route, **kwargs):
+    """One request, recorded under its route; returns (status, parsed body or text)."""
+    started = time.perf_counter()
+    status, body = "error", None
+    try:
+        async with session.request(method, base_url + route, **kwargs) as response:
+            status = response.status
+            text = await response.text()
+            try:
+                body = json.loads(text)
+            except ValueError:
+                body = text
+    except Exception as e:
+        status = type(e).__name__
+    recorder.add(route, time.perf_counter() - started, status)
+    return status, body
+
+
+UNIQUE_TEMPLATES = [
+    "Why does the current change when the resistance is {n} ohms? ({word})",
+    "In experiment {word}, what happens to the voltage reading at {n} mA?",
+    "Explain, for group {word}, how a rheostat set to {n} ohms limits the current.",
+    "Our burette read {n} mL in titration {word}; is that a concordant titre?",
+    "What would the ammeter show in circuit {word} with a {n} V supply?",
+]
+
+
+def unique_message():
+    # Lexically distinct (varied phrasing, a random hex word and number) so neither the chat
+    # cache nor request coalescing can answer it; the report's chat_cache_hits checks this
+    template = random.choice(UNIQUE_TEMPLATES)
+    return template.format(n=random.randint(1, 10 ** 6), word=uuid.uuid4().hex)
+
+
+async def scenario_chat(recorder, session, base_url):
+    status, body = await timed(recorder, session, "POST", base_url, "/chat", json={"message": unique_message()})
+    return status == 200 and isinstance(body, dict) and "response" in body
+
+
+async def scenario_chat_stream(recorder, session, base_url):
+    started = time.perf_counter()
+    status, first_chunk = "error", None
+    try:
+        async with session.post(base_url + "/chat/stream", json={"message": unique_message()}) as response:
+            status = response.status
+            async for _ in response.content.iter_any():
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - started
+    except Exception as e:
+        status = type(e).__name__
+    recorder.add("/chat/stream", time.perf_counter() - started, status)
+    if first_chunk is not None:
+        recorder.add("/chat/stream (first chunk)", first_chunk, status)
+    return status == 200
+
+
+async def scenario_simplify(recorder, session, base_url):
+    # A few distinct steps repeated, the way a class works through one procedure
+    text = f"{random.choice(SIMPLIFY_STEPS)} (group {random.randint(1, 20)})"
+    status, body = await timed(recorder, session, "POST", base_url, "/simplify-text", json={"text": text})
+    return status == 200 and isinstance(body, dict) and "simplified_text" in body
+
+
+async def scenario_compare(recorder, session, base_url):
+    status, body = await timed(recorder, session, "POST", base_url, "/compare", json=COMPARE_BODY)
+    return status == 200 and isinstance(body, dict) and "points" in body
+
+
+async def scenario_quiz(recorder, session, base_url):
+    headers = {"X-Session-Id": uuid.uuid4().hex}
+    status, questions = await timed(recorder, session, "GET", base_url, "/generate-question", headers=headers)
+    if status != 200 or not isinstance(questions, list):
+        return False
+    answers = [random.choice("ABCD") for _ in questions]
+    status, body = await timed(recorder, session, "POST", base_url, "/check-answer", headers=headers,
+                               json={"selected_answers": answers})
+    return status == 200 and isinstance(body, dict) and "error" not in body
+
+
+SCENARIOS = {
+    "chat": scenario_chat,
+    "chat_stream": scenario_chat_stream,
+    "simplify": scenario_simplify,
+    "compare": scenario_compare,
+    "quiz": scenario_quiz,
+}
+
+
+async def chat_cache_hits(session, base_url):
+    """The server's chat similarity-cache hit count, or None if it doesn't report one."""
+    try:
+        async with session.get(base_url + "/chat-cache") as response:
+            if response.status != 200:
+                return None
+            return (await response.json()).get("hits")
+    except Exception:
+        return None
+
+
+async def run_load(base_url, weights, concurrency, duration):
+    """Run `concurrency` virtual users for `duration` seconds; returns the report."""
+    import aiohttp
+
+    recorder = Recorder()
+    flows = Recorder()  # whole-scenario latency, e.g. the quiz's two requests together
+    names, weight_values = list(weights), list(weights.values())
+    deadline = time.monotonic() + duration
+
+    async def user(session):
+        while time.monotonic() < deadline:
+            name = random.choices(names, weight_values)[0]
+            started = time.perf_counter()
+            ok = await SCENARIOS[name](recorder, session, base_url)
+            flows.add(name, time.perf_counter() - started, 200 if ok else "failed")
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        hits_before = await chat_cache_hits(session, base_url)
+        started = time.perf_counter()
+        await asyncio.gather(*(user(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        hits_after = await chat_cache_hits(session, base_url)
+
+    return {
+        "elapsed_s": round(elapsed, 2),
+        # Chat messages answered from the similarity cache during the run; should stay 0
+        "chat_cache_hits": None if None in (hits_before, hits_after) else hits_after - hits_before,
+        "scenarios": flows.summary(elapsed),
+        "routes": recorder.summary(elapsed),
+    }
+
+
+def compare_reports(current, baseline, tolerance=0.1):
+    """Lines describing how each route moved against a baseline; regressions past `tolerance` are flagged."""
+    lines, regressions = [], 0
+    for route, now in current["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        changes = []
+        for key, higher_is_worse in (("throughput_rps", False), ("p95_ms", True), ("p99_ms", True)):
+            if not before[key]:
+                continue
+            change = (now[key] - before[key]) / before[key]
+            worse = change > tolerance if higher_is_worse else change < -tolerance
+            regressions += worse
+            changes.append(f"{key} {before[key]} -> {now[key]} ({change:+.0%}){' REGRESSION' if worse else ''}")
+        lines.append(f"{route:28} " + ", ".join(changes))
+    return lines, regressions
+
+
+def parse_weights(text, scenarios=None):
+    weights = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    if scenarios:
+        weights = {name: weights.get(name, 1.0) for name in scenarios.split(",")}
+    unknown = set(weights) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="load an already running server instead of starting one in-process")
+    parser.add_argument("--mode", choices=("threaded", "asyncio"), default="threaded",
+                        help="which server to start in-process")
+    parser.add_argument("--threads", type=int, default=16, help="worker threads for the in-process Flask server")
+    parser.add_argument("--concurrency", type=int, default=50, help="virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--weights", default=DEFAULT_WEIGHTS, help="scenario=weight,...")
+    parser.add_argument("--scenarios", help="comma-separated subset of scenarios to run")
+    parser.add_argument("--output", help="write the report as JSON to this file")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change counted as a regression")
+    fake_gemini.add_arguments(parser)
+    args = parser.parse_args()
+    weights = parse_weights(args.weights, args.scenarios)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        upstream = fake_gemini.start_from_args(args)
+        # Must be set before gemini_client is imported by the servers
+        os.environ["GEMINI_API_BASE"] = f"http://127.0.0.1:{upstream.server_port}"
+        os.environ.setdefault("GEMINI_API_KEY", "loadtest")
+        os.environ.setdefault("GEMINI_POOL_SIZE", str(max(args.threads, 32)))
+        # Measure the server, not the client-side quota limiter
+        os.environ.setdefault("GEMINI_RPM", "0")
+        if args.mode == "asyncio":
+            port = start_async_server()
+        else:
+            import server
+            port = start_threaded_server(server.create_app(preload=True), 0, args.threads).server_port
+        base_url = f"http://127.0.0.1:{port}"
+
+    report = asyncio.run(run_load(base_url, weights, args.concurrency, args.duration))
+    report = {"config": config, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), **report}
+
+    print(f"{'route':28} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for section in ("routes", "scenarios"):
+        for name, r in report[section].items():
+            label = name if section == "routes" else f"[{name}]"
+            print(f"{label:28} {r['throughput_rps']:8.1f} {r['p50_ms']:9.1f} {r['p95_ms']:9.1f} "
+                  f"{r['p99_ms']:9.1f} {r['errors']:7}")
+
+    if report["chat_cache_hits"]:
+        print(f"\n{report['chat_cache_hits']} chat messages were answered from the similarity cache, "
+              "so the chat routes were not measured against the upstream")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            lines, regressions = compare_reports(report, json.load(f), args.tolerance)
+        print(f"\nAgainst {args.baseline}:")
+        print("\n".join(lines))
+        if regressions:
+            sys.exit(1)
+    if report["chat_cache_hits"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import json
+import os
+import re
+
+import requests
+
+import gemini_client
+from admission import STANDARD
+from metrics import PARSE_FAILURES
+
+OPTION_KEYS = ("A", "B", "C", "D")
+
+# Extra upstream calls allowed per round to replace questions that failed to parse
+ROUND_RETRY_BUDGET = int(os.getenv("QUESTION_RETRY_BUDGET", 2))
+
+# Gemini structured-output schema: an array of flat MCQ objects
+QUESTION_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "question": {"type": "STRING"},
+            "A": {"type": "STRING"},
+            "B": {"type": "STRING"},
+            "C": {"type": "STRING"},
+            "D": {"type": "STRING"},
+            "answer": {"type": "STRING", "enum": list(OPTION_KEYS)},
+        },
+        "required": ["question", *OPTION_KEYS, "answer"],
+    },
+}
+
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+# One pattern for every line shape the model uses for markdown MCQs, tried once per line:
+#   "**Correct Answer:** B", "Answer: (b)"  /  "**Question:** ...", "Q3. ..."  /
+#   "A) ...", "**A)** ...", "A. ...", "(A) ...", "[A] ..."  /  "2. ..." (a numbered question)
+_MCQ_LINE = re.compile(r"""
+    ^\s*(?:[-*+>]\s+)?                                               # list bullet or quote
+    (?:
+        (?:correct\s+)?answer(?:\s+key)?\s*(?:is\s*)?[:=\-\u2013]?\s*
+            [(\[]?(?P<answer>[A-D])\b
+      | (?:question(?:\s*\d+)?|q\d*)\s*[:.)\-\u2013]\s*(?P<question>.*)
+      | [(\[]?(?P<key>[A-D])\s*[).:\]]\s*(?P<option>\S.*)
+      | (?P<number>\d+)\s*[.)]\s*(?P<numbered>\S.*)
+    )
+""", re.I | re.X)
+# "1. Question: ..." keeps its label after the number
+_QUESTION_LABEL = re.compile(r"^(?:question|q)\s*[:.\-]\s*", re.I)
+
+
+class Question:
+    """One validated multiple-choice question."""
+
+    __slots__ = ("text", "options", "answer")
+
+    def __init__(self, text, options, answer):
+        self.text = text
+        self.options = tuple(options)  # in OPTION_KEYS order
+        self.answer = answer
+
+    @classmethod
+    def from_dict(cls, item):
+        """Build from {"question", "A".."D", "answer"}; None if the item is unusable."""
+        if not isinstance(item, dict):
+            return None
+
+        text = str(item.get("question") or "").strip()
+        answer = str(item.get("answer") or "").strip().upper()[:1]
+        options = [str(item.get(key) or "").strip() for key in OPTION_KEYS]
+
+        if not text or answer not in OPTION_KEYS or not all(options):
+            return None
+        # Repeated options mean the model padded the list
+        if len(set(options)) != len(OPTION_KEYS):
+            return None
+
+        return cls(text, options, answer)
+
+    def as_dict(self):
+        return {"question": self.text, **dict(zip(OPTION_KEYS, self.options)), "answer": self.answer}
+
+    def __eq__(self, other):
+        return isinstance(other, Question) and self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return f"Question({self.text!r}, {self.options!r}, {self.answer!r})"
+
+
+def validate_question(item):
+    """Return a clean question dict, or None if the item is unusable."""
+    question = Question.from_dict(item)
+    return question.as_dict() if question else None
+
+
+def _json_items(text):
+    """The list of items in a JSON answer, or None when the text isn't JSON."""
+    try:
+        items = json.loads(_CODE_FENCE.sub("", text))
+    except (TypeError, ValueError):
+        return None
+    if isinstance(items, dict):
+        items = items.get("questions", [items])
+    return items if isinstance(items, list) else None
+
+
+def _markdown_items(text):
+    """Split markdown MCQs into raw dicts in one pass over the lines."""
+    items, current = [], None
+
+    for line in text.splitlines():
+        line = line.replace("**", "").replace("__", "").strip()
+        if not line:
+            continue
+        match = _MCQ_LINE.match(line)
+        group = match.lastgroup if match else None
+
+        if group in ("question", "numbered"):
+            stem = _QUESTION_LABEL.sub("", match.group(group).strip())
+            if current is None or current["options"] or current["answer"]:
+                current = {"question": stem, "options": {}, "answer": None}
+                items.append(current)
+            else:
+                # "**Question 1:**" on its own line followed by the text, or a numbered stem
+                current["question"] = " ".join(filter(None, (current["question"], stem)))
+        elif current is None:
+            continue
+        elif group == "answer":
+            current["answer"] = current["answer"] or match.group("answer").upper()
+        elif group == "option":
+            key = match.group("key").upper()
+            # Only the first A-D run before the answer; later "A)" lines are explanations or stray text
+            if current["answer"] is None and key not in current["options"]:
+                current["options"][key] = match.group("option").strip()
+        elif not current["options"]:
+            # Question text that wrapped onto another line
+            current["question"] = f"{current['question']} {line}".strip()
+
+    return [{"question": item["question"], **item["options"], "answer": item["answer"]} for item in items]
+
+
+def parse_questions(text):
+    """Parse JSON or markdown MCQs into (questions, number of items that failed validation)."""
+    if not text:
+        return [], 1
+    items = _json_items(text)
+    if items is None:
+        items = _markdown_items(text)
+    if not items:
+        return [], 1
+
+    questions = [q for q in (Question.from_dict(item) for item in items) if q]
+    return questions, len(items) - len(questions)
+
+
+def parse_batch(text):
+    """Parse a batch answer and keep only the questions that validate, as dicts."""
+    questions, failed = parse_questions(text)
+    if not questions:
+        PARSE_FAILURES.inc("question_batch")
+    elif failed:
+        PARSE_FAILURES.inc("question_item", amount=failed)
+    return [question.as_dict() for question in questions]
+
+
+def batch_prompt(count, level, topic):
+    return f"""
+    You are a physics tutor. Generate {count} different **multiple-choice questions (MCQs)** on **{topic}**. **Difficulty Level:** {level}
+
+    Return a JSON array with exactly {count} objects. Each object has the keys
+    "question", "A", "B", "C", "D" (the four options) and "answer" (one of A/B/C/D).
+    """
+
+
+def generate_questions_batch(num_questions=2, level="Intermediate", topic="Ohm's Law", priority=STANDARD):
+    """Generate N MCQs with one structured-output call, re-requesting only the items that fail validation.
+
+    At most ROUND_RETRY_BUDGET extra calls are made; the round fails only once those are spent.
+    """
+    if not gemini_client.API_KEY:
+        return {"error": "API Key is missing. Check .env.local file."}
+
+    questions = []
+    generation_config = {"responseMimeType": "application/json", "responseSchema": QUESTION_SCHEMA}
+
+    try:
+        for _ in range(1 + ROUND_RETRY_BUDGET):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            text = gemini_client.generate_text(batch_prompt(missing, level, topic),
+                                               generation_config=generation_config, priority=priority,
+                                               call_site="question")
+            questions.extend(parse_batch(text)[:missing])
+    except requests.exceptions.RequestException as e:
+        return {"error": f"API Error: {e}"}
+
+    if len(questions) < num_questions:
+        return {"error": "Invalid AI response format."}
+    return questions
@@ -0,0 +1,277 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Recording is lock-free on the hot path: every thread writes only to its own
+shard of each metric, and a scrape sums the shards. The only lock is taken when
+a thread records to a metric for the first time, and by the scrape itself.
+
+Metrics are per process. With several worker processes (gunicorn), set
+METRICS_DIR to a directory all of them share: each process writes its totals
+there every METRICS_FLUSH_INTERVAL seconds (start_flusher()) and at exit, and a
+scrape of any worker adds up every process's file, so /metrics covers the whole
+server, with the other workers' numbers up to one interval old. Counters and
+histograms of workers that have exited are kept; their gauges are dropped.
+Clear the directory when the server starts (gunicorn.conf.py does).
+Without METRICS_DIR a scrape only sees the worker that served it.
+"""
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+
+METRICS_DIR = os.getenv("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []  # (thread, {label values: value}) per recording thread
+        self._retired = {}  # folded-in shards of threads that have exited
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _shard(self):
+        try:
+            return self._local.values
+        except AttributeError:
+            values = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), values))
+            self._local.values = values
+            return values
+
+    def _merge(self, into, key, value):
+        into[key] = into.get(key, 0) + value
+
+    def collect(self):
+        """Sum of every thread's shard, as {label values: value}."""
+        with self._lock:
+            live = []
+            for thread, values in self._shards:
+                if thread.is_alive():
+                    live.append((thread, values))
+                else:
+                    # A finished thread never writes again, so its shard can be folded in for good
+                    for key, value in values.items():
+                        self._merge(self._retired, key, value)
+            self._shards = live
+            total = {}
+            for key, value in self._retired.items():
+                self._merge(total, key, value)
+            for _, values in live:
+                # dict.copy() runs under the GIL, so it never sees a half-applied update
+                for key, value in values.copy().items():
+                    self._merge(total, key, value)
+        return total
+
+    def _labels(self, values, extra=()):
+        pairs = list(zip(self.labelnames, values)) + list(extra)
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+        return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+    def render(self, values=None):
+        """Lines for this metric, from `values` ({label values: value}) or else this process's own."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted((self.collect() if values is None else values).items()):
+            lines.append(f"{self.name}{self._labels(key)} {_number(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    """Gauge built from per-thread deltas, so inc and dec may happen on different threads."""
+
+    kind = "gauge"
+
+    def inc(self, *labels, amount=1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=HTTP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        shard = self._shard()
+        counts = shard.get(labels)
+        if counts is None:
+            # One count per bucket, then +Inf, then the running sum
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def _merge(self, into, key, value):
+        current = into.get(key)
+        into[key] = list(value) if current is None else [a + b for a, b in zip(current, value)]
+
+    def render(self, values=None):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, counts in sorted((self.collect() if values is None else values).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _number(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+def _number(value):
+    if isinstance(value, str):
+        return value
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(directory=METRICS_DIR):
+    """Every registered metric in Prometheus text format, summed over all processes if directory is set."""
+    collected = collect_directory(directory) if directory else {}
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render(collected.get(metric.name)))
+    return "\n".join(lines) + "\n"
+
+
+def flush(directory=METRICS_DIR):
+    """Write this process's totals to <pid>.json in directory, replacing its previous file."""
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    snapshot = {metric.name: [[list(key), value] for key, value in metric.collect().items()] for metric in REGISTRY}
+    path = os.path.join(directory, f"{os.getpid()}.json")
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+
+
+def collect_directory(directory=METRICS_DIR):
+    """{metric name: {label values: value}} summed over every process's file, this one's freshly written."""
+    flush(directory)
+    metrics = {metric.name: metric for metric in REGISTRY}
+    totals = {name: {} for name in metrics}
+    for filename in os.listdir(directory):
+        pid = _pid_of(filename)
+        if pid is None:
+            continue
+        try:
+            with open(os.path.join(directory, filename)) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        alive = _alive(pid)
+        for name, samples in snapshot.items():
+            metric = metrics.get(name)
+            if metric is None or (metric.kind == "gauge" and not alive):
+                continue
+            for key, value in samples:
+                metric._merge(totals[name], tuple(key), value)
+    return totals
+
+
+def clear_directory(directory=METRICS_DIR):
+    """Remove every process's file; call it once when the server starts, before any worker records."""
+    if not directory or not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if _pid_of(filename.removesuffix(".tmp")) is not None:
+            os.unlink(os.path.join(directory, filename))
+
+
+def _pid_of(filename):
+    """The pid of a process's <pid>.json file; None for anything else that shares the directory."""
+    stem, extension = os.path.splitext(filename)
+    return int(stem) if extension == ".json" and stem.isdecimal() else None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+_flusher_pid = None
+
+
+def start_flusher(directory=METRICS_DIR, interval=METRICS_FLUSH_INTERVAL):
+    """Flush this process's totals every interval seconds and at exit; no-op without a directory.
+
+    Threads don't survive a fork, so each worker calls this after it has been forked.
+    """
+    global _flusher_pid
+    if not directory or _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                flush(directory)
+            except OSError as e:
+                print(f"Could not write metrics to {directory}: {e}")
+
+    threading.Thread(target=loop, name="metrics-flush", daemon=True).start()
+    atexit.register(flush, directory)
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = []
+
+HTTP_REQUESTS = Counter("olabs_http_requests_total", "HTTP requests handled.", ("route", "method", "status"))
+HTTP_LATENCY = Histogram("olabs_http_request_duration_seconds", "Time to handle a request, including streamed bodies.",
+                         ("route",), HTTP_BUCKETS)
+HTTP_IN_FLIGHT = Gauge("olabs_http_requests_in_flight", "Requests currently being handled.", ("route",))
+
+UPSTREAM_REQUESTS = Counter("olabs_gemini_requests_total",
+                            "Gemini calls by call site and final HTTP status (or error class).", ("call_site", "status"))
+UPSTREAM_LATENCY = Histogram("olabs_gemini_request_duration_seconds",
+                             "Gemini call latency including retries and admission wait.", ("call_site",), UPSTREAM_BUCKETS)
+UPSTREAM_IN_FLIGHT = Gauge("olabs_gemini_requests_in_flight", "Gemini calls currently in progress.", ("call_site",))
+UPSTREAM_TOKENS = Counter("olabs_gemini_tokens_total", "Tokens reported in Gemini usageMetadata.", ("call_site", "kind"))
+PARSE_FAILURES = Counter("olabs_parse_failures_total", "Model outputs that could not be parsed or validated.", ("kind",))
+
+# usageMetadata field -> token kind label
+USAGE_FIELDS = {"promptTokenCount": "prompt", "candidatesTokenCount": "candidates", "totalTokenCount": "total"}
+
+
+def record_usage(call_site, body):
+    """Count the tokens a generateContent (or stream chunk) body reports."""
+    usage = body.get("usageMetadata") if isinstance(body, dict) else None
+    if not usage:
+        return
+    for field, kind in USAGE_FIELDS.items():
+        count = usage.get(field)
+        if count:
+            UPSTREAM_TOKENS.inc(call_site, kind, amount=count)
@@ -1,14 +1,20 @@
 import requests
 import os
 
+from ability import AbilityModel, LEVEL_DIFFICULTY, LEVELS, level_index
+
 # Secure API key (Set this in your environment variables)
 API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Define difficulty levels
-difficulty_levels = ["Basic", "Intermediate", "Advanced"]
+difficulty_levels = list(LEVELS)
 
-# Track current difficulty level
-current_level = 0  # Start with "Basic"
+# Ability estimate for the one student at the terminal; each question asked joins its item bank
+TOPIC = "Physics lab instruments"
+STUDENT = "local"
+ability_model = AbilityModel()
+ability_model.restore(STUDENT, {TOPIC: [-1.0, 0]})  # Start with "Basic"
+current_level = int(level_index(ability_model.ability(STUDENT, TOPIC)[0]))
 
 def generate_question(level):
     """Generate a multiple-choice question using Google Gemini AI based on difficulty level."""
@@ -57,18 +63,14 @@ def generate_question(level):
     except requests.exceptions.RequestException as e:
         return f"API Error: {e}", "A"
 
-def evaluate_answer(user_answer, correct_answer):
-    """Check if the answer is correct and adjust difficulty."""
+def evaluate_answer(user_answer, correct_answer, item_id):
+    """Check if the answer is correct and update the ability estimate (and with it the difficulty)."""
     global current_level
 
-    if user_answer.strip().upper() == correct_answer.strip().upper():
-        print("✅ Correct!")
-        if current_level < len(difficulty_levels) - 1:  # Increase difficulty if possible
-            current_level += 1
-    else:
-        print("❌ Incorrect.")
-        if current_level > 0:  # Lower difficulty if possible
-            current_level -= 1
+    is_correct = user_answer.strip().upper() == correct_answer.strip().upper()
+    print("✅ Correct!" if is_correct else "❌ Incorrect.")
+    theta = ability_model.update([STUDENT], [TOPIC], [item_id], [is_correct])[0]
+    current_level = int(level_index(theta))
 
 # Main loop to ask 10 questions
 for i in range(10):
@@ -76,6 +78,7 @@ for i in range(10):
     
     question_data, correct_answer = generate_question(current_level)
     print(question_data)
+    item_id = ability_model.bank.add(question_data, TOPIC, LEVEL_DIFFICULTY[difficulty_levels[current_level]])
 
     user_answer = input("Your answer (A/B/C/D): ")
-    evaluate_answer(user_answer, correct_answer)
+    evaluate_answer(user_answer, correct_answer, item_id)
@@ -0,0 +1,264 @@
+"""Persistent bank of validated MCQs, shared by every worker process through SQLite.
+
+Every question that passes validation is kept with its calibrated difficulty,
+usage counts and (once generated) its explanation, so later rounds can be served
+without calling Gemini. Near-duplicates are rejected at insert time: each
+question's MinHash signature is split into LSH bands stored in an indexed table,
+and only questions sharing a band are compared by shingle Jaccard similarity.
+"""
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+from similarity import MinHasher, jaccard, normalize, shingles
+from text_cache import CACHE_DIR
+
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH", os.path.join(CACHE_DIR, "questions.sqlite3"))
+# Minimum Jaccard similarity (character shingles of question and options) to count as a repeat
+DUPLICATE_THRESHOLD = float(os.getenv("QUESTION_DUPLICATE_THRESHOLD", 0.6))
+NUM_PERM = 64
+BANDS = 16
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    level TEXT NOT NULL,
+    difficulty REAL NOT NULL,
+    question TEXT NOT NULL,
+    a TEXT NOT NULL, b TEXT NOT NULL, c TEXT NOT NULL, d TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    explanation TEXT,
+    fingerprint TEXT NOT NULL UNIQUE,
+    served INTEGER NOT NULL DEFAULT 0,
+    answered INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_served_at REAL
+);
+CREATE INDEX IF NOT EXISTS questions_topic_difficulty ON questions (topic, difficulty);
+CREATE INDEX IF NOT EXISTS questions_topic_served ON questions (topic, served);
+CREATE TABLE IF NOT EXISTS question_bands (
+    band INTEGER NOT NULL, bucket INTEGER NOT NULL, question_id INTEGER NOT NULL,
+    PRIMARY KEY (band, bucket, question_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS seen (
+    student TEXT NOT NULL, question_id INTEGER NOT NULL, seen_at REAL NOT NULL,
+    PRIMARY KEY (student, question_id)
+) WITHOUT ROWID;
+"""
+
+COLUMNS = "id, topic, difficulty, answered, question, a, b, c, d, answer"
+
+
+def question_text(question):
+    """The text compared for near-duplicates: the stem followed by the options."""
+    return " ".join([question["question"], question["A"], question["B"], question["C"], question["D"]])
+
+
+def _band_buckets(signature, bands=BANDS):
+    rows = len(signature) // bands
+    buckets = []
+    for band in range(bands):
+        packed = struct.pack(f"<{rows}Q", *signature[band * rows:(band + 1) * rows])
+        # Signed 63-bit so it fits an SQLite INTEGER
+        buckets.append((band, int.from_bytes(hashlib.blake2b(packed, digest_size=8).digest(), "little") >> 1))
+    return buckets
+
+
+def _row_to_item(row):
+    item_id, topic, difficulty, answered, question, a, b, c, d, answer = row
+    return {
+        "item_id": item_id, "topic": topic, "difficulty": difficulty, "answered": answered,
+        "question": {"question": question, "A": a, "B": b, "C": c, "D": d, "answer": answer},
+    }
+
+
+class QuestionBank:
+    """Questions, their LSH bands and who has seen what, in one WAL-mode SQLite file."""
+
+    def __init__(self, path=QUESTION_BANK_PATH, threshold=DUPLICATE_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self.hasher = MinHasher(NUM_PERM)
+        self.inserted = 0
+        self.duplicates = 0
+        self.rounds_from_bank = 0
+        self.rounds_generated = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _db(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Close this thread's connection, e.g. in a preloading parent before it forks workers."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def add(self, question, topic, level, difficulty=0.0, explanation=None):
+        """Insert a validated question; returns (item id, True) or (id of the near-duplicate, False)."""
+        text = question_text(question)
+        grams = shingles(text)
+        buckets = _band_buckets(self.hasher.signature(grams))
+        fingerprint = hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+        conn = self._db()
+        # BEGIN IMMEDIATE so two workers can't both pass the duplicate check for the same question
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            existing = self._find_duplicate(conn, topic, fingerprint, grams, buckets)
+            if existing is not None:
+                conn.execute("COMMIT")
+                with self._lock:
+                    self.duplicates += 1
+                return existing, False
+
+            cursor = conn.execute(
+                "INSERT INTO questions (topic, level, difficulty, question, a, b, c, d, answer, explanation,"
+                " fingerprint, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (topic, level, difficulty, question["question"], question["A"], question["B"], question["C"],
+                 question["D"], question["answer"], explanation, fingerprint, time.time()),
+            )
+            item_id = cursor.lastrowid
+            conn.executemany("INSERT OR IGNORE INTO question_bands (band, bucket, question_id) VALUES (?, ?, ?)",
+                             [(band, bucket, item_id) for band, bucket in buckets])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        with self._lock:
+            self.inserted += 1
+        return item_id, True
+
+    def _find_duplicate(self, conn, topic, fingerprint, grams, buckets):
+        row = conn.execute("SELECT id FROM questions WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row:
+            return row[0]
+        clauses = " OR ".join("(band = ? AND bucket = ?)" for _ in buckets)
+        params = [value for pair in buckets for value in pair]
+        candidates = conn.execute(
+            f"SELECT q.id, q.question, q.a, q.b, q.c, q.d FROM questions q WHERE q.topic = ? AND q.id IN "
+            f"(SELECT question_id FROM question_bands WHERE {clauses})",
+            [topic, *params],
+        ).fetchall()
+        best, best_score = None, self.threshold
+        for item_id, *parts in candidates:
+            score = jaccard(grams, shingles(" ".join(parts)))
+            if score >= best_score:
+                best, best_score = item_id, score
+        return best
+
+    def unseen(self, student, topic, low, high, count):
+        """Up to `count` questions on topic with difficulty in [low, high] the student hasn't been served.
+
+        Least-served questions come first, so new questions get calibrated.
+        """
+        rows = self._db().execute(
+            f"SELECT {COLUMNS} FROM questions q WHERE topic = ? AND difficulty BETWEEN ? AND ?"
+            " AND NOT EXISTS (SELECT 1 FROM seen s WHERE s.student = ? AND s.question_id = q.id)"
+            " ORDER BY served LIMIT ?",
+            (topic, low, high, student, count),
+        ).fetchall()
+        return [_row_to_item(row) for row in rows]
+
+    def get(self, item_id):
+        row = self._db().execute(f"SELECT {COLUMNS} FROM questions WHERE id = ?", (item_id,)).fetchone()
+        return _row_to_item(row) if row else None
+
+    def seen_ids(self, student, item_ids):
+        """The subset of item_ids already served to the student."""
+        if not item_ids:
+            return set()
+        marks = ",".join("?" * len(item_ids))
+        rows = self._db().execute(
+            f"SELECT question_id FROM seen WHERE student = ? AND question_id IN ({marks})", (student, *item_ids)
+        )
+        return {row[0] for row in rows}
+
+    def items(self, item_ids=None):
+        """Every question, or those with the given ids, for loading the in-memory item arrays."""
+        if item_ids is None:
+            rows = self._db().execute(f"SELECT {COLUMNS} FROM questions ORDER BY id")
+        else:
+            marks = ",".join("?" * len(item_ids))
+            rows = self._db().execute(f"SELECT {COLUMNS} FROM questions WHERE id IN ({marks})", tuple(item_ids))
+        return [_row_to_item(row) for row in rows]
+
+    def mark_served(self, student, item_ids):
+        now = time.time()
+        conn = self._db()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO seen (student, question_id, seen_at) VALUES (?, ?, ?)",
+                             [(student, item_id, now) for item_id in item_ids])
+            conn.executemany("UPDATE questions SET served = served + 1, last_served_at = ? WHERE id = ?",
+                             [(now, item_id) for item_id in item_ids])
+
+    def record_answers(self, item_ids, correct, shifts):
+        """Add a batch of answers and each item's calibration change ({item id: shift}) to the stored row.
+
+        Difficulty is moved by the shift rather than overwritten, so workers calibrating
+        the same item at once each contribute instead of the last writer winning.
+        """
+        totals = {}
+        for item_id, ok in zip(item_ids, correct):
+            answered, right = totals.get(item_id, (0, 0))
+            totals[item_id] = (answered + 1, right + int(ok))
+        conn = self._db()
+        with conn:
+            conn.executemany(
+                "UPDATE questions SET answered = answered + ?, correct = correct + ?, difficulty = difficulty + ?"
+                " WHERE id = ?",
+                [(answered, right, float(shifts.get(item_id, 0.0)), item_id)
+                 for item_id, (answered, right) in totals.items()],
+            )
+
+    def explanation(self, item_id):
+        row = self._db().execute("SELECT explanation FROM questions WHERE id = ?", (item_id,)).fetchone()
+        return row[0] if row else None
+
+    def set_explanation(self, item_id, explanation):
+        conn = self._db()
+        with conn:
+            conn.execute("UPDATE questions SET explanation = ? WHERE id = ?", (explanation, item_id))
+
+    def count_round(self, from_bank):
+        with self._lock:
+            if from_bank:
+                self.rounds_from_bank += 1
+            else:
+                self.rounds_generated += 1
+
+    def stats(self):
+        conn = self._db()
+        by_topic = {
+            topic: {"questions": count, "explained": explained, "served": served}
+            for topic, count, explained, served in conn.execute(
+                "SELECT topic, COUNT(*), COUNT(explanation), SUM(served) FROM questions GROUP BY topic"
+            )
+        }
+        with self._lock:
+            rounds = self.rounds_from_bank + self.rounds_generated
+            return {
+                "topics": by_topic,
+                "inserted": self.inserted,
+                "duplicates_rejected": self.duplicates,
+                "rounds_from_bank": self.rounds_from_bank,
+                "rounds_generated": self.rounds_generated,
+                "bank_rate": round(self.rounds_from_bank / rounds, 4) if rounds else 0.0,
+            }
@@ -0,0 +1,121 @@
+import os
+import queue
+import threading
+import time
+from collections import deque
+from functools import partial
+
+from admission import BACKGROUND, Overloaded
+from mcq import generate_questions_batch
+
+# Refill a (topic, level) bucket once it drops below LOW, up to HIGH questions
+LOW_WATERMARK = int(os.getenv("QUESTION_POOL_LOW", 4))
+HIGH_WATERMARK = int(os.getenv("QUESTION_POOL_HIGH", 12))
+WORKERS = int(os.getenv("QUESTION_POOL_WORKERS", 2))
+# Largest number of questions requested from Gemini in one refill call
+REFILL_BATCH = 6
+# Pause after a failed refill so an upstream outage doesn't become a hot loop
+FAILURE_BACKOFF = 5.0
+
+
+class QuestionPool:
+    """Warm per-(topic, level) buffers of MCQs kept filled by background workers."""
+
+    def __init__(self, generate=None, low=LOW_WATERMARK, high=HIGH_WATERMARK, workers=WORKERS):
+        # Prefetching is never urgent, so by default it only gets quota that live requests leave over
+        self.generate = generate or partial(generate_questions_batch, priority=BACKGROUND)
+        self.low = low
+        self.high = max(high, low)
+        self.workers = workers
+        self.buckets = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._queue = queue.Queue()
+        self._threads = []
+
+    def start(self):
+        """Start the refill workers (idempotent)."""
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"question-pool-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def warm(self, topics, levels):
+        """Queue a refill for every (topic, level) pair, e.g. at startup."""
+        for topic in topics:
+            for level in levels:
+                self._schedule((topic, level))
+
+    def take(self, topic, level, count):
+        """Pop `count` questions for (topic, level), or return None if the bucket is short."""
+        key = (topic, level)
+        with self._lock:
+            bucket = self.buckets.setdefault(key, deque())
+            if len(bucket) >= count:
+                questions = [bucket.popleft() for _ in range(count)]
+                self.hits += 1
+            else:
+                questions = None
+                self.misses += 1
+            remaining = len(bucket)
+
+        if remaining < self.low:
+            self._schedule(key)
+        return questions
+
+    def stats(self):
+        """Fill level per bucket plus hit/miss counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "refill_failures": self.failures,
+                "low_watermark": self.low,
+                "high_watermark": self.high,
+                "fill": {f"{topic}|{level}": len(bucket) for (topic, level), bucket in self.buckets.items()},
+                "refills_pending": len(self._pending),
+            }
+
+    def _schedule(self, key):
+        self.start()
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._queue.put(key)
+
+    def _run(self):
+        while True:
+            key = self._queue.get()
+            try:
+                self._refill(key)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def _refill(self, key):
+        topic, level = key
+        while True:
+            with self._lock:
+                missing = self.high - len(self.buckets.setdefault(key, deque()))
+            if missing <= 0:
+                return
+
+            try:
+                questions = self.generate(min(missing, REFILL_BATCH), level=level, topic=topic)
+            except Overloaded as e:
+                questions = {"error": str(e)}
+            if "error" in questions:
+                with self._lock:
+                    self.failures += 1
+                time.sleep(FAILURE_BACKOFF)
+                return
+
+            with self._lock:
+                self.buckets[key].extend(questions)
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+
+import numpy as np
+
+from blueprints import BLUEPRINT_DIR, _file_sha256
+from grading import STOPWORDS
+from text_cache import CACHE_DIR
+
+RETRIEVAL_DIR = os.path.join(CACHE_DIR, "retrieval")
+# Bump when chunking or tokenization changes so per-file caches are rebuilt
+INDEX_VERSION = 1
+
+CHUNK_WORDS = 80  # target chunk size; chunks also break at section headers
+TOP_K = 4
+CONTEXT_TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", 600))
+MIN_SCORE = 1.0  # below this a chunk is treated as unrelated to the question
+
+_WORD = re.compile(r"[a-z0-9]+")
+_HEADER = re.compile(r"^[A-Z][A-Za-z ]{1,40}:\s*$")
+_BUILD = re.compile(r"build-[0-9a-f]{16}")  # finished build directories, not another worker's .tmp
+
+
+def tokenize(text):
+    return [word for word in _WORD.findall(text.lower()) if word not in STOPWORDS and len(word) > 1]
+
+
+def estimate_tokens(text):
+    # Roughly 4 characters per token for English text
+    return len(text) // 4 + 1
+
+
+def chunk_pdf(path):
+    """Split a PDF into ~CHUNK_WORDS-word chunks per page, starting a new chunk at each section header."""
+    chunks = []
+    import fitz  # PyMuPDF, only needed when a manual isn't in the per-file cache yet
+
+    source = os.path.basename(path)
+    with fitz.open(path) as document:
+        for page_number, page in enumerate(document, 1):
+            lines, words = [], 0
+            for line in page.get_text().splitlines():
+                line = line.strip()
+                if not line or line in ("•", "o"):
+                    continue
+                if lines and (words >= CHUNK_WORDS or _HEADER.match(line)):
+                    chunks.append({"source": source, "page": page_number, "text": " ".join(lines)})
+                    lines, words = [], 0
+                lines.append(line)
+                words += len(line.split())
+            if lines:
+                chunks.append({"source": source, "page": page_number, "text": " ".join(lines)})
+    return chunks
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring, stored as CSR NumPy arrays that are memory-mapped on load.
+
+    Each PDF's chunks and term counts are cached by file hash, so adding or changing
+    one manual only re-reads that file; the global arrays are re-assembled from the
+    per-file caches. Every build is written to a directory of its own and then made
+    current by replacing manifest.json, so a reader that opens the arrays through
+    the manifest always sees one complete build.
+    """
+
+    ARRAYS = ("offsets", "doc_ids", "tfs", "doc_len")
+    FILES = tuple(f"{name}.npy" for name in ARRAYS) + ("vocab.json", "chunks.json")
+
+    def __init__(self, index_dir=RETRIEVAL_DIR, k1=1.5, b=0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.chunks = []
+        self.arrays = {}
+        self.avgdl = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.index_dir, "manifest.json")
+
+    def build(self, paths):
+        """Bring the index up to date with `paths`, then load it."""
+        os.makedirs(os.path.join(self.index_dir, "sources"), exist_ok=True)
+        manifest = _read_json(self.manifest_path) or {}
+        previous = manifest.get("files", {})
+
+        files = {}
+        for path in sorted(paths):
+            stat = os.stat(path)
+            known = previous.get(path)
+            if known and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+                files[path] = known
+            else:
+                files[path] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha256": _file_sha256(path)}
+
+        fingerprint = [INDEX_VERSION] + [files[path]["sha256"] for path in sorted(files)]
+        current = manifest.get("current")
+        if manifest.get("fingerprint") != fingerprint or not self._complete(current):
+            version = self._assemble(fingerprint, [self._source_entries(path, files[path]["sha256"])
+                                                   for path in sorted(files)])
+            _write_json(self.manifest_path, {"fingerprint": fingerprint, "files": files, "current": version})
+            # The build just replaced may still be opened by a reader that read the old manifest
+            self._prune(keep={version, current})
+        elif files != previous:
+            _write_json(self.manifest_path, {"fingerprint": fingerprint, "files": files, "current": current})
+        return self.load()
+
+    def _source_entries(self, path, sha256):
+        """Chunks plus per-chunk term counts for one file, from the per-file cache when possible."""
+        cache_path = os.path.join(self.index_dir, "sources", f"{sha256}.v{INDEX_VERSION}.json")
+        entries = _read_json(cache_path)
+        if entries is None:
+            entries = []
+            for chunk in chunk_pdf(path):
+                entries.append(dict(chunk, terms=Counter(tokenize(chunk["text"]))))
+            _write_json(cache_path, entries)
+        return entries
+
+    def _assemble(self, fingerprint, sources):
+        """Write the arrays for `sources` into a new build directory; returns its name."""
+        # Named after the fingerprint, so workers building the same manuals agree on one directory
+        version = "build-" + hashlib.sha256(json.dumps(fingerprint).encode("utf-8")).hexdigest()[:16]
+        if self._complete(version):
+            return version
+
+        vocab, postings, chunks, doc_len = {}, [], [], []
+        for entries in sources:
+            for entry in entries:
+                doc_id = len(chunks)
+                chunks.append({key: entry[key] for key in ("source", "page", "text")})
+                doc_len.append(sum(entry["terms"].values()))
+                for term, count in entry["terms"].items():
+                    term_id = vocab.setdefault(term, len(vocab))
+                    if term_id == len(postings):
+                        postings.append([])
+                    postings[term_id].append((doc_id, count))
+
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p) for p in postings])
+        flat = [pair for plist in postings for pair in plist]
+        arrays = {
+            "offsets": offsets,
+            "doc_ids": np.array([doc for doc, _ in flat], dtype=np.int32),
+            "tfs": np.array([tf for _, tf in flat], dtype=np.float32),
+            "doc_len": np.array(doc_len, dtype=np.float32),
+        }
+
+        tmp_dir = os.path.join(self.index_dir, f"{version}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for name, array in arrays.items():
+            with open(os.path.join(tmp_dir, f"{name}.npy"), "wb") as f:
+                np.save(f, array)
+        _write_json(os.path.join(tmp_dir, "vocab.json"), vocab)
+        _write_json(os.path.join(tmp_dir, "chunks.json"), chunks)
+        try:
+            os.rename(tmp_dir, os.path.join(self.index_dir, version))
+        except OSError:
+            # Another worker moved the same build into place first
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not self._complete(version):
+                raise
+        return version
+
+    def _complete(self, version):
+        if not version:
+            return False
+        return all(os.path.exists(os.path.join(self.index_dir, version, name)) for name in self.FILES)
+
+    def _prune(self, keep):
+        """Remove every build directory except `keep`; open memory maps survive their files' removal."""
+        for entry in os.scandir(self.index_dir):
+            if entry.is_dir() and _BUILD.fullmatch(entry.name) and entry.name not in keep:
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def load(self):
+        """Memory-map the current build's posting arrays so start-up cost doesn't grow with index size."""
+        version = (_read_json(self.manifest_path) or {}).get("current")
+        if not self._complete(version):
+            return self
+        directory = os.path.join(self.index_dir, version)
+        arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in self.ARRAYS}
+        vocab = _read_json(os.path.join(directory, "vocab.json")) or {}
+        chunks = _read_json(os.path.join(directory, "chunks.json")) or []
+        with self._lock:
+            self.arrays, self.vocab, self.chunks = arrays, vocab, chunks
+            self.avgdl = float(arrays["doc_len"].mean()) if len(chunks) else 0.0
+        return self
+
+    def search(self, query, k=TOP_K):
+        """Top-k (score, chunk) pairs for a query, best first."""
+        arrays, vocab, chunks = self.arrays, self.vocab, self.chunks
+        if not chunks:
+            return []
+
+        offsets, doc_ids, tfs, doc_len = (arrays[name] for name in self.ARRAYS)
+        n_docs = len(chunks)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = offsets[term_id], offsets[term_id + 1]
+            docs, tf = doc_ids[start:end], tfs[start:end]
+            df = end - start
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_len[docs] / self.avgdl)
+            # Each document appears once per term, so plain fancy-index addition is safe
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        k = min(k, n_docs)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), chunks[i]) for i in top if scores[i] > 0]
+
+    def context(self, query, budget=CONTEXT_TOKEN_BUDGET, k=TOP_K, min_score=MIN_SCORE):
+        """Best-matching excerpts formatted for a prompt, kept under `budget` tokens."""
+        parts, used = [], 0
+        for score, chunk in self.search(query, k):
+            if score < min_score:
+                break
+            excerpt = f"[{chunk['source']}, page {chunk['page']}] {chunk['text']}"
+            cost = estimate_tokens(excerpt)
+            if used + cost > budget:
+                continue
+            parts.append(excerpt)
+            used += cost
+        return "\n\n".join(parts)
+
+
+def manual_paths(directory=BLUEPRINT_DIR):
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, name) for name in os.listdir(directory) if name.lower().endswith(".pdf")]
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
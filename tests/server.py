@@ -1,19 +1,78 @@
-from flask import Flask, request, jsonify
+"""The OLabs backend: grading, quiz, simplification, chat and text-to-speech routes in one Flask service.
+
+    python server.py                  # development server on port 5000
+    gunicorn -c gunicorn.conf.py      # preloaded master, forked gthread workers
+
+Each feature's routes are a blueprint registered by create_app(). Anything slow to
+build (blueprint PDFs, the lab-manual index, the question bank mirror) is loaded
+on first use, or up front by preload_resources() when a forking server preloads the app.
+"""
+from flask import Blueprint, Flask, request, jsonify, Response, stream_with_context, g, send_file, abort, url_for
 from flask_cors import CORS
 import requests
-import os
+import hmac
+import json
 import re
-from dotenv import load_dotenv
 import random  # Import the random module
-
-# Load environment variables
-load_dotenv()
-
-app = Flask(__name__)
-CORS(app)  # Allow requests from frontend
-
-# Your API Key
-API_KEY = os.getenv("GEMINI_API_KEY")
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import gemini_client
+from gemini_client import API_KEY
+from admission import BACKGROUND, INTERACTIVE, Overloaded, admission
+from fanout import fan_out, FanOutError, FanOutTimeout
+from mcq import ROUND_RETRY_BUDGET, generate_questions_batch, parse_questions
+from question_pool import QuestionPool
+from text_cache import TieredCache, cache_key
+from chat_cache import SimilarityCache
+from chat_memory import ChatMemory, summary_prompt
+from session_store import create_session_store
+from ability import LEVEL_DIFFICULTY, MAX_DIFFICULTY_GAP, AbilityModel, ItemBank, information
+from question_bank import QuestionBank
+from grading import (
+    PROCEDURE_VERDICT_SCHEMA, finish_score, format_score, needs_procedure_judgement,
+    parse_procedure_verdict, procedure_prompt, score_locally,
+)
+from blueprints import BlueprintRegistry, slugify
+from bulk_grading import BULK_DIR, BulkRun, detect_format, read_submissions
+from documents import DocumentRun
+from retrieval import BM25Index, manual_paths
+from tts_cache import MIMETYPES, AudioCache, TTSError, procedure_steps
+import metrics
+from metrics import HTTP_IN_FLIGHT, HTTP_LATENCY, HTTP_REQUESTS, PARSE_FAILURES
+
+ops_routes = Blueprint("ops", __name__)
+grading_routes = Blueprint("grading", __name__)
+quiz_routes = Blueprint("quiz", __name__)
+simplify_routes = Blueprint("simplify", __name__)
+chat_routes = Blueprint("chat", __name__)
+speech_routes = Blueprint("speech", __name__)
+
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule else "unmatched"
+    g.metrics_started = time.perf_counter()
+    HTTP_IN_FLIGHT.inc(g.metrics_route)
+
+def record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+def finish_request_metrics(exc):
+    """Runs after a streamed body is finished too, so SSE/NDJSON latency covers the whole stream."""
+    route = g.pop("metrics_route", None)
+    if route is None:
+        return
+    HTTP_IN_FLIGHT.dec(route)
+    HTTP_REQUESTS.inc(route, request.method, str(g.pop("metrics_status", 500)))
+    HTTP_LATENCY.observe(time.perf_counter() - g.metrics_started, route)
+
+@ops_routes.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 # Blueprint for verification
 blueprint = """
@@ -55,67 +114,242 @@ Balanced Chemical Equation:
 Na2CO3 + 2HCl → 2NaCl + CO2 + H2O
 """
 
-# Function to compare input with the blueprint
-def compare_procedure(form_data):
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
-    
-    headers = {"Content-Type": "application/json"}
-
-    payload = {
-        "contents": [{
-            "parts": [{
-                "text": f"""
-Compare the following procedure with the original blueprint and rate its accuracy out of 10. Follow these strict deduction rules:
-
-- **Chemical Equation**: Deduct **only 3 mark** if the equation does not match exactly.
-- **Apparatus**: Deduct **only 3 mark** if at least 2 apparatus are missing. Do not deduct more than 1 mark for apparatus.
-- **Aim**: Deduct **only 2 mark** if the aim does not match exactly.
-- **Procedure Accuracy**: If the steps are mostly correct, do not deduct any marks, else reduce 2 marks.
-
-**Original Blueprint:**
-{blueprint}
-
-**Submitted Experiment Form:**
-Aim: {form_data["aim"]}
-Apparatus: {form_data["apparatus"]}
-Procedure: {form_data["procedure"]}
-Observations: {form_data["observations"]}
-Conclusion: {form_data["conclusion"]}
-
-Provide a **final numerical score out of 10**, along with a breakdown of the deductions.
-"""
-            }]
-        }]
-    }
-
-    response = requests.post(url, headers=headers, json=payload)
+# Blueprints are parsed once, on the first lookup (PDF parses are cached on disk), so each
+# submission is an O(1) lookup and only needs Gemini for the procedure judgement
+DEFAULT_EXPERIMENT = "default"
+blueprint_registry = BlueprintRegistry()
+BLUEPRINT = blueprint_registry.register(DEFAULT_EXPERIMENT, blueprint)
+PROCEDURE_VERDICT_CONFIG = {"responseMimeType": "application/json", "responseSchema": PROCEDURE_VERDICT_SCHEMA}
 
-    if response.status_code == 200:
-        result = response.json()
-        return result.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "Error: No response")
-    else:
-        return f"Error: {response.status_code}, {response.text}"
-
-@app.route("/compare", methods=["POST"])
+# Function to compare input with the blueprint
+def compare_procedure(form_data, experiment=BLUEPRINT):
+    """Score a submission: aim, apparatus and equation locally, procedure accuracy by Gemini only when borderline."""
+    local = score_locally(form_data, experiment)
+    verdict = None
+    if API_KEY and needs_procedure_judgement(local):
+        try:
+            verdict = parse_procedure_verdict(gemini_client.generate_text(
+                procedure_prompt(form_data, experiment), generation_config=PROCEDURE_VERDICT_CONFIG,
+                priority=BACKGROUND, call_site="compare",
+            ))
+        except (requests.exceptions.RequestException, Overloaded) as e:
+            print(f"Procedure judgement failed, scoring it locally: {e}")
+    return finish_score(local, verdict)
+
+def compare_response(result):
+    """Body returned by /compare: the readable score text plus the structured breakdown."""
+    return {"score": format_score(result), **result}
+
+def lookup_experiment(form_data):
+    """Blueprint named by experiment_id in the body or query string (default: the built-in titration)."""
+    experiment_id = form_data.get("experiment_id") or request.args.get("experiment_id") or DEFAULT_EXPERIMENT
+    return experiment_id, blueprint_registry.ensure_loaded().get(experiment_id)
+
+@grading_routes.route("/compare", methods=["POST"])
 def compare():
     data = request.json  # Receive form data from frontend
-    score = compare_procedure(data)
-    return jsonify({"score": score})
+    experiment_id, experiment = lookup_experiment(data)
+    if experiment is None:
+        return jsonify({"error": f"Unknown experiment: {experiment_id}"}), 404
+    return jsonify(compare_response(compare_procedure(data, experiment)))
+
+def grade_submission(form_data):
+    """Grade one submission exactly like /compare; used for bulk grading."""
+    experiment_id = form_data.get("experiment_id") or DEFAULT_EXPERIMENT
+    experiment = blueprint_registry.ensure_loaded().get(experiment_id)
+    if experiment is None:
+        return {"error": f"Unknown experiment: {experiment_id}"}
+    return {"experiment_id": experiment_id, **compare_procedure(form_data, experiment)}
+
+@grading_routes.route("/compare/bulk", methods=["POST"])
+def compare_bulk():
+    """Grade a JSONL or CSV file of submissions, streaming one NDJSON line per result as it finishes.
+
+    Send the file as multipart field "file" or as the raw body. With ?job_id=... the run is
+    checkpointed: posting the same file with the same job_id again replays the results
+    already graded and only grades the rest. Progress lines ({"progress": ...}) are sent
+    about once a second and a {"summary": ...} line ends the stream.
+    """
+    upload = request.files.get("file")
+    if upload:
+        text = upload.read().decode("utf-8-sig", errors="replace")
+        fmt = detect_format(upload.filename, upload.content_type)
+    else:
+        text = request.get_data(as_text=True)
+        fmt = detect_format("", request.content_type)
+    rows = read_submissions(text, fmt)
+    if not rows:
+        return jsonify({"error": "No submissions found in the upload."}), 400
+
+    job_id = slugify(request.args.get("job_id") or "") or uuid.uuid4().hex
+    os.makedirs(BULK_DIR, exist_ok=True)
+    job = BulkRun(rows, os.path.join(BULK_DIR, f"{job_id}.jsonl"), grade_submission)
+
+    def generate():
+        yield json.dumps({"job_id": job_id, "total": len(rows), "already_graded": len(job.previous)}) + "\n"
+        for result in job.previous:
+            yield json.dumps(result) + "\n"
+        last_report = time.monotonic()
+        for result in job:
+            yield json.dumps(result) + "\n"
+            if time.monotonic() - last_report >= 1:
+                last_report = time.monotonic()
+                yield json.dumps({"progress": job.progress.snapshot()}) + "\n"
+        yield json.dumps({"summary": job.progress.snapshot()}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"X-Accel-Buffering": "no"})
+
+@grading_routes.route("/experiments", methods=["GET"])
+def list_experiments():
+    """Experiments that /compare can grade against."""
+    return jsonify(blueprint_registry.ensure_loaded().list())
 
 # Difficulty levels mapping
 difficulty_levels = ["Basic", "Intermediate", "Advanced"]
-current_level = 1  # Start at "Intermediate"
-question_data = []  # Store last generated questions
+DEFAULT_LEVEL = 1  # Start at "Intermediate"
+QUESTIONS_PER_ROUND = 2
+DEFAULT_TOPIC = "Ohm's Law"
 
-def generate_question(level="Intermediate", topic="Ohm's Law"):
-    """Generate an MCQ using AI based on difficulty level."""
-    if not API_KEY:
-        return {"error": "API Key is missing. Check .env.local file."}
+# Prefetched questions so a round can be served without waiting on Gemini
+question_pool = QuestionPool()
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
-    headers = {"Content-Type": "application/json"}
+# Per-student quiz state (ability snapshot and the current round), shared across worker processes
+session_store = create_session_store()
 
-    prompt = f"""
+# Every validated question persists in the SQLite question bank (shared by all workers, near-duplicates
+# rejected); item_bank mirrors it in NumPy arrays for the per-student, per-topic ability model
+question_bank = QuestionBank()
+item_bank = ItemBank()
+ability_model = AbilityModel(item_bank)
+# Candidates read from the bank per round, ranked by expected information
+BANK_CANDIDATES = 8
+
+def load_bank_items(item_ids=None):
+    """Mirror questions stored by any worker into item_bank: the given ids, else all of them.
+
+    Items already mirrored get the stored calibration, which includes answers graded by other workers.
+    """
+    for item in question_bank.items(None if item_ids is None else list(set(item_ids))):
+        if item["item_id"] in item_bank:
+            item_bank.sync(item["item_id"], item["difficulty"], item["answered"])
+        else:
+            item_bank.add(item["question"], item["topic"], item["difficulty"], item["answered"],
+                          item_id=item["item_id"])
+
+def record_item_answers(item_ids, correct, before):
+    """Store answer counts and how far this batch moved each item's difficulty from `before`."""
+    shifts = dict(zip(item_ids, item_bank.difficulties(item_ids) - before))
+    question_bank.record_answers(item_ids, correct, shifts)
+
+def get_session_id():
+    """Identify the student: X-Session-Id header, session_id query param, else client address."""
+    return request.headers.get("X-Session-Id") or request.args.get("session_id") or request.remote_addr
+
+def load_quiz_state(session_id):
+    """Return (current_level, question_data) for a session."""
+    state = session_store.get(session_id) or {}
+    # Another worker may have graded this student last; pick up its estimate
+    ability_model.restore(session_id, state.get("ability"))
+    current_level = difficulty_levels.index(ability_model.level(session_id, DEFAULT_TOPIC))
+    question_data = state.get("question_data", [])
+    if any("item_id" not in q for q in question_data):
+        question_data = []  # a round saved before questions were banked
+    return current_level, question_data
+
+def save_quiz_state(session_id, question_data):
+    session_store.set(session_id, {"ability": ability_model.snapshot(session_id), "question_data": question_data})
+
+def save_ability(session_id):
+    """Store the student's ability snapshot, keeping the round they may be in the middle of."""
+    state = session_store.get(session_id) or {}
+    session_store.set(session_id, dict(state, ability=ability_model.snapshot(session_id)))
+
+# Bearer token for /ability/responses; the endpoint is disabled while it is unset
+ABILITY_ADMIN_TOKEN = os.getenv("ABILITY_ADMIN_TOKEN")
+
+def is_admin_request():
+    header = request.headers.get("Authorization", "")
+    token = header[len("Bearer "):] if header.startswith("Bearer ") else ""
+    return bool(ABILITY_ADMIN_TOKEN) and hmac.compare_digest(token.encode(), ABILITY_ADMIN_TOKEN.encode())
+
+def select_questions(session_id):
+    """The round's questions from the bank: unseen, near the student's ability, most informative first.
+
+    Returns None when the bank has too few unseen questions close enough to the student's level.
+    """
+    theta, _ = ability_model.ability(session_id, DEFAULT_TOPIC)
+    candidates = question_bank.unseen(session_id, DEFAULT_TOPIC, theta - MAX_DIFFICULTY_GAP,
+                                      theta + MAX_DIFFICULTY_GAP, BANK_CANDIDATES)
+    if len(candidates) < QUESTIONS_PER_ROUND:
+        return None
+    for item in candidates:
+        if item["item_id"] in item_bank:
+            # The stored calibration includes answers graded by the other workers
+            item_bank.sync(item["item_id"], item["difficulty"], item["answered"])
+        else:
+            item_bank.add(item["question"], item["topic"], item["difficulty"], item["answered"], item["item_id"])
+    candidates.sort(key=lambda item: -information(theta, item["difficulty"]))
+    return [dict(item["question"], item_id=item["item_id"]) for item in candidates[:QUESTIONS_PER_ROUND]]
+
+def bank_questions(session_id, questions, level):
+    """Store freshly generated questions; returns the ones the student can be served, tagged with item ids.
+
+    A near-duplicate of a stored question is replaced by the stored one, or dropped
+    if the student has already been served it.
+    """
+    banked = []
+    for question in questions:
+        item_id, inserted = question_bank.add(question, DEFAULT_TOPIC, level, LEVEL_DIFFICULTY[level])
+        if not inserted:
+            if question_bank.seen_ids(session_id, [item_id]):
+                continue
+            item = question_bank.get(item_id)
+            question, difficulty, answered = item["question"], item["difficulty"], item["answered"]
+        else:
+            difficulty, answered = LEVEL_DIFFICULTY[level], 0
+        item_bank.add(question, DEFAULT_TOPIC, difficulty, answered, item_id=item_id)
+        banked.append(dict(question, item_id=item_id))
+    return banked
+
+def add_fresh(session_id, questions, fresh, level):
+    """Bank freshly fetched questions and append those not already in the round to `questions`."""
+    seen = {q["item_id"] for q in questions}
+    questions.extend(q for q in bank_questions(session_id, fresh, level) if q["item_id"] not in seen)
+
+def serve_round(session_id, questions, from_bank):
+    """Record that the round's questions have been given to the student."""
+    question_bank.count_round(from_bank)
+    question_bank.mark_served(session_id, [q["item_id"] for q in questions])
+
+def next_round(session_id, level, fetch):
+    """Questions for the student's next round: from the bank if it can, else fetched fresh and banked.
+
+    fetch(count, level) returns a list of new questions or an error dict; it is retried,
+    within the round's budget, while near-duplicates leave the round short. The async
+    server runs the same steps with an awaitable fetch (async_server.next_round).
+    """
+    questions = select_questions(session_id)
+    from_bank = questions is not None
+    if not from_bank:
+        questions = []
+        for _ in range(1 + ROUND_RETRY_BUDGET):
+            missing = QUESTIONS_PER_ROUND - len(questions)
+            if missing <= 0:
+                break
+            fresh = fetch(missing, level)
+            if "error" in fresh:
+                if not questions:
+                    return fresh
+                break
+            add_fresh(session_id, questions, fresh, level)
+        if not questions:
+            return {"error": "Invalid AI response format."}
+    serve_round(session_id, questions, from_bank)
+    return questions
+
+def question_prompt(level, topic):
+    return f"""
     You are a physics tutor. Generate a **multiple-choice question (MCQ)** on **{topic}**. **Difficulty Level:** {level}
 
     Format:
@@ -129,70 +363,81 @@ def generate_question(level="Intermediate", topic="Ohm's Law"):
     Ensure the response follows this structure strictly.
     """
 
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        ai_response = response.json()
-
-        # Extract AI response
-        question_text = ai_response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-
-        if not question_text:
-            return {"error": "AI response was empty."}
+def parse_question(question_text):
+    """Turn the model's MCQ (markdown or JSON) into a question dict, or an error dict."""
+    if not question_text:
+        return {"error": "AI response was empty."}
 
-        # Regex for extracting question, options, and correct answer
-        question_match = re.search(r"\*\*Question:\*\*\s*(.+)", question_text)
-        options = re.findall(r"([A-D])\)\s*(.+)", question_text)
-        correct_answer_match = re.search(r"\*\*Correct Answer:\*\*\s*([A-D])", question_text)
+    questions, _ = parse_questions(question_text)
+    if not questions:
+        PARSE_FAILURES.inc("question_markdown")
+        return {"error": "Invalid AI response format."}
+    return questions[0].as_dict()
 
-        if not question_match or not options or not correct_answer_match:
-            return {"error": "Invalid AI response format."}
-
-        question = question_match.group(1).strip()
-        correct_answer = correct_answer_match.group(1).strip()
-        options_dict = {opt[0]: opt[1].strip() for opt in options}
-
-        # Ensure exactly 4 options and a valid correct answer
-        if len(options_dict) != 4 or correct_answer not in options_dict:
-            return {"error": "Invalid options or answer key from AI."}
-
-        question_data = {
-            "question": question,
-            "A": options_dict["A"],
-            "B": options_dict["B"],
-            "C": options_dict["C"],
-            "D": options_dict["D"],
-            "answer": correct_answer,
-        }
+def generate_question(level="Intermediate", topic="Ohm's Law"):
+    """Generate an MCQ using AI based on difficulty level."""
+    if not API_KEY:
+        return {"error": "API Key is missing. Check .env.local file."}
 
-        return question_data
+    try:
+        # Never coalesced: a round asks for several questions with the same prompt and each must be its own sample
+        return parse_question(gemini_client.generate_text(question_prompt(level, topic), coalesce=False,
+                                                          call_site="question"))
 
     except requests.exceptions.RequestException as e:
         return {"error": f"API Error: {e}"}
+    except Overloaded:
+        # Shed by admission control: the route answers 503 rather than a generic error
+        raise
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
         return {"error": "An unexpected error occurred."}
 
-def generate_questions(num_questions=2, level="Intermediate", topic="Ohm's Law"):
-    """Generate a list of MCQs."""
-    questions = []
-    for _ in range(num_questions):
-        question = generate_question(level=level, topic=topic)
-        if "error" in question:
-            return {"error": question["error"]}
-        questions.append(question)
+def is_upstream_error(result):
+    """True for generate_question's errors that a retry within the round can't fix (API failure or no key)."""
+    return result.get("error", "").startswith("API ")
+
+def generate_questions(num_questions=2, level="Intermediate", topic="Ohm's Law", batch=True):
+    """Generate a list of MCQs, in one structured call (batch) or one concurrent call per question."""
+    if batch:
+        return generate_questions_batch(num_questions, level=level, topic=topic)
+
+    # Keep the questions that parsed and re-request only the missing ones, within the round's budget
+    questions, error = [], None
+    try:
+        for _ in range(1 + ROUND_RETRY_BUDGET):
+            missing = num_questions - len(questions)
+            if missing <= 0:
+                break
+            # Unparseable answers are re-requested; a failing upstream ends the round at once
+            results = fan_out(generate_question, [(level, topic)] * missing, is_error=is_upstream_error)
+            questions.extend(q for q in results if "error" not in q)
+            error = next((q["error"] for q in results if "error" in q), error)
+    except FanOutError as e:
+        return e.result
+    except FanOutTimeout:
+        return {"error": "Timed out while generating questions."}
+
+    if len(questions) < num_questions:
+        return {"error": error or "Invalid AI response format."}
     return questions
 
-@app.route("/simplify-text", methods=["POST"])
-def simplify_text():
-    """Simplify a block of text using Gemini API."""
-    text_to_simplify = request.json.get("text")
-    if not text_to_simplify:
-        return jsonify({"error": "No text provided for simplification."}), 400
+# Bump when the simplify prompt changes so cached answers from the old prompt are ignored
+SIMPLIFY_PROMPT_VERSION = "v1"
+simplify_cache = TieredCache("simplify", max_entries=2048)
 
-    prompt = f"""
+def clean_simplified_text(simplified_text):
+    """Format processing to remove ** and other markdown characters."""
+    simplified_text = simplified_text.replace("**Simplified Text:**", "Simplified Text:")
+    simplified_text = simplified_text.replace("**Purpose:**", "Purpose:")
+    simplified_text = simplified_text.replace("**", "")
+    simplified_text = simplified_text.replace("***", "")
+
+    # Remove any extra whitespace and ensure consistent formatting
+    return simplified_text.strip()
+
+def simplify_prompt(text_to_simplify):
+    return f"""
     You are a tutor. Simplify the following text from a physics lab procedure to make it easier to understand for high school students and explain the purpose of the instruction. 
     
     The text to simplify is: {text_to_simplify}
@@ -206,77 +451,261 @@ def simplify_text():
     Provide the simplified text focusing on clarity and avoiding technical jargon where possible. Keep the core meaning intact.
     """
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+@simplify_routes.route("/simplify-text", methods=["POST"])
+def simplify_text():
+    """Simplify a block of text using Gemini API."""
+    text_to_simplify = request.json.get("text")
+    if not text_to_simplify:
+        return jsonify({"error": "No text provided for simplification."}), 400
+
+    key = cache_key(text_to_simplify, SIMPLIFY_PROMPT_VERSION)
+    cached = simplify_cache.get(key)
+    if cached is not None:
+        return jsonify({"simplified_text": cached})
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        ai_response = response.json()
-
-        # Extract simplified text
-        simplified_text = ai_response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
-
-        # Format processing to remove ** and other markdown characters
-        simplified_text = simplified_text.replace("**Simplified Text:**", "Simplified Text:")
-        simplified_text = simplified_text.replace("**Purpose:**", "Purpose:")
-        simplified_text = simplified_text.replace("**", "")
-        simplified_text = simplified_text.replace("***", "")
-        
-        # Remove any extra whitespace and ensure consistent formatting
-        simplified_text = simplified_text.strip()
-        
+        simplified_text = clean_simplified_text(
+            gemini_client.generate_text(simplify_prompt(text_to_simplify), priority=INTERACTIVE,
+                                        call_site="simplify")
+        )
+
         if simplified_text:
+            simplify_cache.set(key, simplified_text)
             return jsonify({"simplified_text": simplified_text})
         return jsonify({"error": "Simplified text not found in API response."}), 500
 
     except requests.exceptions.RequestException as e:
         return jsonify({"error": f"API Request Error: {e}"}), 500
 
-@app.route("/generate-question", methods=["GET"])
+# Fragments per upstream call for /simplify-text/batch, and re-asks for fragments that fail to parse
+SIMPLIFY_BATCH_SIZE = 20
+SIMPLIFY_BATCH_RETRIES = 1
+
+SIMPLIFY_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "id": {"type": "STRING"},
+            "simplified_text": {"type": "STRING"},
+            "purpose": {"type": "STRING"},
+        },
+        "required": ["id", "simplified_text", "purpose"],
+    },
+}
+
+def simplify_many(fragments):
+    """Simplify {id: text} fragments in one structured call; returns {id: simplified_text} for those that parsed."""
+    numbered = "\n".join(f"[{fragment_id}] {text}" for fragment_id, text in fragments.items())
+    prompt = f"""
+    You are a tutor. Simplify each of the following instructions from a physics lab procedure to make it easier to understand for high school students and explain the purpose of each instruction.
+
+    Each instruction starts with its id in square brackets:
+    {numbered}
+
+    Return a JSON array with one object per id, with the keys "id", "simplified_text" and "purpose".
+
+    Focus on clarity and avoid technical jargon where possible. Keep the core meaning intact.
+    """
+    text = gemini_client.generate_text(prompt, generation_config={
+        "responseMimeType": "application/json",
+        "responseSchema": SIMPLIFY_BATCH_SCHEMA,
+    }, priority=INTERACTIVE, call_site="simplify")
+
+    try:
+        items = json.loads(text)
+    except ValueError:
+        PARSE_FAILURES.inc("simplify_batch")
+        return {}
+
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        fragment_id = str(item.get("id", "")).strip("[] ")
+        simplified = clean_simplified_text(str(item.get("simplified_text") or ""))
+        purpose = clean_simplified_text(str(item.get("purpose") or ""))
+        if fragment_id in fragments and simplified and purpose:
+            results[fragment_id] = f"Simplified Text: {simplified}\n\nPurpose: {purpose}"
+    if len(results) < len(fragments):
+        PARSE_FAILURES.inc("simplify_item", amount=len(fragments) - len(results))
+    return results
+
+@simplify_routes.route("/simplify-text/batch", methods=["POST"])
+def simplify_text_batch():
+    """Simplify a list of text fragments, packing cache misses into as few Gemini calls as possible."""
+    texts = (request.json or {}).get("texts")
+    if not isinstance(texts, list) or not texts or not all(isinstance(t, str) and t.strip() for t in texts):
+        return jsonify({"error": "Provide a non-empty list of texts to simplify."}), 400
+
+    keys = [cache_key(text, SIMPLIFY_PROMPT_VERSION) for text in texts]
+    simplified = {}
+    pending = {}  # cache key -> text, so repeated fragments are only sent once
+    for key, text in zip(keys, texts):
+        cached = simplify_cache.get(key)
+        if cached is not None:
+            simplified[key] = cached
+        else:
+            pending.setdefault(key, text)
+
+    try:
+        for _ in range(1 + SIMPLIFY_BATCH_RETRIES):
+            if not pending:
+                break
+            batch_keys = list(pending)
+            for start in range(0, len(batch_keys), SIMPLIFY_BATCH_SIZE):
+                chunk = batch_keys[start:start + SIMPLIFY_BATCH_SIZE]
+                # Short positional ids are easier for the model to echo back than hashes
+                ids = {str(i + 1): key for i, key in enumerate(chunk)}
+                parsed = simplify_many({fragment_id: pending[key] for fragment_id, key in ids.items()})
+                for fragment_id, result in parsed.items():
+                    key = ids[fragment_id]
+                    simplified[key] = result
+                    simplify_cache.set(key, result)
+                    del pending[key]
+    except requests.exceptions.RequestException as e:
+        if not simplified:
+            return jsonify({"error": f"API Request Error: {e}"}), 500
+
+    results = [
+        {"simplified_text": simplified[key]} if key in simplified
+        else {"error": "Simplified text not found in API response."}
+        for key in keys
+    ]
+    return jsonify({"results": results})
+
+def simplify_page(text):
+    """Simplify one page of a document, through the same cache as /simplify-text."""
+    key = cache_key(text, SIMPLIFY_PROMPT_VERSION)
+    cached = simplify_cache.get(key)
+    if cached is not None:
+        return cached
+    simplified_text = clean_simplified_text(
+        gemini_client.generate_text(simplify_prompt(text), call_site="simplify_document")
+    )
+    if not simplified_text:
+        raise ValueError("Simplified text not found in API response.")
+    simplify_cache.set(key, simplified_text)
+    return simplified_text
+
+def registered_document(name):
+    """Path of a bundled lab-manual PDF, by file name or by the id of an experiment taken from it."""
+    experiment = blueprint_registry.ensure_loaded().get(name)
+    if experiment is not None:
+        name = experiment["source"]
+    for path in manual_paths():
+        if os.path.basename(path) == name:
+            return path
+    return None
+
+@simplify_routes.route("/simplify-document", methods=["POST"])
+def simplify_document():
+    """Simplify a whole PDF, streaming one NDJSON line per page as soon as it is ready.
+
+    Upload the PDF as multipart field "file", or name a bundled one with ?document=
+    (a file name like Maintest.pdf or an experiment id). The first line is
+    {"document", "pages"}, then one {"page", "simplified_text" | "skipped" | "error"}
+    line per page in order, and a {"summary": ...} line ends the stream.
+    """
+    upload = request.files.get("file")
+    name = request.args.get("document") or request.form.get("document")
+    if upload:
+        # Spool to disk so the extraction workers can open it and the upload isn't held in memory
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        with os.fdopen(fd, "wb") as f:
+            upload.save(f)
+        name, temporary = upload.filename or "upload.pdf", True
+    elif name:
+        path, temporary = registered_document(name), False
+        if path is None:
+            return jsonify({"error": f"Unknown document: {name}"}), 404
+    else:
+        return jsonify({"error": "Upload a PDF as 'file' or name one with ?document=."}), 400
+
+    try:
+        run = DocumentRun(path, simplify_page)
+    except (RuntimeError, ValueError) as e:
+        if temporary:
+            os.unlink(path)
+        return jsonify({"error": f"Could not read PDF: {e}"}), 400
+
+    def generate():
+        yield json.dumps({"document": name, "pages": run.total}) + "\n"
+        for result in run:
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"summary": run.summary()}) + "\n"
+
+    response = Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                        headers={"X-Accel-Buffering": "no"})
+    if temporary:
+        # Runs when the server closes the response, even if the stream was never started
+        response.call_on_close(lambda: os.unlink(path))
+    return response
+
+@quiz_routes.route("/generate-question", methods=["GET"])
 def get_question():
-    """Return two MCQ questions based on current difficulty."""
-    global question_data
-    questions = generate_questions(num_questions=2, level=difficulty_levels[current_level]) # Generate two questions
+    """Return two MCQ questions matched to the student's ability."""
+    session_id = get_session_id()
+    current_level, _ = load_quiz_state(session_id)
+    questions = next_round(session_id, difficulty_levels[current_level], fetch_questions)
     if "error" in questions:
         return jsonify(questions)  # Return error if any
 
-    question_data = questions  # Store the generated questions
+    save_quiz_state(session_id, questions)  # Store the round for /check-answer
     return jsonify(questions)
 
-@app.route("/check-answer", methods=["POST"])
-def check_answer():
-    """Validate user's answers, adjust difficulty, and provide explanations."""
-    global current_level, question_data
-    data = request.json
-    selected_answers = data.get("selected_answers")  # Expecting a list of answers
-
-    if not question_data:
-        return jsonify({"error": "No questions generated yet!"}), 400
-
-    if not isinstance(selected_answers, list) or len(selected_answers) != len(question_data):
-        return jsonify({"error": "Incorrect number of answers provided."}), 400
+def fetch_questions(count, level):
+    """New questions from the prefetch pool, or generated live when it is short."""
+    questions = question_pool.take(DEFAULT_TOPIC, level, count)
+    if questions is None:
+        # Pool is empty for this level, generate live
+        questions = generate_questions(num_questions=count, level=level, topic=DEFAULT_TOPIC)
+    return questions
 
+@quiz_routes.route("/question-bank", methods=["GET"])
+def question_bank_stats():
+    """Report stored questions per topic, rejected near-duplicates and how many rounds the bank served."""
+    return jsonify(question_bank.stats())
+
+@quiz_routes.route("/question-pool", methods=["GET"])
+def question_pool_stats():
+    """Report prefetch pool fill levels and hit/miss counters."""
+    return jsonify(question_pool.stats())
+
+@ops_routes.route("/upstream-stats", methods=["GET"])
+def upstream_stats():
+    """Report Gemini admission control (quota, queues, shed calls) and how many identical calls were collapsed."""
+    return jsonify({"admission": admission.stats(), "coalescing": gemini_client.coalescer.stats()})
+
+def overloaded(e):
+    """Shed load quickly with a 503 instead of letting requests pile up behind the quota."""
+    response = jsonify({"error": str(e)})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+def grade_round(session_id, question_data, selected_answers):
+    """Mark a round and update the student's ability; returns (new_level, message, correct_answers, is_correct)."""
     correct_answers = [q["answer"] for q in question_data]
     is_correct = [selected_answers[i] == correct_answers[i] for i in range(len(question_data))]
 
-    # Adjust difficulty based on performance
+    item_ids = [q["item_id"] for q in question_data]
+    load_bank_items(item_ids)  # the round may have been served, or its items calibrated, by another worker
+    before = item_bank.difficulties(item_ids)
+    ability_model.update([session_id] * len(item_ids), [DEFAULT_TOPIC] * len(item_ids), item_ids, is_correct)
+    record_item_answers(item_ids, is_correct, before)
+    current_level = difficulty_levels.index(ability_model.level(session_id, DEFAULT_TOPIC))
+
     if all(is_correct):
         message = "✅ Correct! Next questions will be harder."
-        current_level = min(current_level + 1, 2)
     elif not any(is_correct):
         message = "❌ Incorrect! Next questions will be easier."
-        current_level = max(current_level - 1, 0)
     else:
         message = "🤷‍♀️ Mixed results! Difficulty remains the same."
-    
-    explanations = [
-        generate_explanation(
-            question_data[i]["question"], question_data[i][correct_answers[i]], question_data[i]
-        ) for i in range(len(question_data))
-    ]
+    return current_level, message, correct_answers, is_correct
 
+def round_response(message, current_level, question_data, correct_answers, is_correct, explanations):
+    """Body returned by /check-answer."""
     results = []
     for i in range(len(question_data)):
         results.append({
@@ -286,18 +715,82 @@ def check_answer():
             "explanation": explanations[i],
         })
 
-    return jsonify({
+    return {
         "message": message,
         "new_level": difficulty_levels[current_level],
         "results": results,
+    }
+
+@quiz_routes.route("/check-answer", methods=["POST"])
+def check_answer():
+    """Validate user's answers, adjust difficulty, and provide explanations."""
+    session_id = get_session_id()
+    _, question_data = load_quiz_state(session_id)
+    data = request.json
+    selected_answers = data.get("selected_answers")  # Expecting a list of answers
+
+    if not question_data:
+        return jsonify({"error": "No questions generated yet!"}), 400
+
+    if not isinstance(selected_answers, list) or len(selected_answers) != len(question_data):
+        return jsonify({"error": "Incorrect number of answers provided."}), 400
+
+    current_level, message, correct_answers, is_correct = grade_round(session_id, question_data, selected_answers)
+    # Clear the round so resubmitting the same answers can't move the ability twice
+    save_quiz_state(session_id, [])
+
+    try:
+        explanations = fan_out(generate_explanation, [
+            (q["question"], q[correct_answers[i]], q) for i, q in enumerate(question_data)
+        ])
+    except FanOutTimeout:
+        explanations = ["Explanation timed out. Please try again."] * len(question_data)
+
+    return jsonify(round_response(message, current_level, question_data, correct_answers, is_correct, explanations))
+
+@quiz_routes.route("/ability", methods=["GET"])
+def get_ability():
+    """The student's estimated ability per topic, as {topic: {"theta", "answered", "level"}}."""
+    session_id = get_session_id()
+    load_quiz_state(session_id)
+    return jsonify({
+        topic: {"theta": round(theta, 3), "answered": answered, "level": ability_model.level(session_id, topic)}
+        for topic, (theta, answered) in ability_model.snapshot(session_id).items()
     })
 
-def generate_explanation(question, correct_answer, question_data):
-    """Generate a brief explanation for the correct answer."""
-    if not API_KEY:
-        return "Explanation not available due to missing API key."
+@quiz_routes.route("/ability/responses", methods=["POST"])
+def record_responses():
+    """Apply a class's answers in one batch: {"responses": [{"student_id", "item_id", "correct"}, ...]}.
 
-    prompt = f"""
+    Internal (e.g. for a teacher's grading import): it can move any student's ability, so it
+    needs "Authorization: Bearer $ABILITY_ADMIN_TOKEN" and is disabled when that isn't set.
+    """
+    if not is_admin_request():
+        return jsonify({"error": "Not authorized."}), 403
+    responses = (request.json or {}).get("responses")
+    if not isinstance(responses, list) or not responses:
+        return jsonify({"error": "Provide a non-empty list of responses."}), 400
+    try:
+        students = [str(r["student_id"]) for r in responses]
+        items = [int(r["item_id"]) for r in responses]
+        correct = [bool(r["correct"]) for r in responses]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Each response needs student_id, item_id and correct."}), 400
+    load_bank_items(items)
+    if not all(item in item_bank for item in items):
+        return jsonify({"error": "Unknown item_id."}), 400
+
+    for student in set(students):
+        load_quiz_state(student)  # start from the stored estimate, which other workers may have moved
+    before = item_bank.difficulties(items)
+    thetas = ability_model.update(students, [item_bank.topic_of(item) for item in items], items, correct)
+    record_item_answers(items, correct, before)
+    for student in set(students):
+        save_ability(student)
+    return jsonify({"updated": len(responses), "theta": [round(float(theta), 3) for theta in thetas]})
+
+def explanation_prompt(question, correct_answer, question_data):
+    return f"""
     You are a physics tutor. Explain the correct answer for the following MCQ in **2-3 sentences**.
 
     **Question:** {question}
@@ -312,24 +805,91 @@ def generate_explanation(question, correct_answer, question_data):
     Provide a concise explanation.
     """
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    payload = {"contents": [{"parts": [{"text": prompt}]}]}
+def generate_explanation(question, correct_answer, question_data):
+    """Generate a brief explanation for the correct answer, reusing the one stored with a banked question."""
+    item_id = question_data.get("item_id")
+    stored = question_bank.explanation(item_id) if item_id is not None else None
+    if stored:
+        return stored
+    if not API_KEY:
+        return "Explanation not available due to missing API key."
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        ai_response = response.json()
-
-        # Extract explanation
-        explanation = ai_response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+        explanation = gemini_client.generate_text(explanation_prompt(question, correct_answer, question_data),
+                                                  call_site="explanation")
 
+        if explanation and item_id is not None:
+            question_bank.set_explanation(item_id, explanation)
         return explanation if explanation else "No explanation provided by AI."
 
     except requests.exceptions.RequestException as e:
         return f"API Request Error: {e}"
+    except Overloaded:
+        return "Explanation not available right now. Please try again shortly."
+
+# Reworded FAQ-style questions are answered from earlier responses
+chat_cache = SimilarityCache()
+
+# Lab-manual excerpts used to ground chat answers; built on first use and rebuilt only for new or changed PDFs
+_manual_index = None
+_manual_index_lock = threading.Lock()
+
+def get_manual_index():
+    """Return the process-wide lab-manual index, building (or loading) it on first use."""
+    global _manual_index
+    if _manual_index is None:
+        with _manual_index_lock:
+            if _manual_index is None:
+                _manual_index = BM25Index().build(manual_paths())
+    return _manual_index
+
+def chat_prompt(user_message, history=""):
+    """The user's message, prefixed with the conversation so far and the most relevant lab-manual excerpts."""
+    context = get_manual_index().context(user_message)
+    if not context and not history:
+        return user_message
+    excerpts = f"""
+Use the following excerpts from the lab manuals when they are relevant to the question.
+If they don't cover it, answer from general knowledge.
+
+{context}
+""" if context else ""
+    conversation = f"""
+This is a continuing conversation. Answer the new question in its context.
+
+{history}
+""" if history else ""
+    return f"""{conversation}{excerpts}
+Question: {user_message}
+"""
 
-@app.route("/chat", methods=["POST"])
+def summarize_conversation(summary, turns):
+    """Fold chat turns into the session's rolling summary; runs on the chat-memory thread."""
+    return gemini_client.generate_text(summary_prompt(summary, turns), priority=BACKGROUND,
+                                       call_site="chat_summary")
+
+# Recent turns and a rolling summary per chat session, kept in the shared session store
+chat_memory = ChatMemory(session_store, summarize_conversation)
+
+def chat_session_id():
+    """Chat history is only kept when the client names its session; anonymous chat stays stateless."""
+    return request.headers.get("X-Session-Id") or request.args.get("session_id")
+
+@chat_routes.route("/chat-cache", methods=["GET"])
+def chat_cache_stats():
+    """Report chat similarity-cache size and hit rate, and chat-memory activity."""
+    return jsonify({**chat_cache.stats(), "memory": chat_memory.stats()})
+
+@chat_routes.route("/chat/history", methods=["DELETE"])
+def clear_chat_history():
+    """Start a fresh conversation for this session."""
+    session_id = chat_session_id()
+    if not session_id:
+        return jsonify({"error": "Send X-Session-Id to identify the conversation."}), 400
+    chat_memory.clear(session_id)
+    return jsonify({"cleared": True})
+
+@chat_routes.route("/chat", methods=["POST"])
 def chat():
     """Receive a message from the user and return a chatbot response."""
     data = request.json
@@ -339,39 +899,192 @@ def chat():
         return jsonify({"error": "Message is empty!"}), 400
 
     # Get response from Gemini AI
-    result = get_gemini_response(user_message)
+    result = get_gemini_response(user_message, chat_session_id())
     return jsonify(result)
 
-def get_gemini_response(user_input):
-    """Send user input to Gemini API and return the response."""
+def sse_event(data, event=None):
+    """Encode one server-sent event."""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@chat_routes.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Stream the chatbot response as server-sent events while Gemini generates it."""
+    data = request.json
+    user_message = data.get("message", "")
+
+    if not user_message:
+        return jsonify({"error": "Message is empty!"}), 400
+    if not API_KEY:
+        return jsonify({"error": "Missing Gemini API Key. Check .env file."}), 500
+
+    session_id = chat_session_id()
+    history = chat_memory.context(session_id) if session_id else ""
+    # A cached answer to the bare question would ignore the conversation, so only fresh chats use it
+    cached = None if history else chat_cache.get(user_message)
+    if cached is not None:
+        if session_id:
+            chat_memory.record(session_id, user_message, cached)
+        def replay():
+            yield sse_event({"text": cached})
+            yield sse_event({}, event="done")
+        return Response(replay(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    chunks = gemini_client.stream_text(chat_prompt(user_message, history), priority=INTERACTIVE, call_site="chat")
+    parts = []
+    # Wait for the first chunk before the response starts, so a shed request still gets a plain 503
+    try:
+        parts.append(next(chunks))
+    except StopIteration:
+        pass
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": f"API Error: {e}"}), 502
+
+    def generate():
+        # Each yield only returns once the WSGI server has taken the previous chunk,
+        # so a slow client throttles how fast we read from Gemini
+        try:
+            if parts:
+                yield sse_event({"text": parts[0]})
+                for text in chunks:
+                    parts.append(text)
+                    yield sse_event({"text": text})
+        except requests.exceptions.RequestException as e:
+            yield sse_event({"error": f"API Error: {e}"}, event="error")
+            return
+        finally:
+            chunks.close()
+
+        if parts:
+            reply = "".join(parts)
+            if not history:
+                chat_cache.set(user_message, reply)
+            if session_id:
+                chat_memory.record(session_id, user_message, reply)
+            yield sse_event({}, event="done")
+        else:
+            yield sse_event({"error": "Empty response from Gemini AI."}, event="error")
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # The WSGI server closes the response when the client goes away, even if generate()
+    # never started, and that closes the upstream stream
+    response.call_on_close(chunks.close)
+    return response
+
+def get_gemini_response(user_input, session_id=None):
+    """Send user input to Gemini API and return the response; with a session id the conversation is remembered."""
     if not API_KEY:
         return {"error": "Missing Gemini API Key. Check .env file."}
 
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={API_KEY}"
-    headers = {"Content-Type": "application/json"}
-
-    payload = {
-        "contents": [{"parts": [{"text": user_input}]}]
-    }
+    history = chat_memory.context(session_id) if session_id else ""
+    # A cached answer to the bare question would ignore the conversation, so only fresh chats use it
+    cached = None if history else chat_cache.get(user_input)
+    if cached is not None:
+        if session_id:
+            chat_memory.record(session_id, user_input, cached)
+        return {"response": cached}
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
-        response.raise_for_status()
-        ai_response = response.json()
-
-        # Debugging: Print the full response
-        print("Full Gemini API Response:", ai_response)
+        ai_response = gemini_client.generate_content(chat_prompt(user_input, history), priority=INTERACTIVE,
+                                                     call_site="chat")
 
         # Extract AI response text correctly
-        bot_response = ai_response.get("candidates", [{}])[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+        bot_response = gemini_client.extract_text(ai_response)
 
         if not bot_response:
             return {"error": "Empty response from Gemini AI."}
 
+        if not history:
+            chat_cache.set(user_input, bot_response)
+        if session_id:
+            chat_memory.record(session_id, user_input, bot_response)
         return {"response": bot_response}
 
     except requests.exceptions.RequestException as e:
         return {"error": f"API Error: {e}"}
 
+# Clips are stored under their content hash, so every worker serves the same files
+audio_cache = AudioCache()
+# Scheme and host the frontend should fetch clips from (it is served from another origin);
+# unset, the URL is built from the host the request came in on
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "").rstrip("/")
+
+@speech_routes.route("/api/text-to-speech", methods=["POST"])
+def text_to_speech():
+    """Convert text to speech using Voice RSS API, caching the audio on disk."""
+    data = request.get_json(silent=True) or {}
+    if not data.get("text"):
+        return jsonify({"error": "Text is required."}), 400
+
+    try:
+        key, path = audio_cache.fetch(data["text"], data)
+    except TTSError as e:
+        return jsonify({"error": f"Text-to-speech failed: {e}"}), 502
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching audio: {e}")
+        return jsonify({"error": "Failed to fetch audio response"}), 502
+
+    codec = path.rsplit(".", 1)[1]
+    audio_url = url_for("speech.text_to_speech_audio", key=key, codec=codec, _external=not PUBLIC_BASE_URL)
+    return jsonify({"audioUrl": PUBLIC_BASE_URL + audio_url})
+
+@speech_routes.route("/api/text-to-speech/<key>.<codec>", methods=["GET"])
+def text_to_speech_audio(key, codec):
+    """Serve a cached clip; ETag/If-None-Match and Range requests are handled by send_file."""
+    if not re.fullmatch(r"[0-9a-f]{64}", key) or codec not in MIMETYPES:
+        abort(404)
+    path = audio_cache.lookup(key, codec)
+    if path is None:
+        abort(404)
+    # The URL is content-addressed, so the clip behind it never changes
+    response = send_file(path, mimetype=MIMETYPES[codec], conditional=True, etag=key, max_age=365 * 24 * 3600)
+    response.headers["Cache-Control"] += ", immutable"
+    return response
+
+def preload_resources():
+    """Load now what requests would otherwise load on first use.
+
+    Meant for a forking server's master (gunicorn preload_app): the workers inherit
+    the blueprint registry, lab-manual index and item arrays copy-on-write instead
+    of each building their own.
+    """
+    blueprint_registry.ensure_loaded()
+    get_manual_index()
+    load_bank_items()
+    # An open SQLite connection must not be used across fork; each worker opens its own
+    question_bank.close()
+
+def start_background_work():
+    """Start this process's background threads; call it after forking, since threads don't survive a fork."""
+    question_pool.warm([DEFAULT_TOPIC], difficulty_levels)
+    metrics.start_flusher()
+
+def create_app(preload=False):
+    """Build the Flask app with every route blueprint, CORS, request metrics and the overload handler.
+
+    Registering routes is cheap; heavy resources load on first use unless preload is set.
+    """
+    app = Flask(__name__)
+    CORS(app)  # Allow requests from frontend
+    app.before_request(start_request_metrics)
+    app.after_request(record_status)
+    app.teardown_request(finish_request_metrics)
+    app.register_error_handler(Overloaded, overloaded)
+    for routes in (ops_routes, grading_routes, quiz_routes, simplify_routes, chat_routes, speech_routes):
+        app.register_blueprint(routes)
+    if preload:
+        preload_resources()
+    return app
+
 if __name__ == "__main__":
-    app.run(debug=True, port=5000)
+    app = create_app(preload=True)
+    start_background_work()
+    if os.getenv("TTS_PREWARM"):
+        # Synthesize every procedure step in the background so the first student to press play hits the cache
+        threading.Thread(target=lambda: audio_cache.prewarm(procedure_steps(blueprint_registry.ensure_loaded())),
+                         daemon=True).start()
+    app.run(debug=True, port=int(os.getenv("PORT", 5000)))
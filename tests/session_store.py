@@ -0,0 +1,178 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+# memory | sqlite:///path/to/sessions.sqlite3 | redis://host:port/db
+SESSION_STORE_URL = os.getenv("SESSION_STORE", "memory")
+# Idle sessions are forgotten after this many seconds
+SESSION_TTL = int(os.getenv("SESSION_TTL", 6 * 3600))
+# Expired sessions are deleted by a write at most this often (Redis expires its own keys)
+PURGE_INTERVAL = int(os.getenv("SESSION_PURGE_INTERVAL", 300))
+
+
+class MemorySessionStore:
+    """Sessions in a process-local dict; only correct with a single worker process."""
+
+    def __init__(self, ttl=SESSION_TTL, purge_interval=PURGE_INTERVAL):
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        self._data = {}
+        self._next_purge = time.time() + purge_interval
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._data.get(session_id)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._data[session_id]
+                return None
+            return json.loads(entry[0])
+
+    def set(self, session_id, state):
+        now = time.time()
+        with self._lock:
+            self._data[session_id] = (json.dumps(state), now + self.ttl)
+            if now >= self._next_purge:
+                self._next_purge = now + self.purge_interval
+                for expired in [key for key, (_, expires_at) in self._data.items() if expires_at <= now]:
+                    del self._data[expired]
+
+    def delete(self, session_id):
+        with self._lock:
+            self._data.pop(session_id, None)
+
+
+class SQLiteSessionStore:
+    """Sessions in a WAL-mode SQLite file shared by every worker on the host."""
+
+    def __init__(self, path, ttl=SESSION_TTL, purge_interval=PURGE_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.purge_interval = purge_interval
+        # Per process; with several workers each purges now and then, which is harmless
+        self._next_purge = time.time() + purge_interval
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _db(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, session_id):
+        row = self._db().execute(
+            "SELECT state FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, session_id, state):
+        now = time.time()
+        conn = self._db()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, state, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), now + self.ttl),
+            )
+            if now >= self._next_purge:
+                self._next_purge = now + self.purge_interval
+                conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    def delete(self, session_id):
+        conn = self._db()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+
+class RedisSessionStore:
+    """Sessions in any server speaking the Redis protocol (RESP), via GET/SET EX/DEL."""
+
+    def __init__(self, host="127.0.0.1", port=6379, db=0, ttl=SESSION_TTL, prefix="olabs:session:", timeout=5):
+        self.address = (host, port)
+        self.db = db
+        self.ttl = ttl
+        self.prefix = prefix
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            sock = socket.create_connection(self.address, timeout=self.timeout)
+            conn = (sock, sock.makefile("rb"))
+            self._local.conn = conn
+            if self.db:
+                self._command("SELECT", self.db)
+        return conn
+
+    def _command(self, *args):
+        sock, reader = self._connection()
+        encoded = [str(arg).encode("utf-8") for arg in args]
+        message = b"*%d\r\n" % len(encoded) + b"".join(b"$%d\r\n%s\r\n" % (len(arg), arg) for arg in encoded)
+        try:
+            sock.sendall(message)
+            return self._read_reply(reader)
+        except (OSError, ConnectionError):
+            # Drop the broken connection so the next call reconnects
+            self._local.conn = None
+            sock.close()
+            raise
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line:
+            raise ConnectionError("Redis connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RuntimeError(f"Redis error: {body.decode()}")
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            length = int(body)
+            if length == -1:
+                return None
+            return reader.read(length + 2)[:-2]
+        if kind == b"*":
+            count = int(body)
+            return None if count == -1 else [self._read_reply(reader) for _ in range(count)]
+        raise ConnectionError(f"Unexpected Redis reply: {line!r}")
+
+    def get(self, session_id):
+        value = self._command("GET", self.prefix + session_id)
+        return json.loads(value) if value is not None else None
+
+    def set(self, session_id, state):
+        self._command("SET", self.prefix + session_id, json.dumps(state), "EX", self.ttl)
+
+    def delete(self, session_id):
+        self._command("DEL", self.prefix + session_id)
+
+
+def create_session_store(url=SESSION_STORE_URL):
+    """Build a session store from a URL: memory, sqlite:///path or redis://host:port/db."""
+    if url in ("", "memory"):
+        return MemorySessionStore()
+
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        # sqlite:///relative.db and sqlite:////absolute/path.db
+        return SQLiteSessionStore(parsed.path[1:] if parsed.path.startswith("/") else parsed.path)
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisSessionStore(parsed.hostname or "127.0.0.1", parsed.port or 6379, db)
+    raise ValueError(f"Unsupported SESSION_STORE: {url}")
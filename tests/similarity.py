@@ -0,0 +1,82 @@
+import hashlib
+import random
+import re
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(text):
+    """Lower-case, drop apostrophes and punctuation, collapse whitespace."""
+    text = text.casefold().replace("'", "").replace("’", "")
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def shingles(text, k=3, words=False):
+    """Set of k-grams over the normalized text: characters (spaces removed) or words."""
+    text = normalize(text)
+    units = text.split() if words else text.replace(" ", "")
+    if len(units) <= k:
+        return {" ".join(units) if words else units} if units else set()
+    if words:
+        return {" ".join(units[i:i + k]) for i in range(len(units) - k + 1)}
+    return {units[i:i + k] for i in range(len(units) - k + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def _hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """MinHash signatures using universal hashes (a*x + b) mod p."""
+
+    def __init__(self, num_perm=64, seed=1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingle_set):
+        hashes = [_hash64(s) for s in shingle_set]
+        if not hashes:
+            return (0,) * self.num_perm
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.params)
+
+
+class LSHIndex:
+    """Banded locality-sensitive hash index over MinHash signatures."""
+
+    def __init__(self, num_perm=64, bands=16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = {}
+
+    def _band_keys(self, signature):
+        r = self.rows
+        return [(i, hash(signature[i * r:(i + 1) * r])) for i in range(self.bands)]
+
+    def add(self, key, signature):
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, set()).add(key)
+
+    def remove(self, key, signature):
+        for band_key in self._band_keys(signature):
+            bucket = self.buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band_key]
+
+    def query(self, signature):
+        """Keys that share at least one band with the signature."""
+        candidates = set()
+        for band_key in self._band_keys(signature):
+            candidates.update(self.buckets.get(band_key, ()))
+        return candidates
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from admission import BACKGROUND, INTERACTIVE, STANDARD, AdmissionController, Overloaded, admission
+from conftest import unique
+
+
+def start_waiting(controller, priority, order):
+    thread = threading.Thread(target=lambda: (controller.acquire(priority), order.append(priority)))
+    thread.start()
+    return thread
+
+
+def queued(controller, count):
+    deadline = time.monotonic() + 2
+    while sum(controller.stats()["queued"].values()) < count and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_calls_within_the_burst_go_straight_through():
+    controller = AdmissionController(rpm=60, burst=3)
+    for _ in range(3):
+        controller.acquire(INTERACTIVE)
+    assert controller.stats()["admitted"]["interactive"] == 3
+    assert controller._dispatcher is None  # nobody had to queue
+
+
+def test_queued_calls_are_granted_most_urgent_first():
+    controller = AdmissionController(rpm=1200, burst=1)  # a token every 50 ms
+    controller.acquire()
+    order = []
+    threads = [start_waiting(controller, BACKGROUND, order)]
+    queued(controller, 1)
+    threads.append(start_waiting(controller, STANDARD, order))
+    threads.append(start_waiting(controller, INTERACTIVE, order))
+    queued(controller, 3)
+
+    for thread in threads:
+        thread.join()
+    assert order == [INTERACTIVE, STANDARD, BACKGROUND]
+
+
+def test_a_call_that_would_wait_past_its_deadline_is_shed_at_once():
+    controller = AdmissionController(rpm=120, burst=1, deadlines={INTERACTIVE: 0.25})
+    controller.acquire(INTERACTIVE)
+
+    started = time.monotonic()
+    with pytest.raises(Overloaded) as shed:
+        controller.acquire(INTERACTIVE)
+    assert time.monotonic() - started < 0.1
+    assert shed.value.retry_after == 1
+    # Background work may wait longer, so it queues instead
+    controller.deadlines[BACKGROUND] = 5
+    controller.acquire(BACKGROUND)
+    assert controller.stats()["shed"] == {"interactive": 1, "standard": 0, "background": 0}
+
+
+def test_a_call_pushed_past_its_deadline_by_more_urgent_ones_is_shed():
+    controller = AdmissionController(rpm=600, burst=1, deadlines={BACKGROUND: 0.25})
+    controller.acquire()
+    outcome = []
+
+    def background():
+        try:
+            controller.acquire(BACKGROUND)
+            outcome.append("admitted")
+        except Overloaded:
+            outcome.append("shed")
+
+    thread = threading.Thread(target=background)
+    thread.start()
+    queued(controller, 1)
+    interactive = [threading.Thread(target=controller.acquire, args=(INTERACTIVE,)) for _ in range(4)]
+    for other in interactive:
+        other.start()
+    thread.join()
+    for other in interactive:
+        other.join()
+    assert outcome == ["shed"]
+    assert controller.stats()["admitted"]["interactive"] == 4
+
+
+def test_pause_holds_back_every_caller():
+    controller = AdmissionController(rpm=6000, burst=5)
+    controller.pause(0.3)
+
+    started = time.monotonic()
+    controller.acquire(INTERACTIVE)
+    assert time.monotonic() - started >= 0.25
+    assert controller.stats()["pauses"] == 1
+
+
+def test_acquire_async_waits_on_the_event_loop():
+    controller = AdmissionController(rpm=1200, burst=1)
+
+    async def run():
+        await controller.acquire_async()
+        started = time.monotonic()
+        await asyncio.gather(controller.acquire_async(INTERACTIVE), controller.acquire_async(INTERACTIVE))
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) >= 0.05
+    assert controller.stats()["admitted"]["interactive"] == 2
+
+
+def test_no_quota_admits_everything():
+    controller = AdmissionController(rpm=0, burst=1)
+    for _ in range(100):
+        controller.acquire(BACKGROUND)
+    assert controller.stats()["admitted"]["background"] == 100
+
+
+def test_a_shed_request_gets_a_503_with_retry_after(client, monkeypatch):
+    def shed(priority=STANDARD):
+        raise Overloaded("Upstream quota exhausted, try again shortly.", 2.5)
+
+    monkeypatch.setattr(admission, "acquire", shed)
+    response = client.post("/chat", json={"message": unique("What does the ammeter measure?")})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
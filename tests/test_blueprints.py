@@ -0,0 +1,31 @@
+import os
+
+import blueprints
+import server
+from blueprints import BlueprintRegistry
+
+
+def test_only_the_lab_manuals_are_registered(tmp_path):
+    registry = BlueprintRegistry(cache_dir=str(tmp_path)).load()
+
+    assert {experiment["source"] for experiment in registry.list()} == {"Maintest.pdf"}
+    assert registry.get("sample1") is None
+    blueprint = registry.get("maintest")
+    assert "Burette" in blueprint["apparatus"]
+    assert len(blueprint["procedure"]) > 5
+    assert blueprint["equation"]
+
+
+def test_unchanged_manuals_are_read_from_the_parse_cache(tmp_path, monkeypatch):
+    first = BlueprintRegistry(cache_dir=str(tmp_path)).load()
+    monkeypatch.setattr(blueprints, "extract_experiments", lambda path: 1 / 0)
+
+    second = BlueprintRegistry(cache_dir=str(tmp_path)).load()
+    assert second.get("maintest")["procedure"] == first.get("maintest")["procedure"]
+
+
+def test_a_bundled_document_is_found_by_name_or_experiment_id():
+    path = os.path.join(blueprints.BLUEPRINT_DIR, "Maintest.pdf")
+    assert server.registered_document("Maintest.pdf") == path
+    assert server.registered_document("maintest") == path
+    assert server.registered_document("sample1.pdf") is None
@@ -0,0 +1,98 @@
+import json
+import threading
+
+import server
+from bulk_grading import BulkRun, load_checkpoint, read_submissions
+
+
+def rows(count):
+    return [{"id": f"s{i}", "aim": f"aim {i}"} for i in range(count)]
+
+
+class Grader:
+    """grade() stand-in that records the ids it graded and fails the ids in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.graded = []
+        self._lock = threading.Lock()
+
+    def __call__(self, row):
+        with self._lock:
+            self.graded.append(row["id"])
+        if row["id"] in self.failing:
+            raise RuntimeError("upstream down")
+        return {"points": 10}
+
+
+def test_read_submissions_from_csv_and_jsonl():
+    csv_rows = read_submissions("student_id,aim\nana,To verify Ohm's law\n,To titrate\n", "csv")
+    assert [(row["id"], row["aim"]) for row in csv_rows] == [("ana", "To verify Ohm's law"), ("row-2", "To titrate")]
+
+    jsonl_rows = read_submissions('{"id": 7, "aim": "x"}\n\nnot json\n["list"]\n', "jsonl")
+    assert [row["id"] for row in jsonl_rows] == ["7", "line-3", "line-4"]
+    assert "error" in jsonl_rows[1] and "error" in jsonl_rows[2]
+
+
+def test_an_interrupted_run_resumes_with_the_rows_left(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    first = Grader()
+    run = iter(BulkRun(rows(10), output, first, concurrency=1))
+    seen = [next(run)["id"] for _ in range(3)]
+    run.close()  # the client went away
+    assert [result["id"] for result in load_checkpoint(output)] == seen
+
+    second = Grader()
+    job = BulkRun(rows(10), output, second, concurrency=2)
+    assert job.progress.skipped == 3
+    results = list(job)
+    assert not set(second.graded) & set(seen)
+    assert sorted(seen + [result["id"] for result in results]) == sorted(row["id"] for row in rows(10))
+    assert job.progress.snapshot()["graded"] == 7
+
+
+def test_failed_rows_are_graded_again_on_resume(tmp_path):
+    output = str(tmp_path / "results.jsonl")
+    list(BulkRun(rows(3), output, Grader(failing={"s1"})))
+    assert {r["id"]: "error" in r for r in load_checkpoint(output)} == {"s0": False, "s1": True, "s2": False}
+
+    retry = Grader()
+    list(BulkRun(rows(3), output, retry))
+    assert retry.graded == ["s1"]
+    assert len(BulkRun(rows(3), output, Grader()).todo) == 0
+
+
+def test_a_half_written_last_line_is_dropped(tmp_path):
+    output = tmp_path / "results.jsonl"
+    output.write_text('{"id": "s0", "points": 10}\n{"id": "s1", "poi')
+
+    assert load_checkpoint(str(output)) == [{"id": "s0", "points": 10}]
+    assert output.read_text() == '{"id": "s0", "points": 10}\n'
+    grader = Grader()
+    list(BulkRun(rows(2), str(output), grader))
+    assert grader.graded == ["s1"]
+
+
+def test_compare_bulk_replays_a_checkpointed_job(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(server, "BULK_DIR", str(tmp_path))
+    grader = Grader(failing={"s2"})
+    monkeypatch.setattr(server, "grade_submission", grader)
+    body = "\n".join(json.dumps(row) for row in rows(4))
+
+    def post():
+        response = client.post("/compare/bulk?job_id=Class 7B", data=body, content_type="application/x-ndjson")
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    lines = post()
+    assert lines[0] == {"job_id": "class-7b", "total": 4, "already_graded": 0}
+    assert lines[-1]["summary"]["failed"] == 1
+
+    grader.failing.clear()
+    lines = post()
+    assert lines[0]["already_graded"] == 3
+    assert sorted(line["id"] for line in lines[1:-1]) == ["s0", "s1", "s2", "s3"]
+    assert grader.graded.count("s2") == 2 and len(grader.graded) == 5
+
+
+def test_compare_bulk_rejects_an_empty_upload(client):
+    assert client.post("/compare/bulk", data="", content_type="application/x-ndjson").status_code == 400
@@ -0,0 +1,85 @@
+import pytest
+
+from chat_cache import SimilarityCache
+
+# Labelled pairs the threshold was tuned on: the first list must be answered from the cache,
+# the second must not, however much wording the two messages share
+PARAPHRASES = [
+    ("what is ohm's law", "whats ohms law?"),
+    ("What is Ohm's law?", "What's Ohm's law"),
+    ("How do I calculate the resistance of a resistor?", "how to calculate resistance of the resistor"),
+    ("Why is phenolphthalein used in titration?", "why is phenolphthalein used in the titration"),
+    ("What is the function of a rheostat?", "what's the function of the rheostat"),
+    ("Explain the procedure for the titration experiment", "explain the titration experiment procedure"),
+    ("Which indicator is used in the titration and why?", "which indicator is used in titration, and why"),
+    ("What is a voltmeter used for?", "what is the voltmeter used for"),
+    ("How is the ammeter connected in the circuit?", "how is an ammeter connected in a circuit"),
+    ("What are the precautions for the Ohm's law experiment?", "precautions for ohms law experiment?"),
+    ("Why doesn't the burette need rinsing with water only?", "why does not the burette need rinsing with water only"),
+    ("A 10 ohm resistor has 5 V across it. What is the current?", "a 10 ohm resistor has 5 V across it, what's the current?"),
+]
+DIFFERENT = [
+    ("What is a base?", "What is an acid?"),
+    ("What is a parallel circuit?", "What is a series circuit?"),
+    ("A 10 Ω resistor has 5 V across it. What is the current?", "A 20 Ω resistor has 5 V across it. What is the current?"),
+    ("If the current is 0.5 A, what is the voltage?", "If the current is 0.25 A, what is the voltage?"),
+    ("Is the ammeter connected in series?", "Is the ammeter not connected in series?"),
+    ("Is the voltmeter connected in parallel?", "Isn't the voltmeter connected in parallel?"),
+    ("What is the difference between voltage and current?", "What is voltage and current?"),
+    ("Why is phenolphthalein used in titration?", "Why is methyl orange used in titration?"),
+    ("How do I connect the voltmeter?", "How do I connect the ammeter?"),
+    ("What is Ohm's law?", "What are the limitations of Ohm's law?"),
+    ("What happens when resistance increases?", "What happens when resistance decreases?"),
+    ("What is the molarity of the acid?", "What is the molarity of the base?"),
+    ("How do you find the end point of a titration?", "How do you find the end point of a titration without an indicator?"),
+]
+
+
+@pytest.mark.parametrize("stored, asked", PARAPHRASES)
+def test_paraphrases_reuse_the_stored_answer(stored, asked):
+    cache = SimilarityCache()
+    cache.set(stored, "answer")
+
+    assert cache.get(asked) == "answer"
+    assert cache.stats()["near_duplicate_hits"] == 1
+
+
+@pytest.mark.parametrize("stored, asked", DIFFERENT)
+def test_different_questions_are_not_answered_from_the_cache(stored, asked):
+    cache = SimilarityCache()
+    cache.set(stored, "answer")
+
+    assert cache.get(asked) is None
+    assert cache.get(stored) == "answer"
+
+
+def test_the_closest_stored_question_wins():
+    cache = SimilarityCache()
+    cache.set("What is Ohm's law?", "law")
+    cache.set("What are the limitations of Ohm's law?", "limitations")
+
+    assert cache.get("whats the limitations of ohms law") == "limitations"
+    assert cache.get("what's ohm's law") == "law"
+
+
+def test_expired_answers_are_dropped(monkeypatch):
+    cache = SimilarityCache(ttl=60)
+    now = 1000.0
+    monkeypatch.setattr("chat_cache.time.time", lambda: now)
+    cache.set("What is Ohm's law?", "answer")
+
+    now += 61
+    assert cache.get("What is Ohm's law?") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_answers_are_evicted():
+    cache = SimilarityCache(max_entries=2)
+    cache.set("What is Ohm's law?", "law")
+    cache.set("What is a rheostat?", "rheostat")
+    cache.get("What is Ohm's law?")
+    cache.set("What is a voltmeter?", "voltmeter")
+
+    assert cache.get("What is a rheostat?") is None
+    assert cache.get("What is Ohm's law?") == "law"
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,36 @@
+import time
+
+from chat_memory import ChatMemory
+from session_store import MemorySessionStore
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_chat_memory_folds_old_turns_into_the_summary():
+    memory = ChatMemory(MemorySessionStore(), lambda summary, turns: f"{len(turns)} turns", token_budget=60)
+    for i in range(6):
+        memory.record("s", f"question {i} " + "word " * 20, f"answer {i}")
+    wait_for(lambda: memory.folds)
+
+    context = memory.context("s")
+    assert "turns" in context
+    assert "question 5" in context and "question 0" not in context
+
+
+def test_chat_memory_stays_in_budget_when_summaries_fail():
+    def summarize(summary, turns):
+        raise RuntimeError("upstream down")
+
+    memory = ChatMemory(MemorySessionStore(), summarize, token_budget=60, max_turns=4)
+    for i in range(12):
+        memory.record("s", f"question {i} " + "word " * 20, f"answer {i}")
+        wait_for(lambda: not memory._load("s")["folding"])
+
+    context = memory.context("s")
+    assert "question 11" in context and "question 10" not in context
+    assert memory.stats()["dropped_turns"] > 0
@@ -0,0 +1,70 @@
+import asyncio
+import json
+
+import fake_gemini
+import server
+from conftest import unique
+
+
+def parse_sse(body):
+    """[(event, data)] from a text/event-stream body."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+def test_chat_stream_sends_the_answer_as_events(client, session_id):
+    message = unique("What does the ammeter measure?")
+
+    response = client.post("/chat/stream", json={"message": message}, headers={"X-Session-Id": session_id})
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = parse_sse(response.get_data(as_text=True))
+    assert len(events) > 2
+    assert events[-1] == ("done", {})
+    assert "".join(data["text"] for event, data in events[:-1]) == fake_gemini.CANNED_TEXT
+    # The turn is remembered for the next message in this session
+    assert message in server.chat_memory.context(session_id)
+
+
+def test_chat_stream_replays_a_cached_answer(client):
+    message = unique("What does the ammeter measure?")
+    client.post("/chat/stream", json={"message": message}).get_data()
+    calls = fake_gemini.FakeGeminiHandler.calls
+
+    events = parse_sse(client.post("/chat/stream", json={"message": message}).get_data(as_text=True))
+    assert events == [("message", {"text": fake_gemini.CANNED_TEXT}), ("done", {})]
+    assert fake_gemini.FakeGeminiHandler.calls == calls
+
+
+def test_chat_stream_rejects_an_empty_message(client):
+    response = client.post("/chat/stream", json={"message": ""})
+    assert response.status_code == 400
+
+
+def test_chat_stream_reports_upstream_failure_before_streaming(client, failing_upstream, no_backoff):
+    failing_upstream(503)
+
+    response = client.post("/chat/stream", json={"message": unique("What does the ammeter measure?")})
+    assert response.status_code == 502
+    assert response.get_json()["error"].startswith("API Error")
+
+
+def test_async_chat_stream_matches_the_flask_route(session_id):
+    from aiohttp.test_utils import TestClient, TestServer
+
+    import async_server
+
+    async def run():
+        async with TestClient(TestServer(async_server.create_app())) as http:
+            response = await http.post("/chat/stream", json={"message": unique("What does the ammeter measure?")},
+                                       headers={"X-Session-Id": session_id})
+            return response.status, response.content_type, await response.text()
+
+    status, content_type, body = asyncio.run(run())
+    assert (status, content_type) == (200, "text/event-stream")
+    events = parse_sse(body)
+    assert events[-1] == ("done", {})
+    assert "".join(data["text"] for event, data in events[:-1]) == fake_gemini.CANNED_TEXT
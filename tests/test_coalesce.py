@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+import gemini_client
+import server
+from coalesce import SingleFlight
+
+
+def run_together(count, fn):
+    results, threads = [None] * count, []
+    for i in range(count):
+        threads.append(threading.Thread(target=lambda i=i: results.__setitem__(i, fn())))
+        threads[-1].start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_calls_share_one_result():
+    flight, calls = SingleFlight(), []
+
+    def call():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"text": "V = IR"}
+
+    results = run_together(4, lambda: flight.do("key", call))
+    assert calls == [1]
+    assert all(result is results[0] for result in results)
+    assert flight.stats()["collapsed"] == 3
+
+    # Nothing is kept once the call is done
+    flight.do("key", call)
+    assert len(calls) == 2
+
+
+def test_every_waiter_sees_the_leaders_error():
+    flight = SingleFlight()
+
+    def call():
+        time.sleep(0.1)
+        raise ValueError("upstream failed")
+
+    def caller():
+        try:
+            flight.do("key", call)
+        except ValueError as e:
+            return e
+
+    errors = run_together(3, caller)
+    assert all(isinstance(error, ValueError) for error in errors)
+
+
+def test_a_waiter_gives_up_after_max_wait():
+    flight, release = SingleFlight(max_wait=0.05, timeout_error=TimeoutError), threading.Event()
+    leader = threading.Thread(target=flight.do, args=("key", release.wait))
+    leader.start()
+    time.sleep(0.02)
+
+    with pytest.raises(TimeoutError):
+        flight.do("key", lambda: "never called")
+    release.set()
+    leader.join()
+    assert flight.stats()["wait_timeouts"] == 1
+
+
+def test_a_round_asks_for_each_question_separately(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def post(payload, **kwargs):
+        with lock:
+            calls.append(payload)
+            n = len(calls)
+        time.sleep(0.1)  # long enough for every question of the round to be in flight at once
+        text = (f"**Question:** A {n} ohm resistor carries 1 A. What is the voltage across it?\n"
+                f"A) {n} V\nB) {n + 1} V\nC) {n + 2} V\nD) {n + 3} V\n**Correct Answer:** A")
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    monkeypatch.setattr(gemini_client, "post", post)
+    questions = server.generate_questions(3, batch=False)
+
+    assert len(calls) == 3
+    assert len({q["question"] for q in questions}) == 3
@@ -0,0 +1,111 @@
+import io
+import json
+import os
+import threading
+import time
+
+import fitz
+import pytest
+
+import documents
+import server
+
+PAGES = [
+    "Aim: To verify Ohm's law using a resistor, an ammeter and a voltmeter.",
+    "",
+    "Procedure: Connect the resistor, ammeter and rheostat in series with the battery.",
+    "Observations: Record the voltmeter and ammeter readings for five rheostat settings.",
+]
+
+
+def pdf_bytes(pages=PAGES):
+    with fitz.open() as document:
+        for text in pages:
+            page = document.new_page()
+            if text:
+                page.insert_text((50, 72), text, fontsize=9)
+        return document.tobytes()
+
+
+@pytest.fixture
+def manual(tmp_path):
+    path = tmp_path / "manual.pdf"
+    path.write_bytes(pdf_bytes())
+    return str(path)
+
+
+def test_pages_come_back_in_order_while_later_ones_run_ahead(manual):
+    events, lock = [], threading.Lock()
+
+    def simplify(text):
+        section = text.split(":")[0]
+        with lock:
+            events.append(("start", section))
+        if section == "Aim":
+            time.sleep(0.3)  # the first page is the slowest upstream call
+        with lock:
+            events.append(("end", section))
+        if section == "Observations":
+            raise ValueError("upstream said no")
+        return text.upper()
+
+    results = list(documents.simplify_pages(manual, simplify))
+    assert [result["page"] for result in results] == [1, 2, 3, 4]
+    assert results[0]["simplified_text"].startswith("AIM:")
+    assert results[1] == {"page": 2, "skipped": "No text on this page."}
+    assert results[2]["simplified_text"].startswith("PROCEDURE:")
+    assert results[3] == {"page": 4, "error": "Simplification failed: upstream said no"}
+    # Page 3 went upstream while page 1 was still there
+    assert events.index(("start", "Procedure")) < events.index(("end", "Aim"))
+
+
+def test_document_run_counts_for_the_summary(manual):
+    run = documents.DocumentRun(manual, lambda text: "simple")
+    assert run.total == 4
+    list(run)
+    assert {key: run.summary()[key] for key in ("pages", "simplified", "skipped", "failed")} == \
+           {"pages": 4, "simplified": 3, "skipped": 1, "failed": 0}
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """Paths of the temporary files /simplify-document spools uploads to."""
+    paths, mkstemp = [], server.tempfile.mkstemp
+
+    def spy(**kwargs):
+        fd, path = mkstemp(**kwargs)
+        paths.append(path)
+        return fd, path
+
+    monkeypatch.setattr(server.tempfile, "mkstemp", spy)
+    monkeypatch.setattr(server, "simplify_page", lambda text: f"simple: {text[:10]}")
+    return paths
+
+
+def read_lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_simplify_document_streams_an_upload_and_removes_it(client, uploads):
+    response = client.post("/simplify-document", data={"file": (io.BytesIO(pdf_bytes()), "lab.pdf")})
+
+    lines = read_lines(response)
+    assert lines[0] == {"document": "lab.pdf", "pages": 4}
+    assert [line.get("page") for line in lines[1:-1]] == [1, 2, 3, 4]
+    assert lines[-1]["summary"]["simplified"] == 3
+    response.close()
+    assert uploads and not os.path.exists(uploads[0])
+
+
+def test_simplify_document_rejects_a_file_that_is_not_a_pdf(client, uploads):
+    response = client.post("/simplify-document", data={"file": (io.BytesIO(b"not a pdf"), "lab.pdf")})
+    assert response.status_code == 400
+    assert not os.path.exists(uploads[0])
+
+
+def test_simplify_document_reads_a_bundled_manual_by_name(client, uploads):
+    lines = read_lines(client.post("/simplify-document?document=Maintest.pdf"))
+    assert lines[0] == {"document": "Maintest.pdf", "pages": 2}
+    assert client.post("/simplify-document?document=sample1.pdf").status_code == 404
+    assert client.post("/simplify-document").status_code == 400
+    assert uploads == []
@@ -0,0 +1,144 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import fake_gemini
+import gemini_client
+from admission import admission
+from conftest import unique
+from metrics import UPSTREAM_TOKENS
+
+
+def recover_after_first_backoff(monkeypatch, httpd, taken):
+    """Backoff that lets `httpd` recover, as if the upstream came back while we waited."""
+
+    def backoff_delay(attempt, response=None):
+        taken.append(response.status_code if response is not None else None)
+        httpd.RequestHandlerClass.error_rate = 0.0
+        return 0.25
+
+    monkeypatch.setattr(gemini_client, "backoff_delay", backoff_delay)
+
+
+def record_sleeps(monkeypatch):
+    """Sleeps taken by the calling thread; the stand-in's own threads still really sleep."""
+    sleeps, sleep, caller = [], time.sleep, threading.current_thread()
+    monkeypatch.setattr(time, "sleep", lambda seconds: (
+        sleeps.append(seconds) if threading.current_thread() is caller else sleep(seconds)))
+    return sleeps
+
+
+def test_generate_text_answers_from_the_stand_in():
+    assert gemini_client.generate_text(unique("Explain Ohm's law")) == fake_gemini.CANNED_TEXT
+
+
+def test_retries_a_server_error_until_the_upstream_recovers(monkeypatch, failing_upstream):
+    httpd = failing_upstream(503)
+    taken = []
+    recover_after_first_backoff(monkeypatch, httpd, taken)
+    sleeps = record_sleeps(monkeypatch)
+    calls = fake_gemini.FakeGeminiHandler.calls
+
+    assert gemini_client.generate_text(unique("Explain Ohm's law")) == fake_gemini.CANNED_TEXT
+    assert taken == [503]
+    assert sleeps == [0.25]  # a 5xx only holds back this caller
+    assert fake_gemini.FakeGeminiHandler.calls - calls == 2
+
+
+def test_gives_up_after_the_retry_budget(failing_upstream, no_backoff):
+    failing_upstream(503)
+    calls = fake_gemini.FakeGeminiHandler.calls
+
+    with pytest.raises(requests.exceptions.HTTPError) as raised:
+        gemini_client.generate_content(unique("Explain Ohm's law"), retries=2)
+    assert raised.value.response.status_code == 503
+    assert fake_gemini.FakeGeminiHandler.calls - calls == 3
+    assert [attempt for attempt, _ in no_backoff] == [0, 1]
+
+
+def test_does_not_retry_a_client_error(failing_upstream, no_backoff):
+    failing_upstream(400)
+    calls = fake_gemini.FakeGeminiHandler.calls
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        gemini_client.generate_content(unique("Explain Ohm's law"))
+    assert fake_gemini.FakeGeminiHandler.calls - calls == 1
+    assert no_backoff == []
+
+
+def test_rate_limit_pauses_admission_for_every_caller(monkeypatch, failing_upstream):
+    httpd = failing_upstream(429)
+    taken = []
+    recover_after_first_backoff(monkeypatch, httpd, taken)
+    pauses = []
+    monkeypatch.setattr(admission, "pause", pauses.append)
+    sleeps = record_sleeps(monkeypatch)
+
+    assert gemini_client.generate_text(unique("Explain Ohm's law")) == fake_gemini.CANNED_TEXT
+    assert taken == [429]
+    assert pauses == [0.25]
+    assert sleeps == []
+
+
+def test_stream_text_yields_the_answer_in_chunks():
+    tokens = UPSTREAM_TOKENS.collect().get(("stream-test", "candidates"), 0)
+
+    chunks = list(gemini_client.stream_text(unique("Explain Ohm's law"), call_site="stream-test"))
+    assert len(chunks) > 1
+    assert "".join(chunks) == fake_gemini.CANNED_TEXT
+    # Only the last chunk's running total is counted
+    assert UPSTREAM_TOKENS.collect()[("stream-test", "candidates")] - tokens == len(fake_gemini.CANNED_TEXT) // 4
+
+
+def test_stream_text_closes_the_upstream_response_when_closed_early(monkeypatch):
+    opened = []
+    post = gemini_client.post
+
+    def spy(*args, **kwargs):
+        opened.append(post(*args, **kwargs))
+        return opened[-1]
+
+    monkeypatch.setattr(gemini_client, "post", spy)
+    chunks = gemini_client.stream_text(unique("Explain Ohm's law"))
+    assert opened == []  # nothing is sent until the first chunk is asked for
+
+    next(chunks)
+    assert not opened[0].raw.closed
+    chunks.close()
+    assert opened[0].raw.closed
+
+
+class FakeStreamResponse:
+    def __init__(self, lines):
+        self.lines = lines
+        self.closed = False
+
+    def iter_lines(self, chunk_size=None, decode_unicode=False):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+
+def test_sse_parsing_skips_blank_comment_and_malformed_lines():
+    response = FakeStreamResponse([
+        "",
+        ": keep-alive",
+        'data: {"candidates": [{"content": {"parts": [{"text": "Current "}]}}]}',
+        "data: {not json",
+        'event: message',
+        'data: {"candidates": [{"content": {"parts": [{"text": "flows."}]}}]}',
+        'data: {"candidates": []}',
+    ])
+
+    assert list(gemini_client._iter_stream_text(response, "stream-test")) == ["Current ", "flows."]
+    assert response.closed
+
+
+def test_extract_text_joins_parts_and_tolerates_odd_bodies():
+    body = {"candidates": [{"content": {"parts": [{"text": "V = "}, {"text": "IR"}]}}]}
+    assert gemini_client.extract_text(body) == "V = IR"
+    assert gemini_client.extract_text({"candidates": []}, default="none") == "none"
+    assert gemini_client.extract_text(None) == ""
@@ -0,0 +1,95 @@
+import pytest
+
+import grading
+
+BLUEPRINT = """Aim: To determine the strength of hydrochloric acid by titrating it against sodium carbonate.
+Apparatus:
+- Burette
+- Pipette (10 mL)
+- Conical flask
+- White tile (optional)
+Procedure:
+1. Rinse and fill the burette with hydrochloric acid.
+2. Pipette 10 mL of sodium carbonate solution into the conical flask.
+3. Add two drops of methyl orange indicator.
+4. Titrate until the colour changes from yellow to orange
+   and note the burette reading.
+Balanced chemical equation: Na₂CO₃ + 2HCl → 2NaCl + H₂O + CO₂
+"""
+
+
+@pytest.fixture
+def blueprint():
+    return grading.parse_blueprint(BLUEPRINT)
+
+
+def test_parse_blueprint_splits_the_sections(blueprint):
+    assert blueprint["aim"].startswith("To determine the strength")
+    assert blueprint["apparatus"] == ["Burette", "Pipette (10 mL)", "Conical flask"]
+    assert blueprint["optional_apparatus"] == ["White tile (optional)"]
+    assert len(blueprint["procedure"]) == 4
+    assert blueprint["procedure"][-1].endswith("note the burette reading.")
+
+
+@pytest.mark.parametrize("written", [
+    "Na2CO3 + 2HCl → 2NaCl + H2O + CO2",
+    "2HCl + Na₂CO₃ -> CO₂ + H₂O + 2NaCl",
+    "Na2CO3 + 2 HCl = 2 NaCl + H2O + CO2",
+    "na2co3 + 2hcl → 2nacl + h2o. + co2.",
+    "The equation is Na2CO3 + 2HCl → 2NaCl + H2O + CO2.",
+    "Equation: Na2CO3(aq) + 2HCl(aq) → 2NaCl(aq) + H2O(l) + CO2(g) is the reaction taking place.",
+])
+def test_equations_match_whatever_the_spacing_order_punctuation_and_prose(blueprint, written):
+    assert grading.find_equations(written) == [grading.normalize_equation(blueprint["equation"])]
+
+
+@pytest.mark.parametrize("written", [
+    "Na2CO3 + HCl → NaCl + H2O + CO2",
+    "Na2CO3 + 2HCl → 2NaCl + H2O",
+    "The acid reacts with the carbonate.",
+])
+def test_wrong_or_missing_equations_do_not_match(blueprint, written):
+    assert grading.normalize_equation(blueprint["equation"]) not in grading.find_equations(written)
+
+
+def test_a_complete_submission_loses_nothing(blueprint):
+    form = {
+        "aim": "To determine the strength of hydrochloric acid by titrating against sodium carbonate",
+        "apparatus": "burette, pipette, conical flask",
+        "procedure": "Rinse and fill the burette with hydrochloric acid. Pipette 10 mL sodium carbonate solution "
+                     "into a conical flask. Add 2 drops of methyl orange indicator. Titrate until the colour "
+                     "changes from yellow to orange and note the burette reading.",
+        "conclusion": "Na2CO3 + 2HCl → 2NaCl + H2O + CO2.",
+    }
+
+    result = grading.finish_score(grading.score_locally(form, blueprint))
+    assert result["points"] == grading.MAX_SCORE
+    assert result["breakdown"]["procedure"]["judged_by"] == "local"
+
+
+def test_each_missing_part_costs_its_deduction(blueprint):
+    form = {"aim": "To study chemical reactions", "apparatus": "burette", "procedure": "Mix the solutions."}
+
+    local = grading.score_locally(form, blueprint)
+    assert local["apparatus"]["missing"] == ["Pipette (10 mL)", "Conical flask"]
+    assert not local["equation"]["found"]
+    assert not grading.needs_procedure_judgement(local)
+    result = grading.finish_score(local)
+    assert result["points"] == grading.MAX_SCORE - (grading.AIM_DEDUCTION + grading.APPARATUS_DEDUCTION
+                                                    + grading.EQUATION_DEDUCTION + grading.PROCEDURE_DEDUCTION)
+
+
+def test_a_borderline_procedure_takes_the_llm_verdict(blueprint):
+    local = grading.score_locally({"procedure": "Fill the burette with acid and add methyl orange."}, blueprint)
+    assert grading.needs_procedure_judgement(local)
+
+    verdict = grading.parse_procedure_verdict('```json\n{"mostly_correct": false, "comment": "Steps missing."}\n```')
+    assert verdict == (False, "Steps missing.")
+    procedure = grading.finish_score(local, verdict)["breakdown"]["procedure"]
+    assert procedure["judged_by"] == "llm"
+    assert procedure["deduction"] == grading.PROCEDURE_DEDUCTION
+
+
+@pytest.mark.parametrize("answer", ["", "yes", '{"mostly_correct": "yes"}', "[true]"])
+def test_an_unreadable_verdict_is_none(answer):
+    assert grading.parse_procedure_verdict(answer) is None
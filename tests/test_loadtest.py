@@ -0,0 +1,28 @@
+import asyncio
+
+import loadtest
+import server
+from bench_serving import start_threaded_server
+from chat_cache import SimilarityCache
+
+
+def test_unique_messages_never_hit_the_chat_cache():
+    cache = SimilarityCache()
+    for _ in range(500):
+        message = loadtest.unique_message()
+        assert cache.get(message) is None
+        cache.set(message, "answer")
+
+
+def test_the_unique_chat_mix_reports_no_cache_hits():
+    httpd = start_threaded_server(server.create_app(), 0, 4)
+    try:
+        report = asyncio.run(loadtest.run_load(f"http://127.0.0.1:{httpd.server_port}",
+                                               {"chat": 1, "chat_stream": 1}, concurrency=4, duration=1))
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    assert report["routes"]["/chat"]["requests"] > 0
+    assert report["routes"]["/chat"]["errors"] == 0
+    assert report["chat_cache_hits"] == 0
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import gemini_client
+import mcq
+from mcq import Question, parse_questions
+
+
+def mcq_dict(n, answer="B"):
+    return {"question": f"A {n} ohm resistor carries 1 A. What is the voltage?", "A": f"{n - 1} V", "B": f"{n} V",
+            "C": f"{n + 1} V", "D": f"{n + 2} V", "answer": answer}
+
+
+@pytest.mark.parametrize("text", [
+    "**Question:** What does an ammeter measure?\n- A) Current\n- B) Voltage\n- C) Resistance\n- D) Power\n"
+    "- **Correct Answer:** A",
+    "Q1. What does an ammeter measure?\n(A) Current\n(B) Voltage\n(C) Resistance\n(D) Power\nAnswer: (a)",
+    "1. What does an ammeter\nmeasure?\n**A.** Current\n**B.** Voltage\n**C.** Resistance\n**D.** Power\n"
+    "Correct answer is A",
+    "**Question 1:**\nWhat does an ammeter measure?\n[A] Current\n[B] Voltage\n[C] Resistance\n[D] Power\n"
+    "Answer key: A\nA) Current is what an ammeter measures.",
+])
+def test_markdown_shapes_parse_to_the_same_question(text):
+    questions, failed = parse_questions(text)
+    assert questions == [Question("What does an ammeter measure?", ("Current", "Voltage", "Resistance", "Power"), "A")]
+    assert failed == 0
+
+
+def test_json_answers_with_or_without_a_code_fence():
+    items = [mcq_dict(5), mcq_dict(10, "C")]
+    assert [q.as_dict() for q in parse_questions(json.dumps(items))[0]] == items
+    assert [q.as_dict() for q in parse_questions(f"```json\n{json.dumps({'questions': items})}\n```")[0]] == items
+
+
+@pytest.mark.parametrize("item", [
+    dict(mcq_dict(5), answer="E"),
+    dict(mcq_dict(5), D=""),
+    dict(mcq_dict(5), D="4 V", C="4 V"),
+    dict(mcq_dict(5), question=" "),
+])
+def test_unusable_items_are_counted_as_failures(item):
+    assert parse_questions(json.dumps([mcq_dict(10), item])) == ([Question.from_dict(mcq_dict(10))], 1)
+
+
+def test_text_that_is_not_a_question_fails():
+    assert parse_questions("") == ([], 1)
+    assert parse_questions("I can't help with that.") == ([], 1)
+
+
+def answers(monkeypatch, *texts):
+    """Make each generate_text call return the next text; returns the prompts sent."""
+    prompts, texts = [], list(texts)
+    monkeypatch.setattr(gemini_client, "generate_text", lambda prompt, **kwargs: prompts.append(prompt) or texts.pop(0))
+    return prompts
+
+
+def test_a_batch_only_re_requests_the_questions_that_failed(monkeypatch):
+    prompts = answers(monkeypatch, json.dumps([mcq_dict(5), dict(mcq_dict(6), answer="?"), mcq_dict(7)]),
+                      json.dumps([mcq_dict(8)]))
+
+    questions = mcq.generate_questions_batch(3)
+    assert questions == [mcq_dict(5), mcq_dict(7), mcq_dict(8)]
+    assert "exactly 3 objects" in prompts[0] and "exactly 1 objects" in prompts[1]
+
+
+def test_a_batch_fails_once_the_retry_budget_is_spent(monkeypatch):
+    prompts = answers(monkeypatch, *["not json"] * (1 + mcq.ROUND_RETRY_BUDGET))
+
+    assert mcq.generate_questions_batch(2) == {"error": "Invalid AI response format."}
+    assert len(prompts) == 1 + mcq.ROUND_RETRY_BUDGET
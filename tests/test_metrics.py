@@ -0,0 +1,38 @@
+import json
+import os
+
+import metrics
+
+DEAD_PID = 2 ** 22 + 12345  # above Linux's pid_max, so never a live process
+
+
+def write(directory, filename, snapshot):
+    with open(os.path.join(directory, filename), "w") as f:
+        json.dump(snapshot, f)
+
+
+def test_collect_directory_sums_every_process_and_skips_other_files(tmp_path):
+    directory = str(tmp_path)
+    metrics.PARSE_FAILURES.inc("metrics-test")
+    mine = metrics.PARSE_FAILURES.collect()[("metrics-test",)]
+    write(directory, f"{DEAD_PID}.json", {
+        "olabs_parse_failures_total": [[["metrics-test"], 2]],
+        "olabs_http_requests_in_flight": [[["/metrics-test"], 5]],
+    })
+    write(directory, "config.json", {"olabs_parse_failures_total": [[["metrics-test"], 100]]})
+    write(directory, "worker-1.json", {})
+    (tmp_path / "notes.txt").write_text("not metrics")
+
+    totals = metrics.collect_directory(directory)
+    assert totals["olabs_parse_failures_total"][("metrics-test",)] == mine + 2
+    # An exited worker's counters still count, its gauges don't
+    assert ("/metrics-test",) not in totals["olabs_http_requests_in_flight"]
+
+
+def test_clear_directory_only_removes_process_files(tmp_path):
+    directory = str(tmp_path)
+    for filename in (f"{DEAD_PID}.json", f"{DEAD_PID}.json.tmp", "config.json", "notes.txt"):
+        (tmp_path / filename).write_text("{}")
+
+    metrics.clear_directory(directory)
+    assert sorted(os.listdir(directory)) == ["config.json", "notes.txt"]
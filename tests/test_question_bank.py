@@ -0,0 +1,64 @@
+import pytest
+
+from question_bank import QuestionBank
+
+
+def mcq(question, options=("5 V", "10 V", "15 V", "20 V"), answer="B"):
+    return dict(zip("ABCD", options), question=question, answer=answer)
+
+
+@pytest.fixture
+def bank(tmp_path):
+    bank = QuestionBank(str(tmp_path / "questions.sqlite3"))
+    yield bank
+    bank.close()
+
+
+def test_exact_and_reworded_repeats_are_rejected(bank):
+    item_id, added = bank.add(mcq("A 5 ohm resistor carries 2 A. What is the voltage across it?"), "Ohm's Law",
+                              "Basic")
+    assert added
+
+    assert bank.add(mcq("A 5 ohm resistor carries 2 A. What is the voltage across it?"), "Ohm's Law",
+                    "Basic") == (item_id, False)
+    assert bank.add(mcq("A 5 ohm resistor carries a current of 2 A. What is the voltage across it?"), "Ohm's Law",
+                    "Basic") == (item_id, False)
+    assert bank.stats()["duplicates_rejected"] == 2
+
+
+def test_different_questions_and_topics_are_kept(bank):
+    first, _ = bank.add(mcq("A 5 ohm resistor carries 2 A. What is the voltage across it?"), "Ohm's Law", "Basic")
+    second, added = bank.add(mcq("Which instrument is connected in parallel to measure potential difference?",
+                                 ("Ammeter", "Voltmeter", "Rheostat", "Galvanometer")), "Ohm's Law", "Basic")
+    assert added and second != first
+
+    # Rewordings are only looked for within the same topic; an exact copy is caught anywhere
+    _, added = bank.add(mcq("A 5 ohm resistor carries a current of 2 A. What is the voltage across it?"), "Circuits", "Basic")
+    assert added
+    assert bank.add(mcq("A 5 ohm resistor carries 2 A. What is the voltage across it?"), "Circuits",
+                    "Basic") == (first, False)
+    assert bank.stats()["inserted"] == 3
+
+
+def test_unseen_skips_questions_already_served(bank):
+    first, _ = bank.add(mcq("A 5 ohm resistor carries 2 A. What is the voltage across it?"), "Ohm's Law", "Basic")
+    second, _ = bank.add(mcq("Which instrument is connected in parallel to measure potential difference?",
+                             ("Ammeter", "Voltmeter", "Rheostat", "Galvanometer")), "Ohm's Law", "Basic")
+
+    bank.mark_served("student", [first])
+    assert [item["item_id"] for item in bank.unseen("student", "Ohm's Law", -5, 5, 10)] == [second]
+    assert {item["item_id"] for item in bank.unseen("someone else", "Ohm's Law", -5, 5, 10)} == {first, second}
+
+
+def test_calibration_from_two_workers_adds_up(bank):
+    item_id, _ = bank.add(mcq("A 5 ohm resistor carries 2 A. What is the voltage across it?"), "Ohm's Law",
+                          "Basic", difficulty=0.5)
+    other_worker = QuestionBank(bank.path)
+
+    bank.record_answers([item_id], [True], {item_id: -0.1})
+    other_worker.record_answers([item_id, item_id], [False, True], {item_id: 0.3})
+    other_worker.close()
+
+    item = bank.get(item_id)
+    assert item["difficulty"] == pytest.approx(0.7)
+    assert item["answered"] == 3
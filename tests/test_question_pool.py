@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+import question_pool
+from admission import Overloaded
+from question_pool import QuestionPool
+
+
+def wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class Generator:
+    """generate_questions_batch stand-in numbering its questions; `fail` makes the next calls error out."""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = None
+        self.made = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, count, level, topic):
+        with self.lock:
+            self.calls.append((count, level, topic))
+            if self.fail is not None:
+                if isinstance(self.fail, Exception):
+                    raise self.fail
+                return self.fail
+            start, self.made = self.made, self.made + count
+        return [{"question": f"{topic} {level} {n}"} for n in range(start, start + count)]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(question_pool, "FAILURE_BACKOFF", 0)
+
+
+def test_a_short_bucket_misses_and_is_refilled_in_the_background():
+    generate = Generator()
+    pool = QuestionPool(generate, low=2, high=8, workers=1)
+
+    assert pool.take("Ohm's Law", "Basic", 2) is None
+    assert wait_for(lambda: pool.stats()["fill"] == {"Ohm's Law|Basic": 8})
+    # Refills are asked for in batches of at most REFILL_BATCH
+    assert [count for count, _, _ in generate.calls] == [question_pool.REFILL_BATCH, 8 - question_pool.REFILL_BATCH]
+
+    questions = pool.take("Ohm's Law", "Basic", 2)
+    assert [q["question"] for q in questions] == ["Ohm's Law Basic 0", "Ohm's Law Basic 1"]
+    assert pool.stats()["hits"] == pool.stats()["misses"] == 1
+
+
+def test_taking_below_the_low_watermark_tops_the_bucket_up():
+    generate = Generator()
+    pool = QuestionPool(generate, low=4, high=6, workers=1)
+    pool.warm(["Ohm's Law"], ["Basic", "Advanced"])
+    assert wait_for(lambda: pool.stats()["fill"] == {"Ohm's Law|Basic": 6, "Ohm's Law|Advanced": 6})
+
+    pool.take("Ohm's Law", "Basic", 2)  # 4 left: not below the watermark
+    time.sleep(0.05)
+    assert pool.stats()["fill"]["Ohm's Law|Basic"] == 4
+    pool.take("Ohm's Law", "Basic", 1)
+    assert wait_for(lambda: pool.stats()["fill"]["Ohm's Law|Basic"] == 6)
+    assert generate.calls[-1] == (3, "Basic", "Ohm's Law")
+
+
+@pytest.mark.parametrize("failure", [{"error": "API Error: 503"}, Overloaded("Upstream quota exhausted")])
+def test_a_failed_refill_is_counted_and_retried_on_the_next_miss(failure):
+    generate = Generator()
+    generate.fail = failure
+    pool = QuestionPool(generate, low=2, high=4, workers=1)
+
+    assert pool.take("Ohm's Law", "Basic", 2) is None
+    assert wait_for(lambda: pool.stats()["refill_failures"] == 1 and not pool.stats()["refills_pending"])
+    assert pool.stats()["fill"]["Ohm's Law|Basic"] == 0
+
+    generate.fail = None
+    pool.take("Ohm's Law", "Basic", 2)
+    assert wait_for(lambda: pool.stats()["fill"]["Ohm's Law|Basic"] == 4)
@@ -0,0 +1,150 @@
+import pytest
+
+import server
+from ability import AbilityModel
+
+
+def play_round(client, session_id, right=True):
+    headers = {"X-Session-Id": session_id}
+    questions = client.get("/generate-question", headers=headers).get_json()
+    answers = [q["answer"] if right else next(o for o in "ABCD" if o != q["answer"]) for q in questions]
+    return questions, client.post("/check-answer", json={"selected_answers": answers}, headers=headers)
+
+
+def test_generate_question_returns_a_banked_round(client, session_id):
+    response = client.get("/generate-question", headers={"X-Session-Id": session_id})
+
+    assert response.status_code == 200
+    questions = response.get_json()
+    assert len(questions) == server.QUESTIONS_PER_ROUND
+    for question in questions:
+        assert {"question", "A", "B", "C", "D", "answer", "item_id"} <= question.keys()
+        assert question["answer"] in "ABCD"
+        assert server.question_bank.get(question["item_id"])["question"]["question"] == question["question"]
+
+
+def test_check_answer_grades_the_round_and_explains_it(client, session_id):
+    questions, response = play_round(client, session_id)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [r["is_correct"] for r in body["results"]] == [True] * len(questions)
+    assert [r["correct_answer"] for r in body["results"]] == [q["answer"] for q in questions]
+    assert all(r["explanation"] for r in body["results"])
+    assert body["new_level"] in server.difficulty_levels
+    # Explanations are stored with the question, so the next student gets them without a call
+    assert all(server.question_bank.explanation(q["item_id"]) for q in questions)
+
+
+def test_a_graded_round_cannot_be_submitted_again(client, session_id):
+    questions, _ = play_round(client, session_id)
+
+    response = client.post("/check-answer", json={"selected_answers": [q["answer"] for q in questions]},
+                           headers={"X-Session-Id": session_id})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "No questions generated yet!"}
+
+
+def test_check_answer_rejects_the_wrong_number_of_answers(client, session_id):
+    client.get("/generate-question", headers={"X-Session-Id": session_id})
+
+    response = client.post("/check-answer", json={"selected_answers": ["A"]}, headers={"X-Session-Id": session_id})
+    assert response.status_code == 400
+
+
+def test_another_worker_restores_the_ability_from_the_session(client, session_id, monkeypatch):
+    play_round(client, session_id)
+    before = client.get("/ability", headers={"X-Session-Id": session_id}).get_json()
+
+    # A worker that has never seen this student starts with an empty model
+    monkeypatch.setattr(server, "ability_model", AbilityModel(server.item_bank))
+    assert server.ability_model.ability(session_id, server.DEFAULT_TOPIC) == (0.0, 0)
+    after = client.get("/ability", headers={"X-Session-Id": session_id}).get_json()
+    assert after == before
+
+
+def test_evicted_students_are_restored_from_their_session(client, session_id, monkeypatch):
+    play_round(client, session_id)
+    before = client.get("/ability", headers={"X-Session-Id": session_id}).get_json()
+
+    monkeypatch.setattr(server, "ability_model", AbilityModel(server.item_bank, max_students=1))
+    client.get("/ability", headers={"X-Session-Id": session_id})
+    play_round(client, session_id + "-other")
+    assert list(server.ability_model.students) == [session_id + "-other"]
+    assert client.get("/ability", headers={"X-Session-Id": session_id}).get_json() == before
+
+
+def test_ability_moves_with_the_answers(client, session_id):
+    play_round(client, session_id, right=True)
+    up = client.get("/ability", headers={"X-Session-Id": session_id}).get_json()[server.DEFAULT_TOPIC]
+    other = session_id + "-other"
+    play_round(client, other, right=False)
+    down = client.get("/ability", headers={"X-Session-Id": other}).get_json()[server.DEFAULT_TOPIC]
+
+    assert up["answered"] == down["answered"] == server.QUESTIONS_PER_ROUND
+    assert up["theta"] > 0 > down["theta"]
+
+
+def test_restore_replaces_what_this_worker_remembers():
+    model = AbilityModel()
+    model.restore("student", {"Ohm's Law": [0.2, 3]})
+    model.restore("student", {"Ohm's Law": [0.9, 6], "Titration": [-0.4, 2]})
+    assert model.ability("student", "Ohm's Law") == (0.9, 6)
+
+    model.restore("student", {"Titration": [-0.1, 3]})
+    assert model.ability("student", "Ohm's Law") == (0.0, 0)
+    assert model.ability("student", "Titration") == (-0.1, 3)
+
+
+@pytest.mark.parametrize("authorization", [None, "Bearer wrong"])
+def test_batch_responses_need_the_admin_token(client, monkeypatch, authorization):
+    monkeypatch.setattr(server, "ABILITY_ADMIN_TOKEN", "admin-secret")
+    headers = {"Authorization": authorization} if authorization else {}
+
+    response = client.post("/ability/responses", json={"responses": []}, headers=headers)
+    assert response.status_code == 403
+
+
+def test_batch_responses_are_saved_to_the_students_sessions(client, session_id, monkeypatch):
+    monkeypatch.setattr(server, "ABILITY_ADMIN_TOKEN", "admin-secret")
+    questions, _ = play_round(client, session_id)
+    responses = [{"student_id": session_id, "item_id": q["item_id"], "correct": True} for q in questions]
+
+    response = client.post("/ability/responses", json={"responses": responses},
+                           headers={"Authorization": "Bearer admin-secret"})
+    assert response.status_code == 200
+    stored = server.session_store.get(session_id)["ability"][server.DEFAULT_TOPIC]
+    assert stored[1] == 2 * server.QUESTIONS_PER_ROUND
+
+
+def test_async_round_generates_on_the_event_loop(session_id, monkeypatch):
+    import asyncio
+    import threading
+
+    from aiohttp.test_utils import TestClient, TestServer
+
+    import async_server
+
+    generated_on = []
+
+    async def generate_questions(count, level, topic):
+        generated_on.append(threading.current_thread())
+        return [dict(zip("ABCD", ("1 V", "2 V", "3 V", "4 V")), answer="A",
+                     question=f"A {n} ohm resistor carries {session_id} A. What is the voltage?")
+                for n in range(count)]
+
+    monkeypatch.setattr(async_server, "generate_questions", generate_questions)
+    monkeypatch.setattr(server, "select_questions", lambda session_id: None)
+    monkeypatch.setattr(server.question_pool, "take", lambda topic, level, count: None)
+
+    async def run():
+        async with TestClient(TestServer(async_server.create_app())) as http:
+            response = await http.get("/generate-question", headers={"X-Session-Id": session_id})
+            return await response.json(), threading.current_thread()
+
+    questions, loop_thread = asyncio.run(run())
+    assert generated_on == [loop_thread]
+    assert len(questions) == server.QUESTIONS_PER_ROUND
+    assert all(server.question_bank.get(q["item_id"])["question"]["question"] == q["question"] for q in questions)
+    unseen = {item["item_id"] for item in server.question_bank.unseen(session_id, server.DEFAULT_TOPIC, -5, 5, 1000)}
+    assert not unseen & {q["item_id"] for q in questions}
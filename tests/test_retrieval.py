@@ -0,0 +1,99 @@
+import os
+
+import fitz
+import pytest
+
+import retrieval
+from retrieval import BM25Index
+
+OHMS_LAW = """Aim:
+To verify Ohm's law using a resistor, an ammeter and a voltmeter.
+Procedure:
+Connect the resistor, ammeter and rheostat in series with the battery.
+Connect the voltmeter in parallel across the resistor and record the readings.
+"""
+TITRATION = """Aim:
+To find the strength of hydrochloric acid by titration with sodium carbonate.
+Procedure:
+Fill the burette with the acid and add methyl orange indicator to the flask.
+"""
+
+
+def write_pdf(path, *pages):
+    with fitz.open() as document:
+        for text in pages:
+            document.new_page().insert_text((50, 72), text, fontsize=10)
+        document.save(str(path))
+    return str(path)
+
+
+@pytest.fixture
+def manuals(tmp_path):
+    directory = tmp_path / "manuals"
+    directory.mkdir()
+    write_pdf(directory / "ohms_law.pdf", OHMS_LAW)
+    write_pdf(directory / "titration.pdf", TITRATION, "Result:\nThe acid is 0.1 M.")
+    return directory
+
+
+def test_chunks_break_at_section_headers_and_keep_their_page(manuals):
+    chunks = retrieval.chunk_pdf(str(manuals / "titration.pdf"))
+
+    assert [chunk["text"].split(":")[0] for chunk in chunks] == ["Aim", "Procedure", "Result"]
+    assert [chunk["page"] for chunk in chunks] == [1, 1, 2]
+    assert {chunk["source"] for chunk in chunks} == {"titration.pdf"}
+
+
+def test_search_ranks_the_matching_manual_first(manuals, tmp_path):
+    index = BM25Index(str(tmp_path / "index")).build(retrieval.manual_paths(str(manuals)))
+
+    score, chunk = index.search("is the voltmeter connected in parallel?")[0]
+    assert chunk["source"] == "ohms_law.pdf" and "voltmeter in parallel" in chunk["text"]
+    assert index.search("photosynthesis") == []
+
+    context = index.context("which indicator is used in the titration")
+    assert context.startswith("[titration.pdf, page 1]")
+    assert "ohms_law.pdf" not in context
+    assert index.context("which indicator is used in the titration", budget=5) == ""
+
+
+def test_an_unchanged_manual_is_not_read_again(manuals, tmp_path, monkeypatch):
+    index_dir = str(tmp_path / "index")
+    BM25Index(index_dir).build(retrieval.manual_paths(str(manuals)))
+    read = []
+    chunk_pdf = retrieval.chunk_pdf
+    monkeypatch.setattr(retrieval, "chunk_pdf", lambda path: read.append(os.path.basename(path)) or chunk_pdf(path))
+
+    write_pdf(manuals / "ohms_law.pdf", OHMS_LAW + "Plot a graph of voltage against current.\n")
+    index = BM25Index(index_dir).build(retrieval.manual_paths(str(manuals)))
+    assert read == ["ohms_law.pdf"]
+    assert index.search("graph")[0][1]["source"] == "ohms_law.pdf"
+
+
+def test_a_rebuild_is_swapped_in_whole(manuals, tmp_path):
+    index_dir = str(tmp_path / "index")
+    old = BM25Index(index_dir).build(retrieval.manual_paths(str(manuals)))
+    first = retrieval._read_json(old.manifest_path)["current"]
+
+    write_pdf(manuals / "ohms_law.pdf", OHMS_LAW + "Plot a graph of voltage against current.\n")
+    new = BM25Index(index_dir).build(retrieval.manual_paths(str(manuals)))
+    second = retrieval._read_json(new.manifest_path)["current"]
+    assert second != first
+    # The previous build stays for readers that read the old manifest, and still answers from its own arrays
+    assert {first, second} <= set(os.listdir(index_dir))
+    assert old.search("graph") == []
+    assert new.search("graph")
+
+    (manuals / "titration.pdf").unlink()
+    BM25Index(index_dir).build(retrieval.manual_paths(str(manuals)))
+    builds = [name for name in os.listdir(index_dir) if name.startswith("build-")]
+    assert first not in builds and len(builds) == 2
+    assert not [name for name in os.listdir(index_dir) if name.endswith(".tmp")]
+
+
+def test_a_new_index_loads_the_current_build(manuals, tmp_path):
+    index_dir = str(tmp_path / "index")
+    assert BM25Index(index_dir).load().search("voltmeter") == []
+
+    BM25Index(index_dir).build(retrieval.manual_paths(str(manuals)))
+    assert BM25Index(index_dir).load().search("voltmeter")
@@ -0,0 +1,46 @@
+import pytest
+
+from session_store import MemorySessionStore, SQLiteSessionStore, create_session_store
+
+
+def test_sqlite_sessions_are_shared_between_workers(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    worker, other_worker = SQLiteSessionStore(path), SQLiteSessionStore(path)
+
+    worker.set("student", {"ability": {"Ohm's Law": [0.4, 2]}, "question_data": []})
+    assert other_worker.get("student") == {"ability": {"Ohm's Law": [0.4, 2]}, "question_data": []}
+
+    other_worker.delete("student")
+    assert worker.get("student") is None
+
+
+@pytest.mark.parametrize("make_store", [
+    MemorySessionStore,
+    lambda **kwargs: SQLiteSessionStore(kwargs.pop("path"), **kwargs),
+], ids=["memory", "sqlite"])
+def test_expired_sessions_are_purged_on_write(tmp_path, make_store):
+    kwargs = {"purge_interval": 0}
+    if make_store is not MemorySessionStore:
+        kwargs["path"] = str(tmp_path / "sessions.sqlite3")
+    store = make_store(**kwargs)
+
+    store.ttl = -1
+    for i in range(10):
+        store.set(f"idle-{i}", {"i": i})
+    store.ttl = 3600
+    store.set("active", {"i": 10})
+
+    assert store.get("idle-0") is None
+    assert store.get("active") == {"i": 10}
+    if isinstance(store, MemorySessionStore):
+        assert list(store._data) == ["active"]
+    else:
+        assert store._db().execute("SELECT id FROM sessions").fetchall() == [("active",)]
+
+
+def test_create_session_store_parses_urls(tmp_path):
+    assert isinstance(create_session_store("memory"), MemorySessionStore)
+    store = create_session_store(f"sqlite:///{tmp_path}/sessions.sqlite3")
+    assert isinstance(store, SQLiteSessionStore) and store.path == f"{tmp_path}/sessions.sqlite3"
+    with pytest.raises(ValueError):
+        create_session_store("mongodb://localhost")
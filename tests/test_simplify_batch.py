@@ -0,0 +1,105 @@
+import json
+import re
+
+import pytest
+import requests
+
+from conftest import unique
+
+
+class BatchModel:
+    """generate_text stand-in answering the batch prompt; ids in `skip` are left out of the next answers."""
+
+    def __init__(self):
+        self.calls = []
+        self.skip = set()
+        self.error = None
+
+    def __call__(self, prompt, default="", **kwargs):
+        fragments = dict(re.findall(r"^\s*\[(\d+)\] (.+)$", prompt, re.MULTILINE))
+        self.calls.append(fragments)
+        if self.error is not None:
+            raise self.error
+        return json.dumps([
+            {"id": fragment_id, "simplified_text": f"**{text.lower()}**", "purpose": "Safety."}
+            for fragment_id, text in fragments.items() if fragment_id not in self.skip
+        ])
+
+
+@pytest.fixture
+def model(monkeypatch):
+    import gemini_client
+
+    model = BatchModel()
+    monkeypatch.setattr(gemini_client, "generate_text", model)
+    return model
+
+
+def simplified(text):
+    return {"simplified_text": f"Simplified Text: {text.lower()}\n\nPurpose: Safety."}
+
+
+def test_cache_misses_go_upstream_once_and_in_order(client, model):
+    switch, meter = unique("Switch off the supply."), unique("Zero the meter.")
+    client.post("/simplify-text/batch", json={"texts": [switch]})
+
+    texts = [meter, switch, meter, "  " + meter.upper()]
+    response = client.post("/simplify-text/batch", json={"texts": texts})
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [simplified(meter), simplified(switch), simplified(meter),
+                                              simplified(meter)]
+    # The cached fragment isn't re-sent and the repeated one is sent once
+    assert model.calls == [{"1": switch}, {"1": meter}]
+
+
+def test_fragments_missing_from_the_answer_are_asked_for_again(client, model):
+    texts = [unique("Wear goggles."), unique("Tie back long hair."), unique("Keep the bench dry.")]
+    model.skip = {"2"}
+    first = client.post("/simplify-text/batch", json={"texts": texts}).get_json()["results"]
+    assert model.calls == [{"1": texts[0], "2": texts[1], "3": texts[2]}, {"1": texts[1]}]
+    # The retry numbers the leftover fragment "1", which the model answered
+    assert first == [simplified(text) for text in texts]
+
+
+def test_fragments_that_never_parse_get_an_error_of_their_own(client, model, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "SIMPLIFY_BATCH_RETRIES", 0)
+    texts = [unique("Wear goggles."), unique("Tie back long hair.")]
+    model.skip = {"2"}
+    results = client.post("/simplify-text/batch", json={"texts": texts}).get_json()["results"]
+    assert results == [simplified(texts[0]), {"error": "Simplified text not found in API response."}]
+
+
+def test_large_batches_are_split(client, model, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "SIMPLIFY_BATCH_SIZE", 2)
+    texts = [unique(f"Step {n}.") for n in range(5)]
+    results = client.post("/simplify-text/batch", json={"texts": texts}).get_json()["results"]
+    assert results == [simplified(text) for text in texts]
+    assert [len(call) for call in model.calls] == [2, 2, 1]
+
+
+def test_an_upstream_error_fails_the_request_only_if_nothing_was_simplified(client, model):
+    cached = unique("Switch off the supply.")
+    client.post("/simplify-text/batch", json={"texts": [cached]})
+    model.error = requests.exceptions.ConnectionError("upstream down")
+
+    fresh = unique("Zero the meter.")
+    response = client.post("/simplify-text/batch", json={"texts": [fresh]})
+    assert response.status_code == 500
+    assert "upstream down" in response.get_json()["error"]
+
+    response = client.post("/simplify-text/batch", json={"texts": [cached, fresh]})
+    assert response.status_code == 200
+    assert response.get_json()["results"] == [simplified(cached),
+                                              {"error": "Simplified text not found in API response."}]
+
+
+@pytest.mark.parametrize("body", [{}, {"texts": []}, {"texts": "Wear goggles."}, {"texts": ["Wear goggles.", " "]},
+                                  {"texts": ["Wear goggles.", 3]}])
+def test_malformed_batches_are_rejected(client, model, body):
+    response = client.post("/simplify-text/batch", json=body)
+    assert response.status_code == 400
+    assert model.calls == []
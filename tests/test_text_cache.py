@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+import text_cache
+from conftest import unique
+from text_cache import TieredCache, cache_key
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "simplify.sqlite3")
+
+
+def test_keys_ignore_whitespace_and_case_but_not_the_prompt_version():
+    key = cache_key("Connect the  Ammeter\nin series.", "v1")
+    assert key == cache_key("  connect the ammeter in SERIES. ", "v1")
+    assert key != cache_key("Connect the ammeter in parallel.", "v1")
+    assert key != cache_key("Connect the ammeter in series.", "v2")
+
+
+def test_a_value_is_served_from_memory_then_from_disk_in_another_worker(cache_path):
+    cache = TieredCache("simplify", path=cache_path)
+    assert cache.get("k") is None
+    cache.set("k", "value")
+    assert cache.get("k") == "value"
+    assert cache.stats() == {"memory_entries": 1, "hits": 1, "disk_hits": 0, "misses": 1}
+
+    other = TieredCache("simplify", path=cache_path)
+    assert other.get("k") == "value"
+    assert other.get("k") == "value"
+    assert other.stats() == {"memory_entries": 1, "hits": 1, "disk_hits": 1, "misses": 0}
+
+
+def test_expired_values_are_misses_in_both_tiers(cache_path, monkeypatch):
+    cache = TieredCache("simplify", ttl=60, path=cache_path)
+    cache.set("k", "value")
+    now = time.time()
+    monkeypatch.setattr(text_cache.time, "time", lambda: now + 61)
+    assert cache.get("k") is None
+    assert TieredCache("simplify", path=cache_path).get("k") is None
+
+
+def test_memory_is_bounded_by_least_recent_use(cache_path):
+    cache = TieredCache("simplify", max_entries=2, path=cache_path)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.stats()["memory_entries"] == 2
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["disk_hits"] == 0
+    # "b" fell out of memory but is still on disk
+    assert cache.get("b") == "2"
+    assert cache.stats()["disk_hits"] == 1
+
+
+def test_simplify_text_answers_a_repeat_selection_from_the_cache(client, monkeypatch):
+    import gemini_client
+
+    prompts = []
+
+    def generate_text(prompt, default="", **kwargs):
+        prompts.append(prompt)
+        return "**Simplified Text:** Put the ammeter in the loop."
+
+    monkeypatch.setattr(gemini_client, "generate_text", generate_text)
+    text = unique("Connect the ammeter in series with the resistor.")
+
+    first = client.post("/simplify-text", json={"text": text})
+    again = client.post("/simplify-text", json={"text": "  " + text.upper().replace(" ", "\n ") + " "})
+    assert first.status_code == again.status_code == 200
+    assert first.get_json() == again.get_json() == {"simplified_text": "Simplified Text: Put the ammeter in the loop."}
+    assert len(prompts) == 1
+
+
+def test_simplify_text_does_not_cache_an_empty_answer(client, monkeypatch):
+    import gemini_client
+
+    answers = iter(["", "Simplified Text: Read the scale at eye level."])
+    monkeypatch.setattr(gemini_client, "generate_text", lambda prompt, default="", **kwargs: next(answers))
+    text = unique("Avoid parallax error when reading the scale.")
+
+    assert client.post("/simplify-text", json={"text": text}).status_code == 500
+    response = client.post("/simplify-text", json={"text": text})
+    assert response.get_json() == {"simplified_text": "Simplified Text: Read the scale at eye level."}
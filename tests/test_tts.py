@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+import pytest
+
+import server
+import tts_cache
+from tts_cache import AudioCache, TTSError
+
+CLIP = b"ID3" + b"\x00" * 1000
+
+
+class FakeVoiceRSS:
+    """Stands in for the requests session: answers every GET with `content`, counting the calls."""
+
+    def __init__(self, content=CLIP, content_type="audio/mpeg", delay=0.0):
+        self.content = content
+        self.headers = {"Content-Type": content_type}
+        self.delay = delay
+        self.calls = []
+
+    def get(self, url, params=None, timeout=None):
+        self.calls.append(params)
+        time.sleep(self.delay)
+        return self
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = AudioCache(directory=str(tmp_path / "tts"))
+    cache._session = FakeVoiceRSS()
+    return cache
+
+
+def test_a_clip_is_synthesized_once_and_then_served_from_disk(cache):
+    key, path = cache.fetch("Connect the voltmeter in parallel.")
+    assert open(path, "rb").read() == CLIP
+
+    # Whitespace doesn't change the address; the voice does
+    assert cache.fetch("Connect the voltmeter  in parallel. ") == (key, path)
+    other, _ = cache.fetch("Connect the voltmeter in parallel.", {"v": "Linda"})
+    assert other != key
+    assert len(cache._session.calls) == 2
+    assert cache.stats()["hits"] == 1
+
+
+def test_students_asking_together_share_one_call(cache):
+    cache._session.delay = 0.1
+    threads = [threading.Thread(target=cache.fetch, args=("Record the ammeter reading.",)) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache._session.calls) == 1
+
+
+def test_a_voicerss_error_is_raised_and_not_cached(cache):
+    cache._session = FakeVoiceRSS(b"ERROR: The API key is not available!", "text/plain")
+    with pytest.raises(TTSError, match="API key"):
+        cache.fetch("Connect the voltmeter in parallel.")
+    assert not list(cache._entries())
+
+
+def test_the_least_recently_played_clips_are_evicted(cache):
+    cache.max_bytes = 3 * len(CLIP) - 1  # the third clip overflows it; trimming to 90% drops one
+    _, oldest = cache.fetch("Step one.")
+    _, played = cache.fetch("Step two.")
+    past = time.time() - 2 * tts_cache.TOUCH_INTERVAL
+    os.utime(oldest, (past, past))
+    os.utime(played, (past - 1, past - 1))
+    cache.fetch("Step two.")  # played again: now the most recent
+
+    cache.fetch("Step three.")
+    assert not os.path.exists(oldest) and os.path.exists(played)
+    assert cache.stats()["evictions"] == 1
+
+
+@pytest.fixture
+def speech(tmp_path, monkeypatch):
+    cache = AudioCache(directory=str(tmp_path / "tts"))
+    cache._session = FakeVoiceRSS()
+    monkeypatch.setattr(server, "audio_cache", cache)
+    return cache
+
+
+def test_the_returned_audio_url_can_be_fetched(client, speech):
+    response = client.post("/api/text-to-speech", json={"text": "Connect the voltmeter in parallel."})
+
+    url = response.get_json()["audioUrl"]
+    assert url.startswith("http://localhost/api/text-to-speech/")
+    audio = client.get(url)
+    assert audio.status_code == 200
+    assert audio.mimetype == "audio/mpeg"
+    assert audio.data == CLIP
+    assert client.get(url, headers={"If-None-Match": audio.headers["ETag"]}).status_code == 304
+
+
+def test_the_audio_url_uses_the_public_base_url(client, speech, monkeypatch):
+    monkeypatch.setattr(server, "PUBLIC_BASE_URL", "https://labs.example.org")
+    response = client.post("/api/text-to-speech", json={"text": "Connect the voltmeter in parallel."})
+
+    url = response.get_json()["audioUrl"]
+    assert url.startswith("https://labs.example.org/api/text-to-speech/")
+    assert client.get(url.replace("https://labs.example.org", "")).data == CLIP
+
+
+def test_text_to_speech_reports_voicerss_errors(client, speech):
+    speech._session = FakeVoiceRSS(b"ERROR: The text is too long!", "text/plain")
+    response = client.post("/api/text-to-speech", json={"text": "Connect the voltmeter in parallel."})
+    assert response.status_code == 502
+    assert client.post("/api/text-to-speech", json={}).status_code == 400
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+
+
+def normalize_text(text):
+    """Collapse whitespace and case so trivially different selections share a key."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(text, version):
+    """Content address for a piece of text under a given prompt version."""
+    return hashlib.sha256(f"{version}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class TieredCache:
+    """In-memory LRU with TTL in front of a SQLite table shared by all worker processes."""
+
+    def __init__(self, name, max_entries=1024, ttl=7 * 24 * 3600, disk_max_entries=50000, path=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.path = path or os.path.join(CACHE_DIR, f"{name}.sqlite3")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+    def _db(self):
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.path != ":memory:":
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        try:
+            conn = self._db()
+            row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                with conn:
+                    conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.disk_hits += 1
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"{self.name} cache read failed: {e}")
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl
+        self._remember(key, value, expires_at)
+        try:
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, expires_at, now),
+                )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._prune(conn, now)
+        except sqlite3.Error as e:
+            print(f"{self.name} cache write failed: {e}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def _remember(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _prune(self, conn, now):
+        # Drop expired rows, then the least recently used ones above the disk cap
+        with conn:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "DELETE FROM cache WHERE key IN ("
+                "SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            )
@@ -0,0 +1,224 @@
+"""Content-addressed disk cache for VoiceRSS text-to-speech audio.
+
+    python tts_cache.py --prewarm            # synthesize every registered procedure step
+    python tts_cache.py --prewarm --voice Linda
+
+Each clip is stored once under the sha256 of its normalized text and voice
+parameters, so the same procedure step read aloud by every student is fetched
+from VoiceRSS once and then served straight from disk. The directory is kept
+under TTS_CACHE_MAX_BYTES by evicting the least recently played clips.
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from coalesce import SingleFlight
+from text_cache import CACHE_DIR
+
+VOICERSS_URL = "https://api.voicerss.org/"
+VOICERSS_API_KEY = os.getenv("VOICERSS_API_KEY", "cee124818c53400f81056fb6fb251eb4")
+TTS_CACHE_DIR = os.path.join(CACHE_DIR, "tts")
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+# Clips played again within this many seconds don't rewrite their mtime
+TOUCH_INTERVAL = 60
+
+DEFAULT_VOICE = {"hl": "en-us", "v": "", "r": "0", "c": "mp3", "f": "44khz_16bit_stereo"}
+MIMETYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "ogg": "audio/ogg", "aac": "audio/aac", "caf": "audio/x-caf"}
+
+
+class TTSError(Exception):
+    """VoiceRSS refused or failed to synthesize the text."""
+
+
+def voice_params(overrides=None):
+    """DEFAULT_VOICE with the known keys from a request body applied."""
+    params = dict(DEFAULT_VOICE)
+    for key, value in (overrides or {}).items():
+        if key in DEFAULT_VOICE and value not in (None, ""):
+            params[key] = str(value)
+    params["c"] = params["c"].lower()
+    return params
+
+
+def audio_key(text, voice):
+    """Content address of a clip: whitespace-normalized text plus the voice parameters."""
+    body = json.dumps({"text": " ".join(text.split()), "voice": voice}, sort_keys=True)
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """Clips on disk as <dir>/<key[:2]>/<key>.<codec>, bounded by total size with LRU eviction.
+
+    Recency is the file's mtime, so the bookkeeping survives restarts and is shared
+    by every worker process using the same directory.
+    """
+
+    def __init__(self, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_BYTES, api_key=VOICERSS_API_KEY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.api_key = api_key
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._flight = SingleFlight(timeout_error=requests.exceptions.Timeout)
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._size = None  # bytes on disk, computed lazily from a directory scan
+
+    def path(self, key, codec="mp3"):
+        return os.path.join(self.directory, key[:2], f"{key}.{codec}")
+
+    def lookup(self, key, codec="mp3"):
+        """Path of a cached clip, marking it as recently used; None on a miss."""
+        path = self.path(key, codec)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_mtime < time.time() - TOUCH_INTERVAL:
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        return path
+
+    def fetch(self, text, voice=None):
+        """(key, path) of the clip for text, synthesizing it only if it isn't on disk yet."""
+        voice = voice_params(voice)
+        key = audio_key(text, voice)
+        path = self.lookup(key, voice["c"])
+        if path is not None:
+            with self._lock:
+                self.hits += 1
+            return key, path
+        # Students opening the same step together share one VoiceRSS call
+        return key, self._flight.do(key, lambda: self._synthesize(key, text, voice))
+
+    def _synthesize(self, key, text, voice):
+        path = self.lookup(key, voice["c"])
+        if path is not None:
+            return path
+        with self._lock:
+            self.misses += 1
+
+        # requests URL-encodes the params, so text with &, # or non-ASCII survives intact
+        params = {"key": self.api_key, "src": text, **{k: v for k, v in voice.items() if v}}
+        response = self._session.get(VOICERSS_URL, params=params, timeout=30)
+        response.raise_for_status()
+        # VoiceRSS reports problems as a 200 with an "ERROR: ..." text body
+        if response.content[:6].upper() == b"ERROR:" or response.headers.get("Content-Type", "").startswith("text/"):
+            raise TTSError(response.content[:200].decode("utf-8", "replace").strip())
+
+        path = self.path(key, voice["c"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(response.content)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+        self._grow(len(response.content))
+        return path
+
+    def _grow(self, added):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += added
+            if self._size <= self.max_bytes:
+                return
+            # Trim to 90% so a full cache doesn't rescan the directory on every new clip
+            target = self.max_bytes * 0.9
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            self._size = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if self._size <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except OSError:
+                    continue
+                self._size -= size
+                self.evictions += 1
+
+    def _entries(self):
+        """(path, size, mtime) of every clip on disk."""
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".part"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime
+
+    def prewarm(self, texts, voice=None, workers=4):
+        """Synthesize every text not already cached; returns (fetched, failed)."""
+        texts = list(dict.fromkeys(text for text in texts if text and text.strip()))
+        misses_before = self.misses
+        failed = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(self.fetch, text, voice) for text in texts]:
+                try:
+                    future.result()
+                except (requests.exceptions.RequestException, TTSError) as e:
+                    print(f"Could not pre-warm audio: {e}")
+                    failed += 1
+        return self.misses - misses_before - failed, failed
+
+    def stats(self):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def procedure_steps(registry=None):
+    """Every procedure step of the registered experiments (the lab-manual PDFs)."""
+    if registry is None:
+        from blueprints import BlueprintRegistry
+
+        registry = BlueprintRegistry().load()
+    return [step for experiment in registry.experiments.values() for step in experiment["procedure"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prewarm", action="store_true", help="synthesize every procedure step")
+    parser.add_argument("--voice", help="VoiceRSS voice name")
+    parser.add_argument("--language", default=DEFAULT_VOICE["hl"], help="VoiceRSS language code")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    cache = AudioCache()
+    if args.prewarm:
+        steps = procedure_steps()
+        fetched, failed = cache.prewarm(steps, {"v": args.voice, "hl": args.language}, args.workers)
+        print(f"{len(steps)} steps: {fetched} synthesized, {failed} failed, the rest already cached")
+    print(json.dumps(cache.stats()))
+
+
+if __name__ == "__main__":
+    main()